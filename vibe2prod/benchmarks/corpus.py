@@ -0,0 +1,180 @@
+"""
+Synthetic vibe-coded modules for benchmarking.
+
+Modules are assembled from function templates modelled on
+examples/vibe_code_example.py: camelCase loaders, copy-pasted averaging
+helpers with renamed variables, needlessly nested loops, magic numbers,
+global mutation and a ``main`` that calls everything. Generation is
+deterministic for a given (n_functions, seed), so timings are comparable
+between runs.
+
+    python benchmarks/corpus.py --functions 200 > big_vibe.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+from typing import Callable, List
+
+_NAMES = ["xx", "lst", "zz", "data", "vals", "a", "nums"]
+_ACC = ["s", "t", "A", "total", "acc", "r"]
+
+
+def _loader(name: str, rnd: random.Random) -> str:
+    count = rnd.randint(7, 99)
+    top = rnd.choice([10, 100, 255, 1000])
+    return f"""def {name}(a=None):
+    n=[]
+    if a is None:
+        for _ in range({count}):
+            n.append(random.randint(1,{top}))
+    else:
+        for x in a:
+            n.append(int(x*1))
+    return n
+"""
+
+
+def _average(name: str, rnd: random.Random) -> str:
+    # The same algorithm under fresh names: exact clones after normalization.
+    p, acc = rnd.choice(_NAMES), rnd.choice(_ACC)
+    return f"""def {name}({p}):
+    {acc}=0
+    c=0
+    for q in {p}:
+        {acc}={acc}+q
+        c=c+1
+    if c==0:
+        return 0
+    return {acc}/c
+"""
+
+
+def _average_alt(name: str, rnd: random.Random) -> str:
+    p = rnd.choice(_NAMES)
+    extra = rnd.choice(["", f"\n    {p} = list({p})"])
+    return f"""def {name}({p}):{extra}
+    A = 0
+    for i in range(len({p})):
+        A += {p}[i]
+    if len({p}) == 0:
+        return None
+    return A / len({p})
+"""
+
+
+def _nested(name: str, rnd: random.Random) -> str:
+    depth = rnd.randint(2, 6)
+    lines = [f"def {name}(zz):", "    t=0"]
+    indent = "    "
+    for level in range(depth):
+        var = "ijklmn"[level]
+        if level % 2:
+            outer = "ijklmn"[level - 1]
+            lines.append(f"{indent}if {outer} % {rnd.randint(2, 9)} == {level}:")
+        else:
+            lines.append(f"{indent}for {var} in range(0, len(zz)):")
+        indent += "    "
+    lines.append(f"{indent}t = t + zz[i] * {rnd.choice([3, 7, 42, 3.14, 0.5])}")
+    lines.append("    k = 1")
+    lines.append(f"    while k < {rnd.randint(2, 5)}:")
+    lines.append("        k = k + 1")
+    lines.append("    return t/len(zz) if zz else -999")
+    return "\n".join(lines) + "\n"
+
+
+def _stdev(name: str, rnd: random.Random) -> str:
+    p = rnd.choice(_NAMES)
+    return f"""def {name}({p}):
+    if len({p})<2:
+        return 0
+    m=sum({p})/len({p})
+    t=0
+    for x in {p}:
+        t=t+(x-m)*(x-m)
+    return math.sqrt(t/len({p}))
+"""
+
+
+def _global_mutator(name: str, rnd: random.Random) -> str:
+    return f"""def {name}(lst):
+    for v in lst:
+        if v % {rnd.choice([2, 3, 5])} == 0:
+            GLOBX.append(v)
+        else:
+            pass
+"""
+
+
+def _useless(name: str, rnd: random.Random) -> str:
+    return f"""def {name}(a):
+    for i in range({rnd.choice([100, 1000, 5000])}):
+        z=i*i
+    return a
+    print("never")
+"""
+
+
+def _copy_list(name: str, rnd: random.Random) -> str:
+    op = rnd.choice(["* 1", "+ 0", "- 0"])
+    return f"""def {name}(lst):
+    r=[]
+    for j in range(len(lst)):
+        r.append(lst[j] {op})
+    return r
+"""
+
+
+_TEMPLATES: List[Callable[[str, random.Random], str]] = [
+    _loader,
+    _average,
+    _average_alt,
+    _nested,
+    _stdev,
+    _global_mutator,
+    _useless,
+    _copy_list,
+]
+
+
+def generate_module(n_functions: int, seed: int = 0) -> str:
+    """
+    A module with ``n_functions`` functions plus a ``main`` calling them.
+    """
+    rnd = random.Random(seed)
+    parts = ["import random\nimport math\n\nGLOBX = []\nglob_var = 0\n"]
+    names = []
+    for i in range(n_functions):
+        template = _TEMPLATES[i % len(_TEMPLATES)]
+        style = rnd.choice(["camel", "snake", "short"])
+        base = template.__name__.strip("_")
+        if style == "camel":
+            name = base.title().replace("_", "") + str(i)
+            name = name[0].lower() + name[1:]
+        elif style == "snake":
+            name = f"{base}_{i}"
+        else:
+            name = f"{base[:3]}{i}"
+        names.append(name)
+        parts.append(template(name, rnd))
+
+    calls = "\n".join(f"    r{i}={name}(data)" for i, name in enumerate(names))
+    parts.append(
+        f"def main():\n    data=[{', '.join(str(rnd.randint(1, 99)) for _ in range(8))}]\n"
+        f"{calls}\n    print(data)\n"
+    )
+    parts.append('if __name__=="__main__":\n    main()\n')
+    return "\n".join(parts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--functions", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(generate_module(args.functions, args.seed), end="")
+
+
+if __name__ == "__main__":
+    main()
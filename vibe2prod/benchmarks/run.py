@@ -0,0 +1,169 @@
+"""
+Benchmark vibe2prod's public entry points on synthetic modules.
+
+Each entry point is timed on generated modules of several sizes (see
+corpus.py). For every (entry point, size) the best of ``--repeat`` runs
+is recorded, which is the most stable statistic on a noisy machine.
+
+Results are written to benchmarks/results/latest.json. With
+``--save-baseline`` they also become the baseline; otherwise, when a
+baseline exists, any timing slower than baseline * (1 + threshold)
+is reported and the script exits with status 1.
+
+    PYTHONPATH=src python benchmarks/run.py --save-baseline
+    PYTHONPATH=src python benchmarks/run.py            # compare
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from corpus import generate_module  # noqa: E402
+
+from vibe2prod.comment_enhancer import enhance_comments  # noqa: E402
+from vibe2prod.dead_code_checker import analyze_dead_code  # noqa: E402
+from vibe2prod.documentation_generator import generate_docs  # noqa: E402
+from vibe2prod.duplicate_checker import analyze_duplicates  # noqa: E402
+from vibe2prod.naming_checker import analyze_naming  # noqa: E402
+from vibe2prod.pipeline import process_file  # noqa: E402
+from vibe2prod.report_generator import generate_report  # noqa: E402
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+BASELINE = RESULTS_DIR / "baseline.json"
+LATEST = RESULTS_DIR / "latest.json"
+
+SIZES = {"small": 10, "medium": 50, "large": 200}
+QUICK_SIZES = {"small": 10}
+
+DEFAULT_THRESHOLD = 0.25
+
+
+def _process_file(source_code: str) -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "bench.py"
+        path.write_text(source_code, encoding="utf-8")
+        process_file(path)
+
+
+# Every entry point receives the raw source; nothing is shared between
+# calls, so each timing includes its own parsing.
+ENTRY_POINTS: Dict[str, Callable[[str], object]] = {
+    "enhance_comments": enhance_comments,
+    "generate_report": lambda src: generate_report(src, "bench.py"),
+    "analyze_duplicates": analyze_duplicates,
+    "analyze_dead_code": analyze_dead_code,
+    "analyze_naming": analyze_naming,
+    "generate_docs": lambda src: generate_docs(src, "bench.py"),
+    "process_file": _process_file,
+}
+
+
+def best_time(func: Callable[[str], object], source_code: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(source_code)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes: Dict[str, int], repeat: int, only: List[str]) -> Dict[str, Dict[str, float]]:
+    """
+    {entry point: {size label: best seconds}}
+    """
+    results: Dict[str, Dict[str, float]] = {}
+    for label, n_functions in sizes.items():
+        source_code = generate_module(n_functions)
+        for name, func in ENTRY_POINTS.items():
+            if only and name not in only:
+                continue
+            func(source_code)  # warm-up: imports, lru caches
+            seconds = best_time(func, source_code, repeat)
+            results.setdefault(name, {})[label] = seconds
+            print(f"{name:<20} {label:<7} {seconds * 1000:>10.1f} ms", flush=True)
+    return results
+
+
+def regressions(
+    current: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+) -> List[str]:
+    found = []
+    for name, by_size in current.items():
+        for label, seconds in by_size.items():
+            before = baseline.get(name, {}).get(label)
+            if before and seconds > before * (1 + threshold):
+                found.append(
+                    f"{name} [{label}]: {before * 1000:.1f} ms -> "
+                    f"{seconds * 1000:.1f} ms (+{seconds / before - 1:.0%})"
+                )
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="vibe2prod benchmarks")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--quick", action="store_true", help="Only the small corpus, 2 repeats."
+    )
+    parser.add_argument(
+        "--only",
+        nargs="*",
+        default=[],
+        choices=sorted(ENTRY_POINTS),
+        help="Benchmark only these entry points.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Allowed slowdown vs. the baseline (0.25 = 25%%).",
+    )
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    sizes = QUICK_SIZES if args.quick else SIZES
+    repeat = 2 if args.quick else args.repeat
+    results = run(sizes, repeat, args.only)
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    record = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "sizes": sizes,
+        "repeat": repeat,
+        "results": results,
+    }
+    LATEST.write_text(json.dumps(record, indent=2), encoding="utf-8")
+
+    if args.save_baseline:
+        BASELINE.write_text(json.dumps(record, indent=2), encoding="utf-8")
+        print(f"Baseline saved to {BASELINE}")
+        return
+
+    if not BASELINE.exists():
+        print("No baseline yet; run with --save-baseline to create one.")
+        return
+
+    baseline = json.loads(BASELINE.read_text(encoding="utf-8"))["results"]
+    slower = regressions(results, baseline, args.threshold)
+    if slower:
+        print(f"\nRegressions beyond {args.threshold:.0%}:")
+        for line in slower:
+            print(f"- {line}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Check that the CLI starts fast.
+
+Times, in fresh interpreters, ``vibe2prod --help`` and a full run without
+the LLM on a tiny module, and reports the best of ``--repeat`` runs. The
+script exits with status 1 when ``--help`` takes longer than the budget or
+when a run imports a dependency it does not need (the openai SDK and
+python-dotenv without --use-llm; anything heavy for --help).
+
+    PYTHONPATH=src python benchmarks/startup.py
+    PYTHONPATH=src python benchmarks/startup.py --budget-ms 150
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+DEFAULT_BUDGET_MS = 250.0
+
+# Modules that must stay unloaded on each path.
+HELP_FORBIDDEN = ("libcst", "openai", "dotenv", "vibe2prod.pipeline")
+NO_LLM_FORBIDDEN = ("openai", "dotenv")
+
+# Runs the CLI, then writes the names of all loaded modules to stderr.
+_DRIVER = """
+import json, sys
+from vibe2prod.cli import main
+sys.argv = ["vibe2prod"] + sys.argv[2:]
+try:
+    main()
+except SystemExit:
+    pass
+finally:
+    sys.stderr.write("\\nMODULES " + json.dumps(sorted(sys.modules)) + "\\n")
+"""
+
+# The children run in a scratch directory, so point them at the package
+# this script would import rather than relying on a relative PYTHONPATH.
+_PACKAGE_ROOT = str(Path(importlib.util.find_spec("vibe2prod").origin).parents[1])
+
+
+def run_cli(args: Sequence[str], cwd: Path) -> Tuple[float, List[str]]:
+    """
+    Seconds taken by one CLI invocation in a fresh interpreter, and the
+    modules it had loaded when it finished.
+    """
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", _DRIVER, "-", *args],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": _PACKAGE_ROOT},
+    )
+    seconds = time.perf_counter() - start
+    marker = proc.stderr.rindex("MODULES ")
+    modules = json.loads(proc.stderr[marker + len("MODULES "):])
+    return seconds, modules
+
+
+def measure(args: Sequence[str], cwd: Path, repeat: int) -> Tuple[float, List[str]]:
+    best, modules = float("inf"), []
+    for _ in range(repeat):
+        seconds, modules = run_cli(args, cwd)
+        best = min(best, seconds)
+    return best, modules
+
+
+def loaded(modules: Sequence[str], forbidden: Sequence[str]) -> List[str]:
+    return [m for m in forbidden if m in modules]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="vibe2prod startup benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=DEFAULT_BUDGET_MS,
+        help=f"Maximum time for `vibe2prod --help`. Default: {DEFAULT_BUDGET_MS:g}.",
+    )
+    args = parser.parse_args()
+
+    problems = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cwd = Path(tmpdir)
+        (cwd / "tiny.py").write_text("def f(x):\n    return x + 1\n", encoding="utf-8")
+
+        checks = [
+            ("--help", ["--help"], HELP_FORBIDDEN),
+            ("run without LLM", ["--no-cache", "tiny.py"], NO_LLM_FORBIDDEN),
+        ]
+        for label, cli_args, forbidden in checks:
+            seconds, modules = measure(cli_args, cwd, args.repeat)
+            print(f"{label:<16} {seconds * 1000:>8.1f} ms")
+            for name in loaded(modules, forbidden):
+                problems.append(f"{label} imports {name}")
+            if cli_args == ["--help"] and seconds * 1000 > args.budget_ms:
+                problems.append(
+                    f"--help took {seconds * 1000:.1f} ms "
+                    f"(budget {args.budget_ms:g} ms)"
+                )
+
+    if problems:
+        print("\nStartup budget exceeded:")
+        for line in problems:
+            print(f"- {line}")
+        sys.exit(1)
+    print(f"\nWithin budget ({args.budget_ms:g} ms).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""
+Project-wide batch mode.
+
+Expands directories and glob patterns into a deterministic list of Python
+files and runs the pipeline over them, either serially or spread across a
+ProcessPoolExecutor. Files are handed to workers in chunks, which amortises
+pickling and scheduling overhead and lets each chunk share one black/ruff
+pass. Results come back in input order, and a failure in one file is
+recorded on its FileResult instead of aborting the run.
+"""
+
+from __future__ import annotations
+
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from . import tracing
+from .cache import ResultCache
+from .clone_index import (
+    Block,
+    CloneIndex,
+    FunctionSignature,
+    collect_clone_blocks,
+    render_cross_file_section,
+    render_near_duplicate_section,
+    source_hash,
+)
+from .config import AnalysisConfig
+from .llm_cache import LLMCache
+from .llm_client import llm_processes, share_limits
+from .context import AnalysisContext
+from .function_cache import FunctionCache
+from .near_duplicates import function_signatures
+from .git_changes import LineRange
+from .pipeline import process_files
+
+
+# Files the pipeline writes next to its input; never treat them as inputs.
+GENERATED_SUFFIXES = ("_commented", "_prod", "_ai")
+
+SKIP_DIRS = {"__pycache__", "venv", "node_modules", "build", "dist"}
+
+# The clone index holds fingerprints of the _commented code (see
+# _clone_update); its sections say so, since they name the source files.
+_COMMENTED_LINES = "_Line numbers refer to each file's `_commented` version._"
+
+
+@dataclass
+class FileResult:
+    input_path: Path
+    outputs: Optional[Tuple[Path, Path, Path, Optional[Path], Path]] = None
+    error: Optional[str] = None
+    # (content hash, blocks, signatures) when the file must be (re-)indexed
+    # for cross-file clone detection. Like the report, they describe the
+    # file's _commented version.
+    clone_update: Optional[
+        Tuple[str, List[Block], List[FunctionSignature]]
+    ] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def is_generated(path: Path) -> bool:
+    """
+    True if ``path`` is an output of the pipeline: its stem ends with a
+    generated suffix and the input it was made from sits beside it.
+    """
+    for suffix in GENERATED_SUFFIXES:
+        stem = path.stem[: -len(suffix)]
+        if path.stem.endswith(suffix) and stem:
+            if path.with_name(stem + path.suffix).is_file():
+                return True
+    return False
+
+
+def _walk_python_files(root: Path) -> Iterable[Path]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        # Prune in place so os.walk never descends into skipped dirs.
+        dirnames[:] = [
+            d for d in dirnames if d not in SKIP_DIRS and not d.startswith(".")
+        ]
+        for name in filenames:
+            if name.endswith(".py"):
+                yield Path(dirpath) / name
+
+
+def collect_inputs(patterns: Sequence[str]) -> Tuple[List[Path], List[str]]:
+    """
+    Expand files, directories and glob patterns into a sorted, de-duplicated
+    list of Python files. Files named explicitly are always kept; the
+    pipeline's own outputs are skipped when expanding the rest.
+
+    Returns (files, unmatched_patterns).
+    """
+    found = set()
+    unmatched: List[str] = []
+
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_file():
+            found.add(path)
+            continue
+        if path.is_dir():
+            candidates: Iterable[Path] = _walk_python_files(path)
+        else:
+            candidates = [
+                Path(p) for p in glob.glob(pattern, recursive=True) if p.endswith(".py")
+            ]
+
+        matched = False
+        for candidate in candidates:
+            if candidate.is_file() and not is_generated(candidate):
+                found.add(candidate)
+                matched = True
+
+        if not matched:
+            unmatched.append(pattern)
+
+    return sorted(found), unmatched
+
+
+def _index_key(path: Path) -> str:
+    return str(path.resolve())
+
+
+def _clone_update(
+    commented_ctx: AnalysisContext, known_hash: Optional[str]
+) -> Optional[Tuple[str, List[Block], List[FunctionSignature]]]:
+    """
+    Fingerprints of the commented code the pipeline just reported on,
+    reusing its parse and block collection, so the clone sections' line
+    numbers match the rest of the report.
+    """
+    commented_code = commented_ctx.source_code
+    content_hash = source_hash(commented_code)
+    if content_hash == known_hash:
+        return None
+    return (
+        content_hash,
+        collect_clone_blocks(commented_code, commented_ctx),
+        function_signatures(commented_code, commented_ctx),
+    )
+
+
+def _process_chunk(
+    paths: List[Path],
+    use_llm: bool,
+    cache: Optional[ResultCache],
+    known_hashes: Optional[Dict[str, str]] = None,
+    config: Optional[AnalysisConfig] = None,
+    llm_cache: Optional[LLMCache] = None,
+    llm_mode: str = "file",
+    changed_lines: Optional[Dict[Path, Sequence[LineRange]]] = None,
+    function_cache: Optional[FunctionCache] = None,
+    sources: Optional[Dict[Path, str]] = None,
+) -> List[FileResult]:
+    """
+    Worker entry point. The whole chunk shares one black/ruff pass; a
+    failure is recorded on the FileResult of the file that caused it.
+
+    ``known_hashes`` (index key -> content hash) is passed when a clone
+    index is in use; files whose content changed are fingerprinted here,
+    from the pipeline's own analysis of them, so that work is spread
+    across the pool too.
+    """
+    updates = {}
+
+    def index(path: Path, source_code: str, commented_ctx: AnalysisContext) -> None:
+        try:
+            updates[path] = _clone_update(
+                commented_ctx, known_hashes.get(_index_key(path))
+            )
+        except Exception:
+            pass  # the file's own artifacts are fine; just not indexed
+
+    results = []
+    outcomes = process_files(
+        paths,
+        use_llm=use_llm,
+        cache=cache,
+        config=config,
+        llm_cache=llm_cache,
+        llm_mode=llm_mode,
+        changed_lines=changed_lines,
+        function_cache=function_cache,
+        sources=sources,
+        on_commented=None if known_hashes is None else index,
+    )
+    for path, outcome in zip(paths, outcomes):
+        if isinstance(outcome, Exception):
+            error = f"{type(outcome).__name__}: {outcome}"
+            results.append(FileResult(path, error=error))
+            continue
+        results.append(
+            FileResult(path, outputs=outcome, clone_update=updates.get(path))
+        )
+    return results
+
+
+def _run_chunk(trace: bool, *args) -> Tuple[List[FileResult], List[tracing.Event]]:
+    """
+    Pool entry point: _process_chunk, plus the trace events recorded in
+    this worker when the parent is tracing.
+    """
+    if not trace:
+        return _process_chunk(*args), []
+    tracing.take_events()  # drop anything inherited from a forked parent
+    tracing.enable()
+    results = _process_chunk(*args)
+    return results, tracing.take_events()
+
+
+def _apply_clone_index(
+    index: CloneIndex, results: List[FileResult], config: AnalysisConfig
+) -> None:
+    """
+    Fold this run's changes into the index, then append cross-file exact and
+    near duplicate sections to the report of every successfully processed
+    file (Markdown reports only; the issue formats have no free-form
+    sections).
+    """
+    index.update_many(
+        (_index_key(r.input_path), *r.clone_update)
+        for r in results
+        if r.clone_update is not None
+    )
+    index.prune_missing()
+
+    by_path = defaultdict(list)
+    for group in index.cross_file_groups():
+        for path in {loc.path for loc in group}:
+            by_path[path].append(group)
+
+    near_by_path = defaultdict(list)
+    for pair in index.cross_file_near_duplicates(config.near_duplicate_threshold):
+        near_by_path[pair[0].path].append(pair)
+        near_by_path[pair[1].path].append(pair)
+
+    if config.report_format != "markdown":
+        return
+
+    cwd = Path.cwd()
+    for result in results:
+        if not result.ok:
+            continue
+        key = _index_key(result.input_path)
+        section = render_cross_file_section(
+            key, by_path.get(key, []), cwd, note=_COMMENTED_LINES
+        )
+        near = render_near_duplicate_section(
+            key, near_by_path.get(key, []), cwd, note=_COMMENTED_LINES
+        )
+        report_path = result.outputs[2]
+        with report_path.open("a", encoding="utf-8") as f:
+            f.write("\n" + section + "\n" + near)
+
+
+def _chunk(paths: Sequence[Path], size: int) -> List[List[Path]]:
+    return [list(paths[i : i + size]) for i in range(0, len(paths), size)]
+
+
+def default_chunk_size(n_files: int, jobs: int) -> int:
+    """
+    Aim for ~4 chunks per worker: big enough to amortise IPC, small enough
+    that one slow chunk doesn't leave the other workers idle at the end.
+    """
+    return max(1, min(32, -(-n_files // (jobs * 4))))
+
+
+def process_paths(
+    paths: Sequence[Path],
+    jobs: int = 1,
+    use_llm: bool = False,
+    chunk_size: Optional[int] = None,
+    cache: Optional[ResultCache] = None,
+    clone_index: Optional[CloneIndex] = None,
+    config: Optional[AnalysisConfig] = None,
+    llm_cache: Optional[LLMCache] = None,
+    llm_mode: str = "file",
+    changed_lines: Optional[Dict[Path, Sequence[LineRange]]] = None,
+    function_cache: Optional[FunctionCache] = None,
+    sources: Optional[Dict[Path, str]] = None,
+) -> List[FileResult]:
+    """
+    Run the pipeline over ``paths`` and return one FileResult per path,
+    in the same order as ``paths``.
+
+    jobs <= 1 runs in-process; otherwise a pool of ``jobs`` worker processes.
+    With a ``clone_index``, the index is updated incrementally and each
+    report gains a cross-file duplicates section. ``changed_lines`` narrows
+    reports to changed functions, and ``sources`` replaces file contents
+    (see process_files).
+    """
+    paths = list(paths)
+    if not paths:
+        return []
+    config = config or AnalysisConfig()
+
+    def known(chunk):
+        if clone_index is None:
+            return None
+        hashes = {key: clone_index.known_hash(key) for key in map(_index_key, chunk)}
+        return {key: h for key, h in hashes.items() if h is not None}
+
+    jobs = max(1, jobs)
+    if jobs == 1 or len(paths) == 1:
+        results = _process_chunk(
+            paths,
+            use_llm,
+            cache,
+            known(paths),
+            config,
+            llm_cache,
+            llm_mode,
+            changed_lines,
+            function_cache,
+            sources,
+        )
+        if clone_index is not None:
+            with tracing.span("clone_index", "stage"):
+                _apply_clone_index(clone_index, results, config)
+        return results
+
+    size = chunk_size or default_chunk_size(len(paths), jobs)
+    chunks = _chunk(paths, size)
+
+    results: List[FileResult] = []
+    trace = tracing.is_enabled()
+    workers = min(jobs, len(chunks))
+    if use_llm:
+        # The workers' LLM clients split the rate and concurrency limits,
+        # each keeping at least one request in flight.
+        workers = llm_processes(workers)
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=share_limits, initargs=(workers,)
+    ) as pool:
+        futures = [
+            pool.submit(
+                _run_chunk,
+                trace,
+                chunk,
+                use_llm,
+                cache,
+                known(chunk),
+                config,
+                llm_cache,
+                llm_mode,
+                changed_lines,
+                function_cache,
+                sources,
+            )
+            for chunk in chunks
+        ]
+        # Collect in submission order so output is deterministic regardless
+        # of which worker finishes first.
+        for chunk, future in zip(chunks, futures):
+            try:
+                chunk_results, events = future.result()
+                results.extend(chunk_results)
+                tracing.add_events(events)
+            except Exception as e:
+                # The worker process itself died (e.g. killed, OOM).
+                error = f"{type(e).__name__}: {e}"
+                results.extend(FileResult(p, error=error) for p in chunk)
+
+    if clone_index is not None:
+        with tracing.span("clone_index", "stage"):
+            _apply_clone_index(clone_index, results, config)
+    return results
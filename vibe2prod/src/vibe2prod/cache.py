@@ -0,0 +1,147 @@
+"""
+Content-addressed on-disk cache for pipeline results.
+
+An entry holds every artifact ``process_file`` produces for one input. The key
+is a SHA-256 over the source text, the vibe2prod version, the pipeline
+configuration and the installed black/ruff versions, so any change that could
+alter an artifact yields a different key and stale entries are never served.
+
+Entries are small JSON files fanned out over 256 sub-directories. A hit
+refreshes the file's mtime; when the cache grows past ``max_bytes`` the
+least recently used entries are deleted until it is back under the limit.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+import os
+import tempfile
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from . import __version__
+from .utils import default_cache_dir
+
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# After an eviction pass the cache is trimmed to this fraction of the limit,
+# so the next few writes don't each trigger another full scan.
+_EVICT_TARGET = 0.9
+
+
+@functools.lru_cache(maxsize=None)
+def tool_versions() -> Dict[str, str]:
+    """
+    Versions of the external formatters whose output is cached.
+    """
+    versions = {}
+    for tool in ("black", "ruff"):
+        try:
+            versions[tool] = metadata.version(tool)
+        except metadata.PackageNotFoundError:
+            versions[tool] = "missing"
+    return versions
+
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of pipeline artifacts, keyed by content.
+    """
+
+    def __init__(
+        self, directory: Optional[Path] = None, max_bytes: int = DEFAULT_MAX_BYTES
+    ) -> None:
+        self.directory = Path(directory or default_cache_dir()) / "results"
+        self.max_bytes = max_bytes
+        # Lazily computed running total; each worker process keeps its own
+        # estimate, which is good enough to keep the cache bounded.
+        self._size: Optional[int] = None
+
+    def key(self, source_code: str, config: Dict[str, Any]) -> str:
+        payload = json.dumps(
+            {
+                "source": hashlib.sha256(source_code.encode("utf-8")).hexdigest(),
+                "version": __version__,
+                "config": config,
+                "tools": tool_versions(),
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, artifacts: Dict[str, Any]) -> None:
+        path = self._path(key)
+        data = json.dumps(artifacts).encode("utf-8")
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write-then-rename so concurrent workers never see partial files.
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            return
+
+        if self._size is None:
+            self._size = self._scan_size()
+        else:
+            self._size += len(data)
+
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        if not self.directory.exists():
+            return []
+        entries = []
+        for path in self.directory.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> None:
+        """
+        Delete least recently used entries until the cache fits in
+        ``_EVICT_TARGET * max_bytes``.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * _EVICT_TARGET)
+
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                pass
+
+        self._size = total
@@ -1,44 +1,354 @@
+import os
 import sys
 import argparse
 from pathlib import Path
 
-from .pipeline import process_file
+from . import tracing
+from .config import DEFAULT_THRESHOLD, LLM_MODES, REPORT_FORMATS, AnalysisConfig
+from .utils import default_cache_dir
+
+# The analysis stack (libcst, black/ruff drivers, the LLM client) is
+# imported in main() once the arguments are valid, so --help and argument
+# errors return without loading it.
+
+
+def _print_outputs(outputs):
+    commented_path, prod_path, report_path, ai_path, docs_path = outputs
+    print(f"Commented file written to: {commented_path}")
+    print(f"Production-ready file written to: {prod_path}")
+    print(f"Quality report written to: {report_path}")
+    if ai_path is not None:
+        print(f"AI-refactored file written to: {ai_path}")
+    print(f"Documentation written to: {docs_path}")
 
 
 def main():
+    if sys.argv[1:2] == ["serve"]:
+        from .server import main as serve
+
+        return serve(sys.argv[2:])
+
+    watching = sys.argv[1:2] == ["watch"]
     parser = argparse.ArgumentParser(
+        prog="vibe2prod watch" if watching else None,
         description=(
             "Convert vibe-coded Python into production-ready code with comments, "
             "static analysis, optional AI refactor, and documentation."
-        )
+            + (" Re-run on every file as it is edited." if watching else "")
+        ),
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        metavar="input",
+        help=(
+            "Python files, directories (searched recursively) or glob patterns. "
+            "With --since/--staged: limits the changed files (default: all)."
+        ),
     )
-    parser.add_argument("input", help="Path to the Python file to process.")
     parser.add_argument(
         "--use-llm",
         action="store_true",
         help="Enable AI-based refactoring (if configured in llm_client.py).",
     )
+    parser.add_argument(
+        "--llm-mode",
+        choices=LLM_MODES,
+        default="file",
+        help=(
+            "With --use-llm: send the whole file in one prompt (file), or "
+            "rewrite each top-level function/class concurrently (chunks), "
+            "or write the file's answer to disk as it streams in (stream); "
+            "chunks mode only resends functions changed since the last run."
+        ),
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help=(
+            "Number of worker processes (0 = one per CPU); they share the LLM "
+            "rate and concurrency limits. Default: 1."
+        ),
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=None,
+        help="Where to keep cached results (default: ~/.cache/vibe2prod).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Recompute every artifact instead of reusing cached results.",
+    )
+
+    parser.add_argument(
+        "--cross-file",
+        action="store_true",
+        help=(
+            "Maintain a persistent clone index and report duplicates "
+            "shared between files."
+        ),
+    )
 
-    args = parser.parse_args()
-    input_path = Path(args.input)
+    parser.add_argument(
+        "--similarity",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=(
+            "Minimum estimated similarity (0-1) for reporting near-duplicate "
+            f"functions. Default: {DEFAULT_THRESHOLD}."
+        ),
+    )
+
+    parser.add_argument(
+        "--report-format",
+        choices=REPORT_FORMATS,
+        default="markdown",
+        help=(
+            "Write the quality report as Markdown (<file>_report.md), JSON Lines "
+            "with one issue per line (<file>_report.jsonl) or SARIF 2.1.0 "
+            "(<file>_report.sarif). Default: markdown."
+        ),
+    )
+    parser.add_argument(
+        "--combined-report",
+        default=None,
+        metavar="FILE",
+        help=(
+            "Also write one report for the whole run, in --report-format, to "
+            "FILE ('-' for stdout; progress messages then go to stderr)."
+        ),
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print wall/CPU time and call counts per stage, analyzer and file.",
+    )
+    parser.add_argument(
+        "--profile-json",
+        type=Path,
+        default=None,
+        metavar="FILE",
+        help="Write the profile summary and raw timing events as JSON.",
+    )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        default=None,
+        metavar="FILE",
+        help="Write a Chrome trace-event file (open in chrome://tracing or Perfetto).",
+    )
 
-    if not input_path.exists():
-        print(f"Error: File not found: {input_path}")
+    parser.add_argument(
+        "--since",
+        default=None,
+        metavar="REF",
+        help=(
+            "Only process Python files changed since this git ref (working tree "
+            "vs. REF), and limit their reports to the changed functions. "
+            "Untracked files are ignored; git add -N them to include them."
+        ),
+    )
+    parser.add_argument(
+        "--staged",
+        action="store_true",
+        help=(
+            "Like --since, for the changes staged in the git index; files are "
+            "analysed as staged, ignoring unstaged edits."
+        ),
+    )
+
+    if watching:
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0.5,
+            help="Seconds between checks for changed files. Default: 0.5.",
+        )
+        parser.add_argument(
+            "--debounce",
+            type=float,
+            default=0.3,
+            help="Wait until files have been quiet this long. Default: 0.3.",
+        )
+
+    args = parser.parse_args(sys.argv[2:] if watching else None)
+
+    if not 0 < args.similarity <= 1:
+        parser.error("--similarity must be in (0, 1]")
+    git_mode = args.since is not None or args.staged
+    if git_mode and watching:
+        parser.error("--since/--staged cannot be combined with watch")
+    if args.combined_report is not None and watching:
+        parser.error("--combined-report cannot be combined with watch")
+    if not args.inputs and not git_mode:
+        parser.error("the following arguments are required: input")
+
+    from .batch import collect_inputs, process_paths
+    from .cache import ResultCache
+    from .clone_index import CloneIndex
+    from .function_cache import FunctionCache
+    from .llm_cache import LLMCache
+
+    changed_lines = None
+    sources = None
+    if git_mode:
+        from .batch import is_generated
+        from .git_changes import (
+            GitError,
+            changed_lines as git_changed_lines,
+            staged_sources,
+        )
+
+        try:
+            changed_lines = {
+                path.resolve(): ranges
+                for path, ranges in git_changed_lines(args.since, args.staged).items()
+                if not is_generated(path)
+            }
+            if args.staged:
+                # The hunks number the index version's lines, so that is
+                # the version to analyse.
+                sources = {
+                    path.resolve(): text
+                    for path, text in staged_sources().items()
+                    if path.resolve() in changed_lines
+                }
+        except GitError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+    input_paths, unmatched = collect_inputs(args.inputs or ["."])
+    for pattern in unmatched:
+        print(f"Error: File not found: {pattern}")
+
+    if changed_lines is not None:
+        input_paths = [p for p in input_paths if p.resolve() in changed_lines]
+        if not input_paths and not unmatched:
+            print("No changed Python files.")
+            return
+
+    if not input_paths:
         sys.exit(1)
 
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+
+    profiling = args.profile or args.profile_json or args.trace
+    if profiling:
+        tracing.enable()
+
+    combined = None
+    if args.combined_report is not None:
+        from .report_writer import CombinedReport
+
+        if args.combined_report == "-":
+            # The report owns stdout; everything else is printed to stderr.
+            combined_out = sys.stdout
+            sys.stdout = sys.stderr
+        else:
+            combined_out = open(args.combined_report, "w", encoding="utf-8")
+        combined = CombinedReport(combined_out, args.report_format)
+
     print(">>")
 
-    try:
-        commented_path, prod_path, report_path, ai_path, docs_path = process_file(
-            input_path, use_llm=args.use_llm
+    cache = None if args.no_cache else ResultCache(args.cache_dir)
+    function_cache = None if args.no_cache else FunctionCache(args.cache_dir)
+
+    llm_cache = None
+    if args.use_llm and not args.no_cache:
+        llm_cache = LLMCache(args.cache_dir)
+        llm_before = llm_cache.stats()
+
+    clone_index = None
+    if args.cross_file:
+        clone_index = CloneIndex((args.cache_dir or default_cache_dir()) / "clones")
+
+    def run(paths) -> int:
+        results = process_paths(
+            paths,
+            jobs=jobs,
+            use_llm=args.use_llm,
+            cache=cache,
+            clone_index=clone_index,
+            config=AnalysisConfig(
+                near_duplicate_threshold=args.similarity,
+                report_format=args.report_format,
+            ),
+            llm_cache=llm_cache,
+            llm_mode=args.llm_mode,
+            changed_lines=changed_lines,
+            function_cache=function_cache,
+            sources=sources,
         )
-    except Exception as e:
-        print("Error:", e)
-        sys.exit(1)
 
-    print(f"Commented file written to: {commented_path}")
-    print(f"Production-ready file written to: {prod_path}")
-    print(f"Quality report written to: {report_path}")
-    if ai_path is not None:
-        print(f"AI-refactored file written to: {ai_path}")
-    print(f"Documentation written to: {docs_path}")
+        failed = 0
+        for result in results:
+            if len(results) > 1:
+                print(f"\n[{result.input_path}]")
+            if result.ok:
+                _print_outputs(result.outputs)
+                if combined is not None:
+                    combined.add(result.outputs[2])
+            else:
+                failed += 1
+                print("Error:", result.error)
+                if combined is not None:
+                    combined.add_failure(result.input_path, result.error)
+
+        if len(results) > 1:
+            print(f"\nProcessed {len(results)} file(s), {failed} failed.")
+        return failed
+
+    if watching:
+        from .watch import watch
+
+        # The first batch is every file; after that, only edited ones, so
+        # nothing else is re-parsed or rewritten.
+        try:
+            batches = watch(args.inputs, args.interval, args.debounce)
+            for n, changed in enumerate(batches):
+                if n:
+                    print(f"\n>> {len(changed)} changed file(s)")
+                run(changed)
+                sys.stdout.flush()
+        except KeyboardInterrupt:
+            pass
+        failed = 0
+    else:
+        failed = run(input_paths)
+
+    if combined is not None:
+        combined.close()
+        if args.combined_report != "-":
+            combined_out.close()
+            print(f"Combined report written to: {args.combined_report}")
+
+    if llm_cache is not None:
+        # Counters live in the database, so this covers worker processes too.
+        llm_after = llm_cache.stats()
+        print(
+            f"LLM cache: {llm_after['hits'] - llm_before['hits']} hit(s), "
+            f"{llm_after['misses'] - llm_before['misses']} miss(es), "
+            f"{llm_after['reused'] - llm_before['reused']} unchanged function(s) reused."
+        )
+
+    if profiling:
+        events = tracing.take_events()
+        if args.profile:
+            print("\n" + tracing.format_summary(events))
+        if args.profile_json:
+            tracing.write_json(args.profile_json, events)
+            print(f"Profile written to: {args.profile_json}")
+        if args.trace:
+            tracing.write_chrome_trace(args.trace, events)
+            print(f"Trace written to: {args.trace}")
+
+    if combined is not None and args.combined_report == "-":
+        sys.stdout = combined_out
+
+    if failed or unmatched:
+        sys.exit(1)
@@ -0,0 +1,373 @@
+"""
+Persistent, sharded index of structural fingerprints for cross-file clone
+detection.
+
+Each function body is reduced to per-statement fingerprints (see
+duplicate_checker) and every run of INDEX_WINDOW consecutive statements is
+stored as a compact 64-bit integer together with where it came from:
+(file id, function, start line, end line).
+
+Each indexed function also keeps its MinHash signature (see
+near_duplicates) in a per-file sidecar, so near-miss clones can be found
+across the repository with LSH without re-parsing unchanged files.
+
+On disk the index is a manifest plus 256 shard files, selected by the top
+byte of the fingerprint. Updates and queries touch one shard at a time, so
+memory stays bounded by a shard (plus the current batch of files), not by
+the size of the repository. A file is only re-indexed when its content hash
+changes; its old rows are dropped from exactly the shards they lived in.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .context import AnalysisContext, ensure_context
+from .duplicate_checker import collect_blocks, window_fingerprints
+from .near_duplicates import DEFAULT_THRESHOLD, LSHIndex, Signature
+
+
+# Minimum clone length (in statements) tracked across files. Shorter runs are
+# dominated by boilerplate such as "x = ...; return x".
+INDEX_WINDOW = 3
+
+_SHARD_BITS = 8
+
+# Files are applied to the shards in groups of this size to bound memory
+# during a large initial build.
+_UPDATE_BATCH = 500
+
+# (fingerprint, function name, start line, end line)
+Block = Tuple[int, str, int, int]
+
+# (function name, first line, last line, MinHash signature)
+FunctionSignature = Tuple[str, int, int, Signature]
+
+
+@dataclass(frozen=True, order=True)
+class CloneLocation:
+    path: str
+    function: str
+    start_line: int
+    end_line: int
+
+
+def source_hash(source_code: str) -> str:
+    return hashlib.sha256(source_code.encode("utf-8")).hexdigest()
+
+
+def collect_clone_blocks(
+    source_code: str, context: Optional[AnalysisContext] = None
+) -> List[Block]:
+    """
+    Fingerprint every INDEX_WINDOW-statement run inside each function.
+    Returns [] for code that does not parse.
+    """
+    collector = collect_blocks(ensure_context(source_code, context))
+    if collector is None:
+        return []
+
+    blocks: List[Block] = []
+    for func_name, fingerprints, starts, ends in collector.functions:
+        for i, h in enumerate(window_fingerprints(fingerprints, INDEX_WINDOW)):
+            blocks.append((h, func_name, starts[i], ends[i + INDEX_WINDOW - 1]))
+    return blocks
+
+
+def _write_json(path: Path, data) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+class CloneIndex:
+    """
+    Fingerprint -> locations index persisted under ``directory``.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._manifest_path = self.directory / "manifest.json"
+        self._files: Dict[str, dict] = {}
+        self._next_id = 0
+
+        try:
+            manifest = json.loads(self._manifest_path.read_text(encoding="utf-8"))
+            self._files = manifest["files"]
+            self._next_id = manifest["next_id"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    # ---------- storage ----------
+
+    def _shard_path(self, shard: int) -> Path:
+        return self.directory / f"shard_{shard:02x}.json"
+
+    def _load_shard(self, shard: int) -> List[list]:
+        try:
+            return json.loads(self._shard_path(shard).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return []
+
+    def _save_shard(self, shard: int, rows: List[list]) -> None:
+        _write_json(self._shard_path(shard), rows)
+
+    def _signature_path(self, file_id: int) -> Path:
+        return self.directory / "signatures" / f"{file_id}.json"
+
+    def _save_signatures(
+        self, file_id: int, signatures: Sequence[FunctionSignature]
+    ) -> None:
+        path = self._signature_path(file_id)
+        if not signatures:
+            path.unlink(missing_ok=True)
+            return
+        path.parent.mkdir(exist_ok=True)
+        _write_json(path, [[n, s, e, list(sig)] for n, s, e, sig in signatures])
+
+    def _load_signatures(self, file_id: int) -> List[FunctionSignature]:
+        try:
+            rows = json.loads(self._signature_path(file_id).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return []
+        return [(n, s, e, tuple(sig)) for n, s, e, sig in rows]
+
+    def _save_manifest(self) -> None:
+        _write_json(
+            self._manifest_path, {"files": self._files, "next_id": self._next_id}
+        )
+
+    @staticmethod
+    def _shard_of(fingerprint: int) -> int:
+        return fingerprint >> (64 - _SHARD_BITS)
+
+    # ---------- updates ----------
+
+    def known_hash(self, path: str) -> Optional[str]:
+        record = self._files.get(path)
+        return None if record is None else record["hash"]
+
+    def is_current(self, path: str, content_hash: str) -> bool:
+        return self.known_hash(path) == content_hash
+
+    def update_many(self, entries: Iterable[tuple]) -> int:
+        """
+        Apply (path, content hash, blocks[, signatures]) updates. Files whose
+        hash is unchanged are skipped. Returns the number of files re-indexed.
+        """
+        updated = 0
+        batch: List[tuple] = []
+        for entry in entries:
+            if self.is_current(entry[0], entry[1]):
+                continue
+            batch.append(entry)
+            if len(batch) >= _UPDATE_BATCH:
+                updated += self._apply(batch)
+                batch = []
+        if batch:
+            updated += self._apply(batch)
+        return updated
+
+    def remove(self, paths: Iterable[str]) -> None:
+        removals: Dict[int, set] = defaultdict(set)
+        for path in paths:
+            record = self._files.pop(path, None)
+            if record is not None:
+                for shard in record["shards"]:
+                    removals[shard].add(record["id"])
+                self._save_signatures(record["id"], [])
+        self._rewrite_shards(removals, {})
+        self._save_manifest()
+
+    def prune_missing(self) -> None:
+        """
+        Drop files that no longer exist on disk.
+        """
+        self.remove([p for p in self._files if not os.path.exists(p)])
+
+    def _apply(self, batch: List[tuple]) -> int:
+        removals: Dict[int, set] = defaultdict(set)
+        additions: Dict[int, List[list]] = defaultdict(list)
+
+        for path, content_hash, blocks, *rest in batch:
+            record = self._files.get(path)
+            if record is not None:
+                file_id = record["id"]
+                for shard in record["shards"]:
+                    removals[shard].add(file_id)
+            else:
+                file_id = self._next_id
+                self._next_id += 1
+
+            shards = set()
+            for fingerprint, func_name, start, end in blocks:
+                shard = self._shard_of(fingerprint)
+                additions[shard].append([fingerprint, file_id, func_name, start, end])
+                shards.add(shard)
+
+            self._files[path] = {
+                "id": file_id,
+                "hash": content_hash,
+                "shards": sorted(shards),
+            }
+            self._save_signatures(file_id, rest[0] if rest else [])
+
+        self._rewrite_shards(removals, additions)
+        self._save_manifest()
+        return len(batch)
+
+    def _rewrite_shards(
+        self, removals: Dict[int, set], additions: Dict[int, List[list]]
+    ) -> None:
+        for shard in sorted(set(removals) | set(additions)):
+            dropped = removals.get(shard, ())
+            rows = [r for r in self._load_shard(shard) if r[1] not in dropped]
+            rows.extend(additions.get(shard, ()))
+            self._save_shard(shard, rows)
+
+    # ---------- queries ----------
+
+    def _paths_by_id(self) -> Dict[int, str]:
+        return {record["id"]: path for path, record in self._files.items()}
+
+    def cross_file_groups(self) -> Iterator[List[CloneLocation]]:
+        """
+        Yield clone groups that span more than one file.
+
+        Overlapping window hits for the same set of functions are merged
+        into one group, with each location widened to cover every hit, so a
+        long clone is reported once rather than once per window.
+        """
+        paths = self._paths_by_id()
+        # (frozenset of (file id, function)) -> {(file id, function): [start, end]}
+        merged: Dict[frozenset, Dict[Tuple[int, str], List[int]]] = {}
+
+        for shard in range(1 << _SHARD_BITS):
+            if not self._shard_path(shard).exists():
+                continue
+            by_fp: Dict[int, List[list]] = defaultdict(list)
+            for row in self._load_shard(shard):
+                by_fp[row[0]].append(row)
+
+            for rows in by_fp.values():
+                if len({r[1] for r in rows}) < 2:
+                    continue
+                members = frozenset((r[1], r[2]) for r in rows)
+                spans = merged.setdefault(members, {})
+                for _, file_id, func_name, start, end in rows:
+                    span = spans.get((file_id, func_name))
+                    if span is None:
+                        spans[(file_id, func_name)] = [start, end]
+                    else:
+                        span[0] = min(span[0], start)
+                        span[1] = max(span[1], end)
+
+        groups = []
+        for spans in merged.values():
+            group = sorted(
+                CloneLocation(paths[file_id], func_name, start, end)
+                for (file_id, func_name), (start, end) in spans.items()
+                if file_id in paths
+            )
+            if len({loc.path for loc in group}) > 1:
+                groups.append(group)
+
+        groups.sort()
+        yield from groups
+
+    def cross_file_near_duplicates(
+        self, threshold: float = DEFAULT_THRESHOLD
+    ) -> List[Tuple[CloneLocation, CloneLocation, float]]:
+        """
+        Pairs of similar functions in different files, found through LSH
+        buckets over the stored MinHash signatures.
+        """
+        lsh = LSHIndex(threshold)
+        for path, record in sorted(self._files.items()):
+            for name, start, end, signature in self._load_signatures(record["id"]):
+                lsh.add(CloneLocation(path, name, start, end), signature)
+
+        return [
+            (a, b, score) for a, b, score in lsh.pairs() if a.path != b.path
+        ]
+
+
+def render_near_duplicate_section(
+    path: str,
+    pairs: Iterable[Tuple[CloneLocation, CloneLocation, float]],
+    relative_to: Optional[Path] = None,
+    note: str = "",
+) -> str:
+    """
+    Markdown section listing functions in ``path`` that closely resemble
+    functions in other files; ``note`` goes under the heading.
+    """
+    lines = ["## Cross-File Near Duplicates"] + ([note] if note else [])
+    found = False
+    for a, b, score in pairs:
+        if b.path == path:
+            a, b = b, a
+        if a.path != path:
+            continue
+        found = True
+        lines.append(
+            f"- `{a.function}` (lines {a.start_line}–{a.end_line}) is {score:.0%} "
+            f"similar to `{_show(b.path, relative_to)}` `{b.function}` "
+            f"(lines {b.start_line}–{b.end_line})"
+        )
+
+    if not found:
+        lines.append("No cross-file near duplicates detected.")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def _show(path: str, relative_to: Optional[Path]) -> str:
+    if relative_to is not None:
+        try:
+            return str(Path(path).relative_to(relative_to))
+        except ValueError:
+            pass
+    return path
+
+
+def render_cross_file_section(
+    path: str,
+    groups: Iterable[List[CloneLocation]],
+    relative_to: Optional[Path] = None,
+    note: str = "",
+) -> str:
+    """
+    Markdown section listing the cross-file clone groups that involve
+    ``path``; ``note`` goes under the heading.
+    """
+    lines = ["## Cross-File Duplicates"] + ([note] if note else [])
+    found = False
+    for group in groups:
+        local = [loc for loc in group if loc.path == path]
+        if not local:
+            continue
+        found = True
+        others = [loc for loc in group if loc.path != path]
+        here = ", ".join(
+            f"`{loc.function}` (lines {loc.start_line}–{loc.end_line})" for loc in local
+        )
+        there = ", ".join(
+            f"`{_show(loc.path, relative_to)}` `{loc.function}` (lines {loc.start_line}–{loc.end_line})"
+            for loc in others
+        )
+        lines.append(f"- {here} duplicated in {there}")
+
+    if not found:
+        lines.append("No cross-file duplicates detected.")
+    lines.append("")
+    return "\n".join(lines)
@@ -1,14 +1,18 @@
 import ast
-from typing import Dict
+from typing import Dict, Optional
 
-def check_comment_drift(source: str) -> Dict[str, str]:
+from .context import AnalysisContext, ensure_context
+
+def check_comment_drift(
+    source: str, context: Optional[AnalysisContext] = None
+) -> Dict[str, str]:
     """
     Detect mismatches between code and its comments/docstrings.
     Returns suggestions for updates.
     """
 
     issues = {}
-    tree = ast.parse(source)
+    tree = ensure_context(source, context).tree
 
     for node in tree.body:
         if isinstance(node, ast.FunctionDef):
@@ -32,9 +36,9 @@ def check_comment_drift(source: str) -> Dict[str, str]:
             msg = []
 
             if missing:
-                msg.append(f"Missing param docs: {', '.join(missing)}")
+                msg.append(f"Missing param docs: {', '.join(sorted(missing))}")
             if extra:
-                msg.append(f"Docstring mentions params not in code: {', '.join(extra)}")
+                msg.append(f"Docstring mentions params not in code: {', '.join(sorted(extra))}")
 
             # Return mismatch
             returns_something = any(isinstance(n, ast.Return) and n.value is not None
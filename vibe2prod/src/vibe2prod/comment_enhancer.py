@@ -10,14 +10,31 @@ Uses libcst to parse the Python file and:
 - Adds a per-function magic-number summary comment so they can be extracted to config/constants.
 
 Existing docstrings are preserved.
+
+Everything the enhancer adds is a whole new line in front of an existing
+one. By default (``mode="edits"``) those lines are planned from the stdlib
+ast as (line, indent, text) insertions and spliced into the original text,
+instead of rebuilding the module with the transformer and regenerating its
+code. The output is the same, except that source libcst does not round-trip
+exactly (a few files: a trailing comment dropped, a space before ``:``
+lost) is left as written. Layouts the plan cannot place exactly fall back
+to the transformer (``mode="transform"``).
 """
 
 from __future__ import annotations
 
-from typing import List, Sequence, Tuple
+import ast
+import io
+import re
+import tokenize
+from bisect import bisect_left
+from operator import itemgetter
+from typing import List, Optional, Sequence, Tuple
 
 import libcst as cst
 
+from .context import AnalysisContext, ensure_context
+
 
 # ---------- Helpers for docstring detection/creation ----------
 
@@ -55,20 +72,27 @@ def _body_starts_with_comment(body: Sequence[cst.BaseStatement]) -> bool:
     return isinstance(first, cst.EmptyLine) and first.comment is not None
 
 
-def _make_module_docstring() -> cst.SimpleStatementLine:
-    text = '"""TODO: Describe this module."""'
+_MODULE_DOCSTRING = '"""TODO: Describe this module."""'
+
+
+def _docstring_line(text: str) -> cst.SimpleStatementLine:
     return cst.SimpleStatementLine(body=[cst.Expr(value=cst.SimpleString(text))])
 
 
-def _make_class_docstring(name: str) -> cst.SimpleStatementLine:
+def _make_module_docstring() -> cst.SimpleStatementLine:
+    return _docstring_line(_MODULE_DOCSTRING)
+
+
+def _class_docstring(name: str) -> str:
     inner = f"{name} class.\n\nTODO: Describe this class."
-    text = f'"""{inner}"""'
-    return cst.SimpleStatementLine(body=[cst.Expr(value=cst.SimpleString(text))])
+    return f'"""{inner}"""'
 
 
-def _make_function_docstring(
-    name: str, param_names: List[str], has_return: bool
-) -> cst.SimpleStatementLine:
+def _make_class_docstring(name: str) -> cst.SimpleStatementLine:
+    return _docstring_line(_class_docstring(name))
+
+
+def _function_docstring(name: str, param_names: List[str], has_return: bool) -> str:
     lines: List[str] = [
         f"{name} function.",
         "",
@@ -88,21 +112,27 @@ def _make_function_docstring(
         lines.append("")
 
     inner = "\n".join(lines).rstrip()
-    text = f'"""{inner}"""'
-    return cst.SimpleStatementLine(body=[cst.Expr(value=cst.SimpleString(text))])
+    return f'"""{inner}"""'
+
+
+def _make_function_docstring(
+    name: str, param_names: List[str], has_return: bool
+) -> cst.SimpleStatementLine:
+    return _docstring_line(_function_docstring(name, param_names, has_return))
 
 
 # ---------- Inline comments for loops / conditionals ----------
 
+_LOOP_COMMENT = "# TODO: Review this loop."
+_IF_COMMENT = "# TODO: Review this conditional."
+
 
 def _make_loop_comment() -> cst.EmptyLine:
-    comment = "# TODO: Review this loop."
-    return cst.EmptyLine(comment=cst.Comment(comment))
+    return cst.EmptyLine(comment=cst.Comment(_LOOP_COMMENT))
 
 
 def _make_if_comment() -> cst.EmptyLine:
-    comment = "# TODO: Review this conditional."
-    return cst.EmptyLine(comment=cst.Comment(comment))
+    return cst.EmptyLine(comment=cst.Comment(_IF_COMMENT))
 
 
 # ---------- Complexity analysis ----------
@@ -185,9 +215,9 @@ def _analyze_complexity(
     return loops, ifs, max_depth
 
 
-def _make_complexity_comment(loops: int, ifs: int, depth: int) -> cst.EmptyLine | None:
+def _complexity_comment(loops: int, ifs: int, depth: int) -> Optional[str]:
     """
-    Build a TODO comment summarising complexity, if it's non-trivial.
+    A TODO comment summarising complexity, if it's non-trivial.
 
     Heuristics:
     - More than 1 loop, or
@@ -197,10 +227,16 @@ def _make_complexity_comment(loops: int, ifs: int, depth: int) -> cst.EmptyLine
     if loops <= 1 and depth < 3 and ifs <= 2:
         return None
 
-    comment = (
+    return (
         f"# TODO: Review complexity: {loops} loop(s), "
         f"{ifs} conditional(s), max nesting depth {depth}."
     )
+
+
+def _make_complexity_comment(loops: int, ifs: int, depth: int) -> cst.EmptyLine | None:
+    comment = _complexity_comment(loops, ifs, depth)
+    if comment is None:
+        return None
     return cst.EmptyLine(comment=cst.Comment(comment))
 
 
@@ -272,18 +308,24 @@ def _collect_magic_numbers(func: cst.FunctionDef) -> List[str]:
     return nums
 
 
-def _make_magic_numbers_comment(nums: List[str]) -> cst.EmptyLine | None:
+def _magic_numbers_comment(nums: List[str]) -> Optional[str]:
     """
-    Create a TODO comment summarising magic numbers, if any were found.
+    A TODO comment summarising magic numbers, if any were found.
     """
     if not nums:
         return None
 
     joined = ", ".join(nums)
-    comment = (
+    return (
         "# TODO: Extract magic numbers into named constants / config: "
         f"{joined}."
     )
+
+
+def _make_magic_numbers_comment(nums: List[str]) -> cst.EmptyLine | None:
+    comment = _magic_numbers_comment(nums)
+    if comment is None:
+        return None
     return cst.EmptyLine(comment=cst.Comment(comment))
 
 
@@ -453,20 +495,414 @@ class DocstringAndCommentAdder(cst.CSTTransformer):
         return new_statements
 
 
+# ---------- Edit list ----------
+
+# (line, indent, text): insert ``indent + text`` as a new line in front of
+# 1-based ``line`` of the original source.
+Insertion = Tuple[int, str, str]
+
+ENHANCER_MODES = ("edits", "transform")
+
+_LINE = re.compile(r"[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+\Z")
+# libcst ends generated lines with the first newline in the source.
+_NEWLINE = re.compile(r"\r\n?|\n")
+_INDENT_CHARS = " \t\f"
+
+_LOOPS = (ast.For, ast.AsyncFor, ast.While)
+_FUNCTIONS = (ast.FunctionDef, ast.AsyncFunctionDef)
+# Nodes with nothing below them worth scanning.
+_LEAVES = (ast.Name, ast.expr_context, ast.operator, ast.cmpop)
+
+
+class _Unplannable(Exception):
+    """
+    The source has a layout the edit list does not reproduce exactly.
+    """
+
+
+def _header_end(node: ast.stmt) -> int:
+    """
+    Last line of the expressions in a compound statement's header.
+    """
+    end = node.lineno
+    for field, value in ast.iter_fields(node):
+        if field in ("body", "orelse", "decorator_list"):
+            continue
+        if isinstance(value, ast.arguments):
+            value = [
+                *value.posonlyargs,
+                *value.args,
+                value.vararg,
+                *value.kwonlyargs,
+                value.kwarg,
+                *value.defaults,
+                *value.kw_defaults,
+            ]
+        # An expression's span covers its children.
+        for item in value if isinstance(value, list) else [value]:
+            end = max(end, getattr(item, "end_lineno", None) or 0)
+    return end
+
+
+def _scan(tree: ast.Module) -> Tuple[List[ast.stmt], List[ast.Constant]]:
+    """
+    Every function and class definition, and every int/float literal, in
+    one pass (ast.walk is several times slower).
+    """
+    defs: List[ast.stmt] = []
+    numbers: List[ast.Constant] = []
+    stack: List[ast.AST] = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Constant):
+            value = node.value
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                numbers.append(node)
+            continue
+        if isinstance(node, _LEAVES):
+            continue
+        if isinstance(node, (*_FUNCTIONS, ast.ClassDef)):
+            defs.append(node)
+        for field in node._fields:
+            value = getattr(node, field, None)
+            if isinstance(value, list):
+                stack.extend(item for item in value if isinstance(item, ast.AST))
+            elif isinstance(value, ast.AST):
+                stack.append(value)
+    return defs, numbers
+
+
+class _Planner:
+    """
+    Works out what DocstringAndCommentAdder would insert, and where, from
+    the ast and the source lines. Raises _Unplannable when unsure.
+    """
+
+    def __init__(self, source_code: str) -> None:
+        self.lines = _LINE.findall(source_code)
+        self.insertions: List[Insertion] = []
+        # Magic numbers as reported, and where they are, in source order.
+        self._number_at: List[Tuple[int, int]] = []
+        self._number_text: List[str] = []
+
+    def _text(self, lineno: int, col: int, end_col: Optional[int] = None) -> str:
+        line = self.lines[lineno - 1]
+        if line.isascii():
+            return line[col:end_col]
+        # ast column offsets count UTF-8 bytes.
+        try:
+            return line.encode("utf-8")[col:end_col].decode("utf-8")
+        except UnicodeDecodeError:
+            raise _Unplannable from None
+
+    def _blank_or_comment(self, lineno: int) -> bool:
+        text = self.lines[lineno - 1].lstrip(_INDENT_CHARS)
+        return text.startswith("#") or not text.rstrip("\r\n")
+
+    def _first_line(self, stmt: ast.stmt) -> Tuple[int, str]:
+        """
+        The line ``stmt`` starts on (its first decorator's) and its
+        indentation. A statement sharing its line with a block header (a
+        one-line suite) is unplannable: the transformer cannot add to
+        those either.
+        """
+        decorators = getattr(stmt, "decorator_list", None)
+        lineno = min(d.lineno for d in decorators) if decorators else stmt.lineno
+        line = self.lines[lineno - 1]
+        text = line.lstrip(_INDENT_CHARS)
+        indent = line[: len(line) - len(text)]
+        if decorators:
+            if not text.startswith("@"):
+                raise _Unplannable
+        elif len(indent) != stmt.col_offset:
+            raise _Unplannable
+        return lineno, indent
+
+    def _insertion_point(self, stmt: ast.stmt, after: int) -> Tuple[int, str]:
+        """
+        Where a line inserted in front of ``stmt`` goes: above the comment
+        and blank lines directly before it (libcst's leading_lines), but
+        below line ``after``.
+        """
+        lineno, indent = self._first_line(stmt)
+        while lineno - 1 > after and self._blank_or_comment(lineno - 1):
+            lineno -= 1
+        return lineno, indent
+
+    def _has_docstring(self, body: List[ast.stmt]) -> bool:
+        """
+        _has_leading_docstring: a statement line holding just one plain
+        (not implicitly concatenated) string literal.
+        """
+        first = body[0]
+        if not (
+            isinstance(first, ast.Expr)
+            and isinstance(first.value, ast.Constant)
+            and isinstance(first.value.value, (str, bytes))
+        ):
+            return False
+        if len(body) > 1 and body[1].lineno == first.end_lineno:
+            return False  # `"doc"; x = 1`
+
+        node = first.value
+        if node.lineno == node.end_lineno:
+            literal = self._text(node.lineno, node.col_offset, node.end_col_offset)
+        else:
+            literal = (
+                self._text(node.lineno, node.col_offset)
+                + "".join(self.lines[node.lineno : node.end_lineno - 1])
+                + self._text(node.end_lineno, 0, node.end_col_offset)
+            )
+        unprefixed = literal.lstrip("rRbBuU")
+        quote = unprefixed[:3] if unprefixed[:3] in ('"""', "'''") else unprefixed[:1]
+        if (
+            "\\" not in unprefixed
+            and unprefixed.count(quote) == 2
+            and unprefixed.endswith(quote)
+        ):
+            return True
+        try:
+            tokens = tokenize.generate_tokens(io.StringIO(literal).readline)
+            return sum(token.type == tokenize.STRING for token in tokens) == 1
+        except (tokenize.TokenError, SyntaxError):
+            raise _Unplannable from None
+
+    def _else_body(self, stmt: ast.stmt) -> List[ast.stmt]:
+        """
+        The statements _analyze_complexity walks for ``stmt``'s else
+        branch: for an ``elif``, only that branch's own body.
+        """
+        orelse = stmt.orelse
+        if (
+            isinstance(stmt, ast.If)
+            and len(orelse) == 1
+            and isinstance(orelse[0], ast.If)
+            and self._text(orelse[0].lineno, orelse[0].col_offset).startswith("elif")
+        ):
+            return orelse[0].body
+        return orelse
+
+    def _complexity(
+        self, statements: List[ast.stmt], depth: int = 1
+    ) -> Tuple[int, int, int]:
+        """
+        _analyze_complexity over ast statements.
+        """
+        loops = 0
+        ifs = 0
+        max_depth = depth
+
+        for stmt in statements:
+            if isinstance(stmt, _LOOPS):
+                loops += 1
+            elif isinstance(stmt, ast.If):
+                ifs += 1
+            else:
+                continue
+
+            blocks = [stmt.body, self._else_body(stmt)] if stmt.orelse else [stmt.body]
+            for block in blocks:
+                child_loops, child_ifs, child_depth = self._complexity(block, depth + 1)
+                loops += child_loops
+                ifs += child_ifs
+                max_depth = max(max_depth, child_depth)
+
+        return loops, ifs, max_depth
+
+    def _index_numbers(self, numbers: List[ast.Constant]) -> None:
+        """
+        The text _collect_magic_numbers reports for each literal, read back
+        from the source (numbers are reported as written). Trivial ints and
+        non-decimal ints are left out.
+        """
+        found = []
+        for node in numbers:
+            if node.lineno != node.end_lineno:
+                raise _Unplannable
+            text = self._text(node.lineno, node.col_offset, node.end_col_offset)
+            try:
+                if isinstance(node.value, float):
+                    if float(text) != node.value:
+                        raise _Unplannable
+                else:
+                    text = text.replace("_", "")
+                    try:
+                        parsed = int(text, 10)
+                    except ValueError:  # 0x.., 0o.., 0b..
+                        if int(text, 0) != node.value:
+                            raise _Unplannable
+                        continue
+                    if parsed != node.value:
+                        raise _Unplannable
+                    if parsed in (-1, 0, 1):
+                        continue
+            except ValueError:
+                raise _Unplannable from None
+            found.append(((node.lineno, node.col_offset), text))
+        found.sort()
+        self._number_at = [at for at, _ in found]
+        self._number_text = [text for _, text in found]
+
+    def _magic_numbers(self, func: ast.stmt) -> List[str]:
+        """
+        _collect_magic_numbers: the literals between the start of the body
+        and the end of the function.
+        """
+        first = func.body[0]
+        start = min(
+            (node.lineno, node.col_offset)
+            for node in (first, *getattr(first, "decorator_list", ()))
+        )
+        end = (func.end_lineno, func.end_col_offset)
+        lo = bisect_left(self._number_at, start)
+        hi = bisect_left(self._number_at, end, lo)
+        nums = list(set(self._number_text[lo:hi]))
+        nums.sort()
+        return nums
+
+    def _insert(self, line: int, indent: str, text: Optional[str]) -> None:
+        if text is not None:
+            self.insertions.append((line, indent, text))
+
+    def _class(self, node: ast.ClassDef) -> None:
+        line, indent = self._insertion_point(node.body[0], _header_end(node))
+        if not self._has_docstring(node.body):
+            self._insert(line, indent, _class_docstring(node.name))
+
+    def _function(self, node: ast.stmt) -> None:
+        body = node.body
+        line, indent = self._insertion_point(body[0], _header_end(node))
+        if not self._has_docstring(body):
+            args = node.args
+            params = [a.arg for a in (*args.posonlyargs, *args.args, *args.kwonlyargs)]
+            doc = _function_docstring(node.name, params, node.returns is not None)
+            self._insert(line, indent, doc)
+        elif len(body) > 1:
+            # Summaries go after the existing docstring.
+            line, _ = self._insertion_point(body[1], body[0].end_lineno)
+        else:
+            line = None
+
+        summaries = [
+            _complexity_comment(*self._complexity(body)),
+            _magic_numbers_comment(self._magic_numbers(node)),
+        ]
+        for comment in summaries:
+            if comment is not None and line is None:
+                raise _Unplannable
+            self._insert(line, indent, comment)
+
+        for stmt in body:
+            if isinstance(stmt, (*_LOOPS, ast.If)):
+                comment = _IF_COMMENT if isinstance(stmt, ast.If) else _LOOP_COMMENT
+                at = self._insertion_point(stmt.body[0], _header_end(stmt))
+                self._insert(*at, comment)
+
+    def plan(self, tree: ast.Module) -> List[Insertion]:
+        if not tree.body:
+            # The docstring would end the file; leave that to libcst.
+            raise _Unplannable
+        defs, numbers = _scan(tree)
+        self._index_numbers(numbers)
+        for node in defs:
+            if isinstance(node, ast.ClassDef):
+                self._class(node)
+            else:
+                self._function(node)
+        if not self._has_docstring(tree.body):
+            # Module.header holds every comment and blank line above the
+            # first statement, so the docstring goes right above it.
+            self._insert(*self._first_line(tree.body[0]), _MODULE_DOCSTRING)
+        return self.insertions
+
+
+def plan_insertions(context: AnalysisContext) -> Optional[List[Insertion]]:
+    """
+    The lines DocstringAndCommentAdder would add to ``context``'s source, as
+    insertions for apply_insertions, read off the ast without building a
+    new tree. None if the source does not parse or its layout cannot be
+    reproduced exactly this way.
+    """
+    if context.source_code.startswith("\ufeff"):
+        return None
+    try:
+        tree = context.tree
+    except (SyntaxError, ValueError):
+        return None
+    try:
+        return _Planner(context.source_code).plan(tree)
+    except _Unplannable:
+        return None
+
+
+def apply_insertions(source_code: str, insertions: Sequence[Insertion]) -> str:
+    """
+    Splice ``insertions`` into ``source_code``, each as a whole line ended by
+    the source's newline. Insertions on the same line keep their order.
+    """
+    match = _NEWLINE.search(source_code)
+    newline = match.group(0) if match else "\n"
+    lines = _LINE.findall(source_code)
+    out: List[str] = []
+    done = 0
+    for line, indent, text in sorted(insertions, key=itemgetter(0)):
+        out.extend(lines[done : line - 1])
+        done = line - 1
+        out.append(indent + text + newline)
+    out.extend(lines[done:])
+    return "".join(out)
+
+
 # ---------- Public API ----------
 
 
-def enhance_comments(source_code: str, use_llm: bool = False) -> str:
+def enhance_context(context: AnalysisContext, mode: str = "edits") -> AnalysisContext:
     """
-    Static implementation: ignore use_llm and always use the CST-based enhancer.
+    Run the enhancer on an already-parsed source and return a context for
+    the commented code.
 
-    If parsing fails for any reason, return the original code unchanged.
+    In "edits" mode the commented code is parsed here, as a check that
+    libcst accepts it (the report parses it next anyway); "transform" mode
+    returns a not yet parsed context.
+
+    The transformed Module is not reused for analysis: inserted comments live
+    in it as body items, whereas a parse of the emitted code attaches them to
+    the following statement, and the analyzers count statements.
+    If parsing fails, the input context is returned unchanged.
     """
+    if mode not in ENHANCER_MODES:
+        raise ValueError(f"mode must be one of {ENHANCER_MODES}")
+    if mode == "edits":
+        insertions = plan_insertions(context)
+        if insertions is not None:
+            code = apply_insertions(context.source_code, insertions)
+            enhanced = AnalysisContext(code)
+            try:
+                enhanced.module
+                return enhanced
+            except Exception:
+                pass  # let the transformer path decide on the original
+
     try:
-        module = cst.parse_module(source_code)
+        module = context.module
     except Exception:
         # If the file is not valid Python, don't break the pipeline.
-        return source_code
+        return context
 
     new_module = module.visit(DocstringAndCommentAdder())
-    return new_module.code
+    return AnalysisContext(new_module.code)
+
+
+def enhance_comments(
+    source_code: str,
+    use_llm: bool = False,
+    context: Optional[AnalysisContext] = None,
+    mode: str = "edits",
+) -> str:
+    """
+    Static implementation: ignore use_llm and always use the static enhancer
+    (see ENHANCER_MODES).
+
+    If parsing fails for any reason, return the original code unchanged.
+    """
+    return enhance_context(ensure_context(source_code, context), mode).source_code
@@ -0,0 +1,48 @@
+"""
+Analyzer settings that change report content.
+
+Kept in one frozen dataclass so the settings travel to batch workers as a
+single picklable value and become part of the result-cache key as a whole.
+This module imports nothing heavy, so the CLI can build its parser from it.
+"""
+
+from dataclasses import dataclass
+from typing import FrozenSet, Optional
+
+# Default minimum similarity for reporting near-duplicate functions.
+DEFAULT_THRESHOLD = 0.8
+
+# How --use-llm sends code: the whole file in one prompt, each top-level
+# function/class as its own concurrent prompt, or the whole file with the
+# answer streamed into the _ai file as it is generated (one file at a time).
+LLM_MODES = ("file", "chunks", "stream")
+
+# How the quality report is written: Markdown for people, JSON Lines (one
+# issue per line) or SARIF for tools. Also the _report file's extension.
+REPORT_FORMATS = {"markdown": ".md", "jsonl": ".jsonl", "sarif": ".sarif"}
+
+
+@dataclass(frozen=True)
+class AnalysisConfig:
+    # Minimum estimated Jaccard similarity for near-duplicate functions.
+    near_duplicate_threshold: float = DEFAULT_THRESHOLD
+    # One of REPORT_FORMATS.
+    report_format: str = "markdown"
+
+
+@dataclass(frozen=True)
+class ReportFocus:
+    """
+    Limits a report to the parts of a file a diff touched: the named
+    functions, plus module-level findings if lines outside every function
+    changed.
+    """
+
+    functions: FrozenSet[str] = frozenset()
+    module_level: bool = False
+
+    def covers(self, scope: Optional[str]) -> bool:
+        """
+        True for a finding in function ``scope`` (None: module level).
+        """
+        return scope in self.functions if scope is not None else self.module_level
@@ -0,0 +1,101 @@
+"""
+Shared parse state for a single version of a source file.
+
+Every stage of the pipeline used to call ``cst.parse_module`` or ``ast.parse``
+on the same text. An AnalysisContext parses lazily and at most once:
+
+- ``module``: the libcst Module.
+- ``wrapper``: a MetadataWrapper around that same Module (no deep copy).
+- ``tree``: the stdlib ``ast`` Module.
+
+A failed parse is remembered too, so a broken file is not re-parsed by
+every analyzer that tries it. Results derived from the parse that several
+analyzers need can be memoized on the context with ``cached``.
+
+A context may carry a FunctionCache; rules then run incrementally, per
+top-level function (see rules.py).
+"""
+
+from __future__ import annotations
+
+import ast
+from typing import Any, Callable, Dict, Optional
+
+import libcst as cst
+from libcst.metadata import MetadataWrapper
+
+from . import tracing
+
+
+class AnalysisContext:
+    """
+    Lazily parsed views of one source string.
+    """
+
+    def __init__(self, source_code: str, function_cache=None) -> None:
+        self.source_code = source_code
+        self.function_cache = function_cache
+        self._module: Optional[cst.Module] = None
+        self._module_error: Optional[Exception] = None
+        self._wrapper: Optional[MetadataWrapper] = None
+        self._tree: Optional[ast.Module] = None
+        self._tree_error: Optional[SyntaxError] = None
+        self._derived: Dict[str, Any] = {}
+
+    @property
+    def module(self) -> cst.Module:
+        if self._module is None:
+            if self._module_error is not None:
+                raise self._module_error
+            try:
+                with tracing.span("libcst", "parse"):
+                    self._module = cst.parse_module(self.source_code)
+            except Exception as e:
+                self._module_error = e
+                raise
+        return self._module
+
+    @property
+    def wrapper(self) -> MetadataWrapper:
+        if self._wrapper is None:
+            # The context owns the module and nothing mutates it, so the
+            # defensive deep copy MetadataWrapper makes by default is wasted.
+            self._wrapper = MetadataWrapper(self.module, unsafe_skip_copy=True)
+        return self._wrapper
+
+    @property
+    def tree(self) -> ast.Module:
+        if self._tree is None:
+            if self._tree_error is not None:
+                raise self._tree_error
+            try:
+                with tracing.span("ast", "parse"):
+                    self._tree = ast.parse(self.source_code)
+            except SyntaxError as e:
+                self._tree_error = e
+                raise
+        return self._tree
+
+    def has_cached(self, key: str) -> bool:
+        return key in self._derived
+
+    def cached(self, key: str, factory: Callable[[], Any]) -> Any:
+        """
+        Return the value stored under ``key``, computing it with ``factory``
+        the first time.
+        """
+        if key not in self._derived:
+            self._derived[key] = factory()
+        return self._derived[key]
+
+
+def ensure_context(
+    source_code: str, context: Optional[AnalysisContext] = None
+) -> AnalysisContext:
+    """
+    Return ``context`` if the caller already has one for this source,
+    otherwise a fresh context.
+    """
+    if context is not None and context.source_code == source_code:
+        return context
+    return AnalysisContext(source_code)
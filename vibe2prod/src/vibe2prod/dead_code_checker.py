@@ -1,8 +1,15 @@
+from typing import Optional, Tuple
+
 import libcst as cst
 import libcst.matchers as m
+from libcst.metadata import PositionProvider
+
+from .context import AnalysisContext, ensure_context
+from .issues import Issue
+from .rules import Rule, run_rules
 
 
-class DeadCodeCollector(cst.CSTVisitor):
+class DeadCodeCollector(Rule):
     """
     Finds:
     - unreachable code after return/raise/break/continue
@@ -10,42 +17,116 @@ class DeadCodeCollector(cst.CSTVisitor):
     - unused variables
     - unused parameters
     - unused imports
+
+    Findings are Issue records; their symbol is the function they were
+    found in (None for module-wide findings).
+
+    Names are kept in insertion-ordered dicts (not sets) so that module-wide
+    findings come out in source order, run after run.
     """
 
+    METADATA_DEPENDENCIES = (PositionProvider,)
+
     def __init__(self):
-        # Store issues as strings
-        self.issues = []
+        self.records = []
+        self._functions = []
 
-        # Track variables assigned + used
-        self.assigned = set()
-        self.used = set()
+        # Track variables assigned + used; assigned and imported names map
+        # to the line span where they first appear.
+        self.assigned = {}
+        self.used = {}
 
         # Track parameters per function
         self.current_params = []
 
         # Track imports
-        self.imported_names = set()
+        self.imported_names = {}
+
+        # Per record: the parameter it reports, if any. Used by merge().
+        self._params = []
+
+    @property
+    def issues(self):
+        return [record.message for record in self.records]
+
+    @property
+    def scopes(self):
+        return [record.symbol for record in self.records]
+
+    def _span(self, node: cst.CSTNode) -> Tuple[int, int]:
+        pos = self.get_metadata(PositionProvider, node)
+        return pos.start.line, pos.end.line
+
+    def _add(
+        self,
+        rule: str,
+        issue: str,
+        span: Tuple[int, int],
+        module_wide: bool = False,
+        param: Optional[str] = None,
+    ) -> None:
+        inside = self._functions and not module_wide
+        scope = self._functions[-1] if inside else None
+        self.records.append(Issue(rule, issue, *span, scope))
+        self._params.append(param)
+
+    incremental = True
+
+    def fragment(self):
+        return {
+            "issues": [[r.to_row() for r in self.records], self._params],
+            "assigned": [[name, *span] for name, span in self.assigned.items()],
+            "used": list(self.used),
+            "imported": [[name, *span] for name, span in self.imported_names.items()],
+        }
+
+    @classmethod
+    def merge(cls, context, fragments):
+        rule = cls()
+        for fragment, offset in fragments:
+            for row, param in zip(*fragment["issues"]):
+                # In a full walk a parameter also counts as used when an
+                # earlier unit used the name.
+                if param is not None and param in rule.used:
+                    continue
+                rule.records.append(Issue.from_row(row, offset))
+                rule._params.append(param)
+            for name, start, end in fragment["assigned"]:
+                rule.assigned.setdefault(name, (start + offset, end + offset))
+            rule.used.update(dict.fromkeys(fragment["used"]))
+            for name, start, end in fragment["imported"]:
+                rule.imported_names.setdefault(name, (start + offset, end + offset))
+        rule.finalize()
+        return rule
 
     # ---------- IMPORTS ----------
+    def _imported(self, alias: cst.ImportAlias) -> None:
+        name = alias.name
+        while isinstance(name, cst.Attribute):  # import a.b binds `a`
+            name = name.value
+        self.imported_names.setdefault(name.value, self._span(alias))
+
     def visit_Import(self, node):
         for name in node.names:
-            self.imported_names.add(name.name.value)
+            self._imported(name)
 
     def visit_ImportFrom(self, node):
+        if isinstance(node.names, cst.ImportStar):
+            return
         for name in node.names:
-            if hasattr(name, "name"):
-                self.imported_names.add(name.name.value)
+            self._imported(name)
 
     # ---------- VARIABLE USAGE ----------
     def visit_AssignTarget(self, node):
         if isinstance(node.target, cst.Name):
-            self.assigned.add(node.target.value)
+            self.assigned.setdefault(node.target.value, self._span(node.target))
 
     def visit_Name(self, node):
-        self.used.add(node.value)
+        self.used[node.value] = None
 
     # ---------- FUNCTION & PARAMS ----------
     def visit_FunctionDef(self, node):
+        self._functions.append(node.name.value)
         # Track parameters
         self.current_params = [
             p.name.value
@@ -59,20 +140,32 @@ class DeadCodeCollector(cst.CSTVisitor):
         # Check unused params
         for p in self.current_params:
             if p not in self.used:
-                self.issues.append(
-                    f"Parameter `{p}` in function `{original_node.name.value}` is never used."
+                self._add(
+                    "dead-code/unused-parameter",
+                    f"Parameter `{p}` in function `{original_node.name.value}` is never used.",
+                    self._span(original_node.name),
+                    param=p,
                 )
+        self._functions.pop()
 
 
     # ---------- ALWAYS FALSE CONDITIONALS ----------
     def visit_If(self, node):
         # if False:
         if m.matches(node.test, m.Name("False")):
-            self.issues.append("Found `if False:` block — always unreachable.")
+            self._add(
+                "dead-code/if-false",
+                "Found `if False:` block — always unreachable.",
+                self._span(node),
+            )
 
         # if 0:
         if m.matches(node.test, m.Integer("0")):
-            self.issues.append("Found `if 0:` block — always unreachable.")
+            self._add(
+                "dead-code/if-zero",
+                "Found `if 0:` block — always unreachable.",
+                self._span(node),
+            )
 
         # if 1 == 2:
         if m.matches(node.test, m.Comparison()):
@@ -87,7 +180,11 @@ class DeadCodeCollector(cst.CSTVisitor):
                     and isinstance(op, cst.Equal)
                     and int(left.value) != int(right.value)
                 ):
-                    self.issues.append("Found always-false comparison such as `1 == 2`.")
+                    self._add(
+                        "dead-code/always-false",
+                        "Found always-false comparison such as `1 == 2`.",
+                        self._span(node),
+                    )
             except Exception:
                 pass
 
@@ -96,7 +193,11 @@ class DeadCodeCollector(cst.CSTVisitor):
         saw_terminal = False
         for stmt in node.body:
             if saw_terminal:
-                self.issues.append("Unreachable code detected after return/raise/break/continue.")
+                self._add(
+                    "dead-code/unreachable",
+                    "Unreachable code detected after return/raise/break/continue.",
+                    self._span(stmt),
+                )
                 break
 
             if isinstance(stmt, cst.SimpleStatementLine):
@@ -108,26 +209,35 @@ class DeadCodeCollector(cst.CSTVisitor):
     # ---------- END ----------
     def finalize(self):
         # unused variables
-        for var in self.assigned:
+        for var, span in self.assigned.items():
             if var not in self.used:
-                self.issues.append(f"Variable `{var}` is assigned but never used.")
+                self._add(
+                    "dead-code/unused-variable",
+                    f"Variable `{var}` is assigned but never used.",
+                    span,
+                    module_wide=True,
+                )
 
         # unused imports
-        for name in self.imported_names:
+        for name, span in self.imported_names.items():
             if name not in self.used:
-                self.issues.append(f"Import `{name}` appears unused.")
+                self._add(
+                    "dead-code/unused-import",
+                    f"Import `{name}` appears unused.",
+                    span,
+                    module_wide=True,
+                )
 
 
-def analyze_dead_code(source_code: str):
+def analyze_dead_code(source_code: str, context: Optional[AnalysisContext] = None):
     """
     Returns list of dead code issues.
     """
+    context = ensure_context(source_code, context)
     try:
-        tree = cst.parse_module(source_code)
+        context.module
     except Exception:
         return []
 
-    visitor = DeadCodeCollector()
-    tree.visit(visitor)
-    visitor.finalize()
-    return visitor.issues
+    (rule,) = run_rules(context, DeadCodeCollector)
+    return rule.issues
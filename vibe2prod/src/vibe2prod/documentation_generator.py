@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import ast
-from typing import List, Dict, Any
+from typing import Any, Dict, Iterator, List, Optional
+
+from .context import AnalysisContext, ensure_context
+from .report_writer import join_lines
 
 
 def _format_args(args: ast.arguments) -> str:
@@ -79,23 +82,7 @@ def _extract_classes(tree: ast.Module) -> List[Dict[str, Any]]:
     return classes
 
 
-def generate_docs(source_code: str, filename: str) -> str:
-    """
-    Generate Markdown documentation for a Python module.
-
-    Uses:
-    - The module docstring as high-level overview (if present).
-    - Class and function docstrings.
-    - Simple signatures derived from the AST.
-
-    This is static (no LLM). If you want AI-enriched docs later,
-    you can pass this output through an LLM as a second step.
-    """
-    try:
-        tree = ast.parse(source_code)
-    except SyntaxError:
-        return f"# Documentation for `{filename}`\n\nUnable to parse file."
-
+def _doc_blocks(tree: ast.Module, filename: str) -> Iterator[List[str]]:
     module_doc = ast.get_docstring(tree) or ""
     funcs = _extract_functions(tree)
     classes = _extract_classes(tree)
@@ -112,12 +99,13 @@ def generate_docs(source_code: str, filename: str) -> str:
         lines.append("## Module Overview")
         lines.append("No module-level docstring found. Add one to describe the purpose of this module.")
     lines.append("")
+    yield lines
 
     # Classes
     if classes:
-        lines.append("## Classes")
-        lines.append("")
+        yield ["## Classes", ""]
         for cls in classes:
+            lines = []
             lines.append(f"### `{cls['name']}`")
             lines.append("")
             if cls["doc"]:
@@ -136,16 +124,15 @@ def generate_docs(source_code: str, filename: str) -> str:
                     else:
                         lines.append("  - _No method docstring provided._")
                 lines.append("")
+            yield lines
     else:
-        lines.append("## Classes")
-        lines.append("No classes found.")
-        lines.append("")
+        yield ["## Classes", "No classes found.", ""]
 
     # Functions
     if funcs:
-        lines.append("## Functions")
-        lines.append("")
+        yield ["## Functions", ""]
         for fn in funcs:
+            lines = []
             lines.append(f"### `{fn['signature']}`")
             lines.append("")
             if fn["doc"]:
@@ -153,9 +140,37 @@ def generate_docs(source_code: str, filename: str) -> str:
             else:
                 lines.append("_No function docstring provided._")
             lines.append("")
+            yield lines
     else:
-        lines.append("## Functions")
-        lines.append("No top-level functions found.")
-        lines.append("")
+        yield ["## Functions", "No top-level functions found.", ""]
 
-    return "\n".join(lines)
+
+def doc_sections(
+    source_code: str, filename: str, context: Optional[AnalysisContext] = None
+) -> Iterator[str]:
+    """
+    generate_docs, one section (overview, class, function) at a time.
+    """
+    try:
+        tree = ensure_context(source_code, context).tree
+    except SyntaxError:
+        yield f"# Documentation for `{filename}`\n\nUnable to parse file."
+        return
+    yield from join_lines(_doc_blocks(tree, filename))
+
+
+def generate_docs(
+    source_code: str, filename: str, context: Optional[AnalysisContext] = None
+) -> str:
+    """
+    Generate Markdown documentation for a Python module.
+
+    Uses:
+    - The module docstring as high-level overview (if present).
+    - Class and function docstrings.
+    - Simple signatures derived from the AST.
+
+    This is static (no LLM). If you want AI-enriched docs later,
+    you can pass this output through an LLM as a second step.
+    """
+    return "".join(doc_sections(source_code, filename, context))
@@ -1,7 +1,29 @@
 import hashlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
 import libcst as cst
 from libcst import metadata
 
+from .context import AnalysisContext, ensure_context
+from .rules import Rule, run_rules
+
+
+class _Normalizer(cst.CSTTransformer):
+    # Placeholders must be valid identifiers, otherwise libcst's node
+    # validation rejects them and nothing gets normalized.
+    def leave_Name(self, original_node, updated_node):
+        return updated_node.with_changes(value="_var")
+
+    def leave_Attribute(self, original_node, updated_node):
+        return updated_node.with_changes(attr=cst.Name("_attr"))
+
+    def leave_FunctionDef(self, original_node, updated_node):
+        return updated_node.with_changes(name=cst.Name("_func"))
+
+
+_NORMALIZER = _Normalizer()
+_EMPTY_MODULE = cst.Module(body=[])
+
 
 def normalize_node(node: cst.CSTNode) -> str:
     """
@@ -10,29 +32,16 @@ def normalize_node(node: cst.CSTNode) -> str:
     - function names removed
     - whitespace irrelevant
     """
-    class Normalizer(cst.CSTTransformer):
-        def leave_Name(self, original_node, updated_node):
-            return updated_node.with_changes(value="<var>")
-
-        def leave_Attribute(self, original_node, updated_node):
-            return updated_node.with_changes(attr=cst.Name("<attr>"))
-
-        def leave_FunctionDef(self, original_node, updated_node):
-            return updated_node.with_changes(name=cst.Name("<func>"))
-
     try:
         # First normalize the CST structure
-        new_node = node.visit(Normalizer())
+        new_node = node.visit(_NORMALIZER)
 
         # Safely convert *any* CST node into code
-        wrapper = cst.Module(body=[])
-        return wrapper.code_for_node(new_node)
+        return _EMPTY_MODULE.code_for_node(new_node)
 
     except Exception:
         # Fallback: try best-effort serialization
-        wrapper = cst.Module(body=[])
-        return wrapper.code_for_node(node)
-
+        return _EMPTY_MODULE.code_for_node(node)
 
 
 def structural_hash(text: str) -> str:
@@ -43,18 +52,70 @@ def structural_hash(text: str) -> str:
     return hashlib.md5(text.encode("utf-8")).hexdigest()
 
 
-class BlockCollector(cst.CSTVisitor):
+# Rolling-hash parameters for combining per-statement fingerprints into
+# window fingerprints: polynomial hashing modulo 2**64 with an odd base.
+_MOD = 1 << 64
+_BASE = 0x100000001B3
+
+# Shortest run of statements reported as a duplicate.
+MIN_CLONE_LENGTH = 2
+
+
+def text_fingerprint(normalized: str) -> int:
     """
-    Collects structural blocks inside functions.
-    Uses AST-based normalization and full multi-statement
-    block hashing.
+    64-bit fingerprint of already-normalized statement text.
+    """
+    digest = hashlib.md5(normalized.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def statement_fingerprint(stmt: cst.CSTNode) -> int:
+    """
+    64-bit fingerprint of one normalized statement.
+    """
+    return text_fingerprint(normalize_node(stmt).strip())
+
+
+def window_fingerprints(fingerprints, window_size):
+    """
+    Fingerprints of every run of ``window_size`` consecutive statements,
+    combined with a rolling polynomial hash in O(len(fingerprints)).
+    """
+    n = len(fingerprints)
+    if n < window_size:
+        return []
+
+    drop = pow(_BASE, window_size, _MOD)
+    h = 0
+    out = []
+    for i, fp in enumerate(fingerprints):
+        h = (h * _BASE + fp) % _MOD
+        if i >= window_size:
+            h = (h - fingerprints[i - window_size] * drop) % _MOD
+        if i >= window_size - 1:
+            out.append(h)
+    return out
+
+
+class BlockCollector(Rule):
+    """
+    Collects the structural statement sequence of every function.
+    Uses AST-based normalization; each statement is normalized and
+    hashed exactly once.
     """
 
     METADATA_DEPENDENCIES = (metadata.PositionProvider,)
 
     def __init__(self, source_lines):
         self.source_lines = source_lines
-        self.blocks = []  # list of (hash, func_name, text)
+        # per function: (func_name, statement fingerprints, start lines, end lines)
+        self.functions = []
+        # per function (parallel to self.functions): normalized statement texts
+        self.normalized = []
+
+    @classmethod
+    def for_context(cls, context: AnalysisContext) -> "BlockCollector":
+        return cls(context.source_code.split("\n"))
 
     def visit_FunctionDef(self, node: cst.FunctionDef):
         func_name = node.name.value
@@ -62,48 +123,224 @@ class BlockCollector(cst.CSTVisitor):
         # We analyze the full sequence of statements inside the function
         stmts = node.body.body
 
-        # slide windows of size 2–6 consecutive statements
-        for window_size in range(2, 7):
-            for i in range(len(stmts) - window_size + 1):
-                block = stmts[i : i + window_size]
+        texts = []
+        fingerprints = []
+        starts = []
+        ends = []
+        for stmt in stmts:
+            pos = self.get_metadata(metadata.PositionProvider, stmt)
+            starts.append(pos.start.line)
+            ends.append(pos.end.line)
+            text = normalize_node(stmt).strip()
+            texts.append(text)
+            fingerprints.append(text_fingerprint(text))
+        self.functions.append((func_name, fingerprints, starts, ends))
+        self.normalized.append(texts)
 
-                # get the actual source code for each statement sequentially
-                pos_start = self.get_metadata(metadata.PositionProvider, block[0]).start.line - 1
-                pos_end = self.get_metadata(metadata.PositionProvider, block[-1]).end.line
-                raw_text = "\n".join(self.source_lines[pos_start:pos_end])
+    incremental = True
 
-                # normalize by CST structure
-                structural_repr = "\n".join(
-                    normalize_node(stmt) for stmt in block
+    def fragment(self):
+        return [
+            [*function, texts]
+            for function, texts in zip(self.functions, self.normalized)
+        ]
+
+    @classmethod
+    def merge(cls, context, fragments):
+        rule = cls.for_context(context)
+        for functions, offset in fragments:
+            for name, fingerprints, starts, ends, texts in functions:
+                rule.functions.append(
+                    (
+                        name,
+                        fingerprints,
+                        [line + offset for line in starts],
+                        [line + offset for line in ends],
+                    )
                 )
+                rule.normalized.append(texts)
+        return rule
+
+    def block_text(self, start_line: int, end_line: int) -> str:
+        return "\n".join(self.source_lines[start_line - 1 : end_line])
 
-                h = structural_hash(structural_repr)
 
-                self.blocks.append((h, func_name, raw_text))
+# ---------- Maximal clone detection ----------
 
 
-def analyze_duplicates(source_code: str):
+def _suffix_array(seq: List[int]) -> List[int]:
     """
-    Detect duplicate multi-line logic blocks.
-    Returns {hash: [(func_name, block), ...]}
+    Suffix array by prefix doubling. ``seq`` must hold small non-negative
+    ints; each doubling round is one sort, and rounds stop as soon as all
+    ranks are distinct (i.e. after ~log2 of the longest repeat).
+    """
+    n = len(seq)
+    sa = sorted(range(n), key=seq.__getitem__)
+    rank = list(seq)
+    k = 1
+    while True:
+        def key(i, rank=rank, k=k):
+            return (rank[i], rank[i + k] if i + k < n else -1)
+
+        sa.sort(key=key)
+        new_rank = [0] * n
+        for j in range(1, n):
+            new_rank[sa[j]] = new_rank[sa[j - 1]] + (key(sa[j]) != key(sa[j - 1]))
+        rank = new_rank
+        if rank[sa[-1]] == n - 1:
+            return sa
+        k *= 2
+
+
+def _lcp_array(seq: List[int], sa: List[int]) -> List[int]:
+    """
+    Kasai's algorithm: lcp[i] is the longest common prefix of the suffixes
+    at sa[i - 1] and sa[i].
+    """
+    n = len(seq)
+    rank = [0] * n
+    for i, p in enumerate(sa):
+        rank[p] = i
+
+    lcp = [0] * n
+    h = 0
+    for i in range(n):
+        r = rank[i]
+        if r == 0:
+            h = 0
+            continue
+        j = sa[r - 1]
+        while i + h < n and j + h < n and seq[i + h] == seq[j + h]:
+            h += 1
+        lcp[r] = h
+        if h:
+            h -= 1
+    return lcp
+
+
+def find_maximal_clones(
+    sequences: Sequence[Sequence[int]], min_length: int = MIN_CLONE_LENGTH
+) -> List[Tuple[int, List[Tuple[int, int]]]]:
+    """
+    Find every maximal repeated run of statement fingerprints.
+
+    ``sequences`` holds one fingerprint list per function. Returns
+    [(length, [(sequence index, start offset), ...]), ...]: one entry per
+    maximal clone, i.e. a run that cannot be extended left or right without
+    losing an occurrence, so a long clone is reported once rather than as
+    many overlapping fixed-size windows.
+
+    Runs never cross function boundaries. The work is a suffix array plus
+    LCP array over all statements, then one stack pass over LCP intervals.
+    """
+    # Concatenate with a unique separator after each function, and compress
+    # fingerprints to dense ranks so the suffix sort compares small ints.
+    ids: Dict[int, int] = {}
+    seq: List[int] = []
+    owner: List[Tuple[int, int]] = []
+    separators = 0
+    for index, fingerprints in enumerate(sequences):
+        for offset, fp in enumerate(fingerprints):
+            seq.append(ids.setdefault(fp, len(ids)))
+            owner.append((index, offset))
+        seq.append(-1 - separators)
+        owner.append((index, -1))
+        separators += 1
+
+    if not seq:
+        return []
+
+    # Shift separators above every fingerprint id: all values stay distinct.
+    top = len(ids)
+    seq = [v if v >= 0 else top - 1 - v for v in seq]
+
+    n = len(seq)
+    sa = _suffix_array(seq)
+    lcp = _lcp_array(seq, sa)
+
+    clones = []
+
+    def emit(length: int, lb: int, rb: int) -> None:
+        if length < min_length:
+            return
+        starts = sa[lb : rb + 1]
+        # Left-maximal: the occurrences don't all share the same predecessor.
+        preceding = {seq[p - 1] if p > 0 else -1 for p in starts}
+        if len(preceding) == 1 and -1 not in preceding:
+            return
+        clones.append((length, sorted(owner[p] for p in starts)))
+
+    stack = [(0, 0)]  # (lcp value, left bound) of open intervals
+    for i in range(1, n + 1):
+        current = lcp[i] if i < n else 0
+        lb = i - 1
+        while current < stack[-1][0]:
+            length, lb = stack.pop()
+            emit(length, lb, i - 1)
+        if current > stack[-1][0]:
+            stack.append((current, lb))
+
+    clones.sort(key=lambda c: (c[1][0], -c[0]))
+    return clones
+
+
+def _run_fingerprint(fingerprints: Sequence[int]) -> int:
+    h = 0
+    for fp in fingerprints:
+        h = (h * _BASE + fp) % _MOD
+    return h
+
+
+def collect_blocks(context: AnalysisContext) -> Optional[BlockCollector]:
+    """
+    BlockCollector for a context, run at most once; exact and
+    near-duplicate detection (and the clone index) share the result.
+    Returns None for code that does not parse.
     """
     try:
-        module = cst.parse_module(source_code)
+        context.wrapper
     except Exception:
-        return {}
+        return None
 
-    wrapper = cst.metadata.MetadataWrapper(module)
-    lines = source_code.split("\n")
+    (collector,) = run_rules(context, BlockCollector)
+    return collector
 
-    collector = BlockCollector(lines)
-    wrapper.visit(collector)
+
+def duplicate_blocks(
+    context: AnalysisContext,
+) -> Dict[str, List[Tuple[str, int, int, str]]]:
+    """
+    Like analyze_duplicates, with the line span of every occurrence:
+    {hash: [(func_name, first line, last line, block), ...]}.
+    """
+    collector = collect_blocks(context)
+    if collector is None:
+        return {}
+
+    functions = collector.functions
+    clones = find_maximal_clones([f[1] for f in functions])
 
     dup_map = {}
+    for length, occurrences in clones:
+        index, offset = occurrences[0]
+        h = _run_fingerprint(functions[index][1][offset : offset + length])
+        blocks = []
+        for index, offset in occurrences:
+            func_name, _, starts, ends = functions[index]
+            start, end = starts[offset], ends[offset + length - 1]
+            blocks.append((func_name, start, end, collector.block_text(start, end)))
+        dup_map[f"{h:016x}"] = blocks
+
+    return dup_map
 
-    for h, fn, text in collector.blocks:
-        if h not in dup_map:
-            dup_map[h] = []
-        dup_map[h].append((fn, text))
 
-    # filter only hashes with more than one occurrence
-    return {h: v for h, v in dup_map.items() if len(v) > 1}
+def analyze_duplicates(source_code: str, context: Optional[AnalysisContext] = None):
+    """
+    Detect duplicate multi-line logic blocks of any length.
+    Returns {hash: [(func_name, block), ...]}, one entry per maximal clone.
+    """
+    blocks = duplicate_blocks(ensure_context(source_code, context))
+    return {
+        h: [(func_name, text) for func_name, _, _, text in items]
+        for h, items in blocks.items()
+    }
@@ -0,0 +1,153 @@
+"""
+Persistent per-function analysis cache.
+
+The incremental rules (see rules.py) analyse every top-level function and
+class on its own and store the partial result ("fragment") here, keyed by
+a SHA-256 of the unit's code and the vibe2prod version, one row per rule.
+A later run over an edited module walks only the functions whose code
+changed and merges the stored fragments for the rest.
+
+Rows live in one SQLite database next to the other caches; when it grows
+past ``max_bytes`` the least recently used rows are deleted.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+from .utils import default_cache_dir
+
+
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+
+# After eviction the cache is trimmed to this fraction of the limit.
+_EVICT_TARGET = 0.9
+
+# Keys per SELECT; stays well below SQLite's bound-parameter limit.
+_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fragments (
+    key TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    data TEXT NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (key, rule)
+);
+CREATE INDEX IF NOT EXISTS fragments_accessed ON fragments (accessed);
+"""
+
+Fragments = Dict[str, Dict[str, Any]]
+
+
+class FunctionCache:
+    """
+    {unit key: {rule: fragment}} in SQLite.
+
+    Like LLMCache it can be shared between processes and pickled into batch
+    workers; the connection is opened lazily per process.
+    """
+
+    def __init__(
+        self, directory: Optional[Path] = None, max_bytes: int = DEFAULT_MAX_BYTES
+    ) -> None:
+        self.path = Path(directory or default_cache_dir()) / "functions.sqlite3"
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        return state
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def get_many(self, keys: Sequence[str], rules: Sequence[str]) -> Fragments:
+        """
+        Stored fragments of ``rules`` for ``keys``. A unit counts as a hit
+        when every requested rule was found.
+        """
+        found: Fragments = {}
+        keys = list(dict.fromkeys(keys))
+        rule_marks = ",".join("?" * len(rules))
+        for i in range(0, len(keys), _BATCH):
+            batch = keys[i : i + _BATCH]
+            rows = self._db.execute(
+                f"SELECT key, rule, data FROM fragments "
+                f"WHERE rule IN ({rule_marks}) "
+                f"AND key IN ({','.join('?' * len(batch))})",
+                (*rules, *batch),
+            ).fetchall()
+            for key, rule, data in rows:
+                found.setdefault(key, {})[rule] = json.loads(data)
+
+        if found:
+            now = time.time()
+            self._db.executemany(
+                "UPDATE fragments SET accessed = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+        complete = sum(len(found.get(key, ())) == len(rules) for key in keys)
+        self.hits += complete
+        self.misses += len(keys) - complete
+        return found
+
+    def put_many(self, fragments: Fragments) -> None:
+        now = time.time()
+        rows = []
+        for key, by_rule in fragments.items():
+            for rule, fragment in by_rule.items():
+                data = json.dumps(fragment, separators=(",", ":"))
+                rows.append((key, rule, data, now, len(data)))
+        db = self._db
+        with db:
+            db.execute("BEGIN")
+            db.executemany(
+                "INSERT OR REPLACE INTO fragments (key, rule, data, accessed, size) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        if self.size() > self.max_bytes:
+            self.evict()
+
+    def size(self) -> int:
+        return self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM fragments"
+        ).fetchone()[0]
+
+    def evict(self) -> None:
+        """
+        Drop least recently used rows until the cache fits in
+        ``_EVICT_TARGET * max_bytes``.
+        """
+        db = self._db
+        excess = self.size() - int(self.max_bytes * _EVICT_TARGET)
+        doomed = []
+        for key, rule, size in db.execute(
+            "SELECT key, rule, size FROM fragments ORDER BY accessed"
+        ).fetchall():
+            if excess <= 0:
+                break
+            doomed.append((key, rule))
+            excess -= size
+        db.executemany("DELETE FROM fragments WHERE key = ? AND rule = ?", doomed)
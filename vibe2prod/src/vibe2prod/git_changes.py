@@ -0,0 +1,182 @@
+"""
+Changed-files-only mode: ask git what changed.
+
+``changed_lines`` runs plain ``git diff`` (against a ref, or the index
+for staged changes) with zero context lines and fixed ``a/``/``b/``
+prefixes, whatever the user's diff settings, and returns, for each added,
+modified or renamed Python file, the line ranges its hunks cover in the
+new version. ``focus_for`` maps those ranges onto the functions that
+contain them, so the report can be narrowed to what the change touched.
+For staged changes those ranges are line numbers in the index version;
+``staged_sources`` supplies that version for files whose working-tree copy
+has moved on since.
+"""
+
+from __future__ import annotations
+
+import ast
+import re
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .config import ReportFocus
+
+# (first, last) line numbers in the new version of a file, inclusive.
+LineRange = Tuple[int, int]
+
+_HUNK = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+
+# The C escapes git uses in quoted path names, besides three-digit octal.
+_ESCAPES = {"a": 7, "b": 8, "t": 9, "n": 10, "v": 11, "f": 12, "r": 13}
+
+
+class GitError(RuntimeError):
+    pass
+
+
+def _git(args: Sequence[str], cwd: Optional[Path] = None) -> str:
+    try:
+        proc = subprocess.run(
+            ["git", *args],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            # Hunks may quote files in other encodings; only the line
+            # numbers and names matter here.
+            errors="replace",
+            check=True,
+        )
+    except FileNotFoundError as e:
+        raise GitError("git is not installed") from e
+    except subprocess.CalledProcessError as e:
+        raise GitError(e.stderr.strip() or f"git {' '.join(args)} failed") from e
+    return proc.stdout
+
+
+def _unquote(name: str) -> str:
+    """
+    A path name as git printed it, with its C-style quoting undone: names
+    holding a quote, backslash or control character (and, unless
+    ``core.quotePath`` is off, any non-ASCII byte) come in double quotes.
+    """
+    if not (len(name) >= 2 and name[0] == name[-1] == '"'):
+        return name
+    body = name[1:-1]
+    raw = bytearray()
+    i = 0
+    while i < len(body):
+        char = body[i]
+        if char != "\\":
+            raw += char.encode("utf-8")
+            i += 1
+        elif body[i + 1] in "01234567":
+            raw.append(int(body[i + 1 : i + 4], 8))
+            i += 4
+        else:
+            raw.append(_ESCAPES.get(body[i + 1], ord(body[i + 1])))
+            i += 2
+    return raw.decode("utf-8", "surrogateescape")
+
+
+def parse_diff(diff: str) -> Dict[str, List[LineRange]]:
+    """
+    {path relative to the repository root: changed line ranges} from
+    ``git diff --unified=0 --dst-prefix=b/`` output.
+    """
+    changes: Dict[str, List[LineRange]] = {}
+    current: Optional[List[LineRange]] = None
+    for line in diff.splitlines():
+        if line.startswith("+++ "):
+            target = line[4:]
+            # git ends the name with a TAB when it contains a space.
+            if target.endswith("\t"):
+                target = target[:-1]
+            current = None
+            if target != "/dev/null":
+                target = _unquote(target)
+                if target.startswith("b/"):
+                    target = target[2:]
+                current = changes.setdefault(target, [])
+            continue
+        match = _HUNK.match(line)
+        if match and current is not None:
+            start = int(match.group(1))
+            count = int(match.group(2) or 1)
+            if count:
+                current.append((start, start + count - 1))
+            else:
+                # Pure deletion after line ``start``: touch both neighbours.
+                current.append((max(start, 1), start + 1))
+    return changes
+
+
+def changed_lines(
+    since: Optional[str] = None, staged: bool = False, cwd: Optional[Path] = None
+) -> Dict[Path, List[LineRange]]:
+    """
+    Changed Python files with their changed line ranges: the working tree
+    against ``since`` (default HEAD), or the index against HEAD when
+    ``staged``. Deleted and untracked files are left out.
+    """
+    root = Path(_git(["rev-parse", "--show-toplevel"], cwd).strip())
+    args = [
+        "-c",
+        "core.quotePath=false",
+        "diff",
+        "--unified=0",
+        "--no-color",
+        "--no-ext-diff",
+        "--diff-filter=AMR",
+        "--src-prefix=a/",
+        "--dst-prefix=b/",
+    ]
+    if staged:
+        args.append("--cached")
+    if since:
+        args.append(since)
+    args += ["--", "*.py"]
+    return {
+        root / path: ranges for path, ranges in parse_diff(_git(args, root)).items()
+    }
+
+
+def staged_sources(cwd: Optional[Path] = None) -> Dict[Path, str]:
+    """
+    The index version of every Python file that also has unstaged changes,
+    for analysing exactly what ``changed_lines(staged=True)`` describes.
+    Files whose working tree matches the index are left out.
+    """
+    root = Path(_git(["rev-parse", "--show-toplevel"], cwd).strip())
+    listing = _git(
+        ["-c", "core.quotePath=false", "diff", "--name-only", "-z", "--", "*.py"],
+        root,
+    )
+    return {
+        root / name: _git(["show", f":{name}"], root)
+        for name in listing.split("\0")
+        if name
+    }
+
+
+def focus_for(tree: ast.Module, ranges: Sequence[LineRange]) -> ReportFocus:
+    """
+    The functions (with their enclosing functions) whose lines, decorators
+    included, overlap ``ranges``; module level if any changed line lies
+    outside every function.
+    """
+    spans = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            first = min([node.lineno] + [d.lineno for d in node.decorator_list])
+            spans.append((first, node.end_lineno, node.name))
+
+    functions = set()
+    module_level = False
+    for start, end in ranges:
+        for line in range(start, end + 1):
+            owners = [name for first, last, name in spans if first <= line <= last]
+            functions.update(owners)
+            module_level = module_level or not owners
+    return ReportFocus(frozenset(functions), module_level)
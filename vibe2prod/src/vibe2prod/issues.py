@@ -0,0 +1,216 @@
+"""
+Structured findings and the machine-readable report writers.
+
+Every finding is an Issue: a rule id, a severity, the file, a line span,
+the function it belongs to, and the message the Markdown report shows.
+Reports on large trees hold many of them, so Issue is slotted and rule ids
+are interned (each record points at one shared string per rule).
+
+Writers take any iterable of Issues and write each one as soon as it is
+produced, so a generator of records is never materialized:
+
+- ``write_jsonl``: one JSON object per line.
+- ``write_sarif``: a SARIF 2.1.0 log (GitHub code scanning, IDEs);
+  SarifWriter does the same one issue at a time.
+
+Markdown is rendered from the same records by report_generator.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, TextIO, Tuple, Union
+
+from . import __version__
+
+# rule id -> (SARIF level, short description). The prefix before "/" is
+# the report section a rule belongs to.
+RULES: Dict[str, Tuple[str, str]] = {
+    "complexity/nesting": ("note", "Deeply nested function"),
+    "complexity/loops": ("note", "Loop-heavy function"),
+    "complexity/conditionals": ("note", "Function with many conditionals"),
+    "complexity/length": ("note", "Long function"),
+    "naming/function": ("warning", "Function name is not snake_case"),
+    "naming/parameter-short": ("note", "Parameter name too short"),
+    "naming/parameter": ("warning", "Parameter name is not snake_case"),
+    "naming/class": ("warning", "Class name is not PascalCase"),
+    "naming/constant": ("warning", "Constant is not SCREAMING_SNAKE_CASE"),
+    "naming/variable-short": ("note", "Variable name too short"),
+    "naming/variable": ("warning", "Variable name is not snake_case"),
+    "dead-code/if-false": ("warning", "`if False:` block"),
+    "dead-code/if-zero": ("warning", "`if 0:` block"),
+    "dead-code/always-false": ("warning", "Always-false comparison"),
+    "dead-code/unreachable": ("warning", "Unreachable code"),
+    "dead-code/unused-parameter": ("warning", "Unused parameter"),
+    "dead-code/unused-variable": ("warning", "Unused variable"),
+    "dead-code/unused-import": ("warning", "Unused import"),
+    "duplicate/block": ("note", "Duplicated statement block"),
+    "near-duplicate/function": ("note", "Near-duplicate functions"),
+    "comment-drift/docstring": ("note", "Docstring out of date with the code"),
+}
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+
+# Issue files are relative to the analysed tree's root; SARIF consumers
+# (GitHub code scanning among them) resolve this base to their checkout.
+SRCROOT = "%SRCROOT%"
+
+_RULE_INDEX = {rule: i for i, rule in enumerate(RULES)}
+
+
+@dataclass(slots=True)
+class Issue:
+    """
+    One finding. ``line``/``end_line`` are 1-based and inclusive;
+    ``symbol`` is the function the finding is in (None: module level).
+    ``severity`` defaults to the rule's level.
+    """
+
+    rule: str
+    message: str
+    line: Optional[int] = None
+    end_line: Optional[int] = None
+    symbol: Optional[str] = None
+    file: Optional[str] = None
+    severity: str = ""
+
+    def __post_init__(self) -> None:
+        self.rule = sys.intern(self.rule)
+        if not self.severity:
+            self.severity = RULES[self.rule][0]
+
+    @property
+    def category(self) -> str:
+        return self.rule.partition("/")[0]
+
+    def to_row(self) -> List[Any]:
+        """
+        Compact JSON-able form without the file, for the FunctionCache.
+        """
+        return [self.rule, self.message, self.line, self.end_line, self.symbol]
+
+    @classmethod
+    def from_row(cls, row: List[Any], offset: int = 0) -> "Issue":
+        rule, message, line, end_line, symbol = row
+        if line is not None:
+            line, end_line = line + offset, end_line + offset
+        return cls(rule, message, line, end_line, symbol)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rule": self.rule,
+            "severity": self.severity,
+            "file": self.file,
+            "line": self.line,
+            "end_line": self.end_line,
+            "symbol": self.symbol,
+            "message": self.message,
+        }
+
+
+@dataclass(slots=True)
+class FunctionMetrics:
+    """
+    Size and complexity of one function, as listed in the Markdown report.
+    """
+
+    name: str
+    line: int
+    end_line: int
+    loops: int
+    ifs: int
+    depth: int
+    stmts: int
+    magic: Tuple[Union[int, float], ...] = ()
+
+
+def write_jsonl(issues: Iterable[Issue], out: TextIO) -> int:
+    """
+    Write one JSON object per issue; returns how many were written.
+    """
+    count = 0
+    for issue in issues:
+        out.write(json.dumps(issue.to_dict(), ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def sarif_result(issue: Issue) -> Dict[str, Any]:
+    artifact = {"uri": issue.file or ""}
+    if issue.file:
+        artifact["uriBaseId"] = SRCROOT
+    location: Dict[str, Any] = {"physicalLocation": {"artifactLocation": artifact}}
+    if issue.line is not None:
+        location["physicalLocation"]["region"] = {
+            "startLine": issue.line,
+            "endLine": issue.end_line or issue.line,
+        }
+    if issue.symbol is not None:
+        location["logicalLocations"] = [{"name": issue.symbol, "kind": "function"}]
+
+    result: Dict[str, Any] = {
+        "ruleId": issue.rule,
+        "level": issue.severity,
+        "message": {"text": issue.message},
+        "locations": [location],
+    }
+    if issue.rule in _RULE_INDEX:
+        result["ruleIndex"] = _RULE_INDEX[issue.rule]
+    return result
+
+
+class SarifWriter:
+    """
+    Streams a SARIF 2.1.0 log with one run: the tool header is written on
+    construction, each result as it arrives, the closing brackets by
+    close().
+    """
+
+    def __init__(self, out: TextIO) -> None:
+        rules = [
+            {
+                "id": rule,
+                "shortDescription": {"text": description},
+                "defaultConfiguration": {"level": level},
+            }
+            for rule, (level, description) in RULES.items()
+        ]
+        driver = {"name": "vibe2prod", "version": __version__, "rules": rules}
+        log = {
+            "$schema": SARIF_SCHEMA,
+            "version": "2.1.0",
+            "runs": [{"tool": {"driver": driver}, "results": []}],
+        }
+        # The log with an empty results list, split where results go.
+        head, self._tail = json.dumps(log, ensure_ascii=False).rsplit("[]", 1)
+        self.out = out
+        self.count = 0
+        out.write(head + "[")
+
+    def write(self, issue: Issue) -> None:
+        self.write_result(sarif_result(issue))
+
+    def write_result(self, result: Dict[str, Any]) -> None:
+        """
+        Write an already-built SARIF result object.
+        """
+        self.out.write(("," if self.count else "") + "\n")
+        self.out.write(json.dumps(result, ensure_ascii=False))
+        self.count += 1
+
+    def close(self) -> None:
+        self.out.write("\n]" + self._tail + "\n")
+
+
+def write_sarif(issues: Iterable[Issue], out: TextIO) -> int:
+    """
+    Write a SARIF 2.1.0 log with one run; returns how many results were
+    written.
+    """
+    writer = SarifWriter(out)
+    for issue in issues:
+        writer.write(issue)
+    writer.close()
+    return writer.count
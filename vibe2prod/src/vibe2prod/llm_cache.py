@@ -0,0 +1,252 @@
+"""
+Persistent cache of LLM responses.
+
+A response is keyed on a SHA-256 over everything that determines it: the
+model, the temperature, the prompt template and the source text. A hit
+is served straight from a local SQLite database without touching the
+network, the rate limiter or the API key.
+
+Entries expire after ``ttl`` seconds. When the stored responses exceed
+``max_bytes``, the least recently used ones are deleted. Hit and miss
+counts are kept per instance (this process) and in the database (all
+runs, all worker processes).
+
+The same database remembers, per input file, the last rewrite of each
+top-level function or class (by name, and by position among chunks of
+that name) together with a hash of its normalized source, so an
+incremental run only resends the functions that changed (see llm_chunks).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .utils import default_cache_dir
+
+# (name, ordinal): the ordinal tells apart top-level definitions that share
+# a name (0 for the first, 1 for a later redefinition, ...).
+ChunkId = Tuple[str, int]
+
+
+DEFAULT_TTL = 30 * 24 * 3600
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# After eviction the cache is trimmed to this fraction of the limit.
+_EVICT_TARGET = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE TABLE IF NOT EXISTS chunk_rewrites (
+    file TEXT NOT NULL,
+    function TEXT NOT NULL,
+    ordinal INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    rewrite TEXT NOT NULL,
+    PRIMARY KEY (file, function, ordinal)
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Bumped with each change to the layout of an existing database; _migrate
+# brings an older one up to date once, on its first connection.
+_SCHEMA_VERSION = 1
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    (version,) = conn.execute("PRAGMA user_version").fetchone()
+    if version >= _SCHEMA_VERSION:
+        return
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        # Version 1: remembered rewrites are keyed by (name, ordinal) in
+        # chunk_rewrites; the by-name table they replace is dropped.
+        conn.execute("DROP TABLE IF EXISTS rewrites")
+        conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+
+def prompt_key(model: str, temperature: float, template: str, source_code: str) -> str:
+    payload = json.dumps(
+        {
+            "model": model,
+            "temperature": temperature,
+            "template": hashlib.sha256(template.encode("utf-8")).hexdigest(),
+            "source": hashlib.sha256(source_code.encode("utf-8")).hexdigest(),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    SQLite-backed response cache with TTL and LRU size eviction.
+
+    Safe to share between processes (SQLite locking, WAL journal) and to
+    pickle into batch workers: the connection is opened lazily per process.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.path = Path(directory or default_cache_dir()) / "llm.sqlite3"
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.reused = 0
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        return state
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            _migrate(conn)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _count(self, name: str) -> None:
+        self._db.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        row = self._db.execute(
+            "SELECT response, created FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is not None and now - row[1] > self.ttl:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            row = None
+
+        if row is None:
+            self.misses += 1
+            self._count("misses")
+            return None
+
+        self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        self._count("hits")
+        return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO responses (key, response, created, accessed, size) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, response, now, now, len(response.encode("utf-8"))),
+        )
+        if self.size() > self.max_bytes:
+            self.evict()
+
+    def size(self) -> int:
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def evict(self) -> None:
+        """
+        Drop expired entries, then least recently used ones until the cache
+        fits in ``_EVICT_TARGET * max_bytes``.
+        """
+        db = self._db
+        db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+
+        excess = self.size() - int(self.max_bytes * _EVICT_TARGET)
+        if excess <= 0:
+            return
+        doomed = []
+        for key, size in db.execute(
+            "SELECT key, size FROM responses ORDER BY accessed"
+        ).fetchall():
+            if excess <= 0:
+                break
+            doomed.append((key,))
+            excess -= size
+        db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def previous_rewrites(self, file: str) -> Dict[ChunkId, Tuple[str, str]]:
+        """
+        {(name, ordinal): (normalized source hash, rewrite)} from the last
+        run over ``file``.
+        """
+        rows = self._db.execute(
+            "SELECT function, ordinal, hash, rewrite FROM chunk_rewrites "
+            "WHERE file = ?",
+            (file,),
+        ).fetchall()
+        return {(name, n): (h, rewrite) for name, n, h, rewrite in rows}
+
+    def record_rewrites(
+        self, file: str, rewrites: Dict[ChunkId, Tuple[str, str]]
+    ) -> None:
+        """
+        Replace what is remembered for ``file``; functions that no longer
+        exist are forgotten.
+        """
+        db = self._db
+        with db:
+            db.execute("BEGIN")
+            db.execute("DELETE FROM chunk_rewrites WHERE file = ?", (file,))
+            db.executemany(
+                "INSERT INTO chunk_rewrites (file, function, ordinal, hash, rewrite) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (file, name, n, h, rewrite)
+                    for (name, n), (h, rewrite) in rewrites.items()
+                ],
+            )
+
+    def count_reused(self, n: int = 1) -> None:
+        self.reused += n
+        self._db.execute(
+            "INSERT INTO counters (name, value) VALUES ('reused', ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + ?",
+            (n, n),
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Totals recorded in the database across all runs.
+        """
+        db = self._db
+        counters = dict(db.execute("SELECT name, value FROM counters").fetchall())
+        entries = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "reused": counters.get("reused", 0),
+            "entries": entries,
+            "bytes": self.size(),
+        }
@@ -0,0 +1,354 @@
+"""
+Function-level chunked LLM rewriting.
+
+Instead of one prompt holding the whole file, the module is split with
+libcst into its top-level functions and classes ("chunks"); everything
+else (imports, constants, the ``__main__`` block, comments) is kept
+verbatim. Every chunk of every file is rewritten concurrently through one
+AsyncLLMClient, so a file takes about as long as its slowest chunk and no
+prompt approaches the context limit.
+
+Each rewritten chunk must parse with ``ast.parse`` and still define the
+name it replaces; otherwise just that chunk is requested again, up to
+``chunk_retries`` times, and finally kept as it was. A chunk whose request
+fails outright (network, auth, rate limit) is kept as it was too. The
+chunks are then spliced back between the untouched statements; a file in
+which any chunk was kept gets an ``ERROR_PREFIX`` header, so it is not
+mistaken for a finished rewrite.
+
+Runs are incremental when a cache and the files' identities are given:
+the rewrite of every chunk is remembered per file together with a hash
+of the chunk's normalized source (its AST, so comments and formatting do
+not count). On the next run a chunk whose hash is unchanged reuses that
+rewrite verbatim; only edited functions go to the LLM.
+"""
+
+from __future__ import annotations
+
+import ast
+import asyncio
+import hashlib
+import json
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Union
+
+import libcst as cst
+
+from .llm_cache import ChunkId, LLMCache, prompt_key
+from .llm_client import (
+    ERROR_PREFIX,
+    MODEL,
+    TEMPERATURE,
+    AsyncLLMClient,
+    rewrite_many_with_llm,
+)
+
+
+DEFAULT_CHUNK_RETRIES = 2
+
+CHUNK_PROMPT = """
+You are an advanced senior-level Python refactoring engine.
+
+Below is ONE top-level {kind} from a larger Python module. Rewrite it:
+- Improve structure, naming of locals, clarity, and readability.
+- Keep behavior EXACTLY the same.
+- Keep the name `{name}` and its signature unchanged; other code calls it.
+- Add a docstring if it is missing.
+- Replace magic numbers with descriptive named values.
+- You may add small private helpers right after it if that helps.
+
+Code:
+--------------------
+{code}
+--------------------
+
+Return ONLY valid Python code with no commentary outside code.
+"""
+
+_FENCE = re.compile(r"^```[\w-]*\n(.*?)\n?```\s*$", re.S)
+
+
+@dataclass
+class Segment:
+    """
+    One top-level statement. ``name`` is set for rewritable chunks
+    (functions and classes) and None for code kept verbatim.
+    """
+
+    leading: str
+    code: str
+    name: Optional[str] = None
+    kind: str = ""
+
+
+@dataclass
+class SplitModule:
+    header: str
+    segments: List[Segment]
+    footer: str
+    trailing_newline: bool = True
+
+    @property
+    def chunks(self) -> List[int]:
+        return [i for i, s in enumerate(self.segments) if s.name is not None]
+
+    def chunk_ids(self) -> Dict[int, ChunkId]:
+        """
+        {segment index: (name, ordinal)} for every chunk; a name defined
+        twice at top level gets ordinals 0 and 1.
+        """
+        seen: Dict[str, int] = {}
+        ids = {}
+        for i in self.chunks:
+            name = self.segments[i].name
+            ids[i] = (name, seen.get(name, 0))
+            seen[name] = ids[i][1] + 1
+        return ids
+
+    def join(self, rewrites: Optional[Dict[int, str]] = None) -> str:
+        """
+        Reassemble the module, with chunk i replaced by ``rewrites[i]`` if
+        present. Without rewrites this gives back the parsed source.
+        """
+        rewrites = rewrites or {}
+        out = [self.header]
+        for i, segment in enumerate(self.segments):
+            out.append(segment.leading)
+            code = rewrites.get(i)
+            if code is None:
+                out.append(segment.code)
+            else:
+                out.append(code if code.endswith("\n") else code + "\n")
+        out.append(self.footer)
+        text = "".join(out)
+        if not self.trailing_newline and text.endswith("\n"):
+            text = text[:-1]
+        return text
+
+
+def split_module(source_code: str) -> Optional[SplitModule]:
+    """
+    Split a module into top-level statements. Joining the result without
+    rewrites gives back the source. Returns None if it does not parse.
+    """
+    try:
+        module = cst.parse_module(source_code)
+    except Exception:
+        return None
+
+    def lines(nodes) -> str:
+        return "".join(module.code_for_node(n) for n in nodes)
+
+    segments = []
+    for stmt in module.body:
+        leading_lines = getattr(stmt, "leading_lines", ())
+        code = module.code_for_node(stmt.with_changes(leading_lines=[]))
+        if isinstance(stmt, (cst.FunctionDef, cst.ClassDef)):
+            kind = "function" if isinstance(stmt, cst.FunctionDef) else "class"
+            segments.append(Segment(lines(leading_lines), code, stmt.name.value, kind))
+        else:
+            segments.append(Segment(lines(leading_lines), code))
+
+    return SplitModule(
+        lines(module.header),
+        segments,
+        lines(module.footer),
+        module.has_trailing_newline,
+    )
+
+
+def strip_fences(text: str) -> str:
+    """
+    Drop a Markdown code fence around a response, if the model added one.
+    """
+    text = text.strip()
+    match = _FENCE.match(text)
+    return match.group(1).strip() if match else text
+
+
+def valid_chunk(code: str, name: str) -> bool:
+    """
+    True if ``code`` parses and still defines ``name`` at top level.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False
+    return any(
+        isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+        and node.name == name
+        for node in tree.body
+    )
+
+
+def chunk_prompt(segment: Segment) -> str:
+    return CHUNK_PROMPT.format(kind=segment.kind, name=segment.name, code=segment.code)
+
+
+def chunk_cache_key(
+    segment: Segment, model: str = MODEL, temperature: float = TEMPERATURE
+) -> str:
+    return prompt_key(model, temperature, CHUNK_PROMPT, chunk_prompt(segment))
+
+
+def normalized_hash(
+    segment: Segment, model: str = MODEL, temperature: float = TEMPERATURE
+) -> str:
+    """
+    Hash of a chunk's AST plus the settings that shape its rewrite, so
+    edits to comments or layout alone keep the previous rewrite.
+    """
+    try:
+        shape = ast.dump(ast.parse(segment.code))
+    except SyntaxError:
+        shape = segment.code
+    payload = json.dumps(
+        {
+            "model": model,
+            "temperature": temperature,
+            "prompt": hashlib.sha256(CHUNK_PROMPT.encode("utf-8")).hexdigest(),
+            "ast": shape,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def rewrite_chunk(
+    llm: AsyncLLMClient, segment: Segment, retries: int = DEFAULT_CHUNK_RETRIES
+) -> Optional[str]:
+    """
+    Rewrite one chunk, asking again while the answer fails validation.
+    Returns None if no valid rewrite was obtained; a failed request (once
+    the client's own retries are exhausted) raises.
+    """
+    prompt = chunk_prompt(segment)
+    for _ in range(retries + 1):
+        code = strip_fences(await llm.complete(prompt))
+        if valid_chunk(code, segment.name):
+            return code
+    return None
+
+
+def _splice(
+    plan: SplitModule, rewrites: Dict[int, str], errors: Dict[int, Exception]
+) -> str:
+    # Chunks without a valid rewrite keep their code, with a note saying
+    # why; the file is then flagged as a whole.
+    kept = [i for i in plan.chunks if i not in rewrites]
+    for i in kept:
+        segment = plan.segments[i]
+        if i in errors:
+            reason = f"failed ({type(errors[i]).__name__}: {errors[i]})"
+        else:
+            reason = "failed validation"
+        rewrites[i] = (
+            f"# LLM: rewrite of `{segment.name}` {reason}; "
+            f"kept original.\n{segment.code}"
+        )
+    text = plan.join(rewrites)
+    if kept:
+        text = (
+            f"{ERROR_PREFIX}: {len(kept)} of {len(plan.chunks)} chunk(s) "
+            f"kept their original code.\n\n{text}"
+        )
+    return text
+
+
+def rewrite_many_chunked_with_llm(
+    sources: Sequence[str],
+    cache: Optional[LLMCache] = None,
+    chunk_retries: int = DEFAULT_CHUNK_RETRIES,
+    files: Optional[Sequence[str]] = None,
+    **client_options,
+) -> List[str]:
+    """
+    Chunked counterpart of rewrite_many_with_llm; results are in input
+    order. Files without functions or classes (or that do not parse) are
+    rewritten whole.
+
+    ``files`` names each source (e.g. its resolved path); with a ``cache``
+    it makes the run incremental.
+    """
+    model = client_options.get("model", MODEL)
+    temperature = client_options.get("temperature", TEMPERATURE)
+
+    results: List[Optional[str]] = [None] * len(sources)
+    plans: Dict[int, SplitModule] = {}
+    whole = []
+    for i, source_code in enumerate(sources):
+        plan = split_module(source_code)
+        if plan is None or not plan.chunks:
+            whole.append(i)
+        else:
+            plans[i] = plan
+
+    incremental = cache is not None and files is not None
+
+    # file index -> {segment index: rewritten code}. Reuse the previous
+    # run's rewrite of unchanged chunks, then cached responses; the rest
+    # goes to the LLM.
+    rewrites: Dict[int, Dict[int, str]] = {i: {} for i in plans}
+    errors: Dict[int, Dict[int, Exception]] = {i: {} for i in plans}
+    hashes: Dict[int, Dict[int, str]] = {i: {} for i in plans}
+    todo = []
+    ids = {i: plan.chunk_ids() for i, plan in plans.items()}
+    for i, plan in plans.items():
+        previous = cache.previous_rewrites(files[i]) if incremental else {}
+        for j in plan.chunks:
+            segment = plan.segments[j]
+            h = hashes[i][j] = normalized_hash(segment, model, temperature)
+            if previous.get(ids[i][j], (None,))[0] == h:
+                rewrites[i][j] = previous[ids[i][j]][1]
+                cache.count_reused()
+                continue
+            cached = None
+            if cache is not None:
+                cached = cache.get(chunk_cache_key(segment, model, temperature))
+            if cached is not None:
+                rewrites[i][j] = cached
+            else:
+                todo.append((i, j))
+
+    if todo:
+        async def run() -> List[Union[str, None, Exception]]:
+            async with AsyncLLMClient(**client_options) as llm:
+                return await asyncio.gather(
+                    *(
+                        rewrite_chunk(llm, plans[i].segments[j], chunk_retries)
+                        for i, j in todo
+                    ),
+                    return_exceptions=True,
+                )
+
+        for (i, j), code in zip(todo, asyncio.run(run())):
+            if isinstance(code, Exception):
+                errors[i][j] = code
+                continue
+            if code is None:
+                continue
+            rewrites[i][j] = code
+            if cache is not None:
+                segment = plans[i].segments[j]
+                cache.put(chunk_cache_key(segment, model, temperature), code)
+
+    for i, plan in plans.items():
+        if incremental:
+            cache.record_rewrites(
+                files[i],
+                {
+                    ids[i][j]: (hashes[i][j], code)
+                    for j, code in rewrites[i].items()
+                },
+            )
+        results[i] = _splice(plan, rewrites[i], errors[i])
+
+    if whole:
+        rewritten = rewrite_many_with_llm(
+            [sources[i] for i in whole], cache=cache, **client_options
+        )
+        for i, code in zip(whole, rewritten):
+            results[i] = code
+
+    return results
@@ -3,27 +3,84 @@ llm_client.py
 
 OpenAI-powered refactoring engine for vibe2prod.
 Uses .env for API key loading.
+
+The openai SDK and python-dotenv are imported, and .env is loaded, on
+first use of the LLM path only; importing this module is cheap, so runs
+without --use-llm never pay for them.
+
+Single files go through the blocking client. Batches go through
+AsyncLLMClient: one AsyncOpenAI client (and so one pooled HTTP connection
+pool) shared by every file, a semaphore bounding in-flight requests, a
+token bucket bounding the request rate, and retries with jittered
+exponential backoff for transient failures. Batch mode's worker processes
+each take an even share of those limits (share_limits), so a run with
+``--jobs N`` keeps to them as a whole. OPENAI_BASE_URL (or the
+``base_url`` argument) points either client at another endpoint, e.g. a
+local stub server in tests.
+
+Both paths consult an optional LLMCache first: a response already seen
+for the same model, temperature, prompt and source costs no request.
+
+stream_rewrite_to_file consumes the completion as a stream and writes it
+to disk as tokens arrive, reporting progress and time to first token.
 """
 
+import asyncio
+import functools
 import os
-from dotenv import load_dotenv
-from openai import OpenAI
+import random
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, TextIO
 
-# Load .env file automatically
-load_dotenv()
+from .llm_cache import LLMCache, prompt_key
 
+MODEL = "gpt-4.1"
+TEMPERATURE = 0.1
+SYSTEM_PROMPT = "You are a highly skilled Python engineer."
 
-def get_client():
-    """
-    Returns an OpenAI client using OPENAI_API_KEY.
-    """
+# First line of a failed rewrite, which carries the original code instead.
+ERROR_PREFIX = "# LLM ERROR"
+
+# Batch defaults: requests in flight, sustained requests per second, retries.
+DEFAULT_CONCURRENCY = 16
+DEFAULT_RATE = 8.0
+DEFAULT_RETRIES = 4
+
+# How many processes split the limits above; set by share_limits.
+_processes = 1
+
+
+@functools.lru_cache(maxsize=None)
+def _load_env() -> None:
+    # Load .env file automatically, once, when the LLM is first needed.
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+
+def _api_key() -> str:
+    _load_env()
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise RuntimeError(
             "Missing OPENAI_API_KEY. "
             "Add it to your .env file like: OPENAI_API_KEY=sk-xxxx"
         )
-    return OpenAI(api_key=api_key)
+    return api_key
+
+
+@functools.lru_cache(maxsize=None)
+def get_client():
+    """
+    Returns an OpenAI client using OPENAI_API_KEY.
+    Built once and reused, so its connection pool is shared between calls.
+    """
+    from openai import OpenAI
+
+    return OpenAI(api_key=_api_key())
 
 
 # ------------------- PROMPT TEMPLATE ---------------------
@@ -55,33 +112,355 @@ Return ONLY valid Python code with no commentary outside code.
 """
 
 
+def _messages(prompt: str) -> list:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def _error_result(error: Exception, source_code: str) -> str:
+    return (
+        f"{ERROR_PREFIX}: {error}\n"
+        f"# Returning original source code.\n\n"
+        f"{source_code}"
+    )
+
+
 # ------------------- LLM CALL ----------------------------
 
-def rewrite_code_with_llm(source_code: str) -> str:
+def _cache_key(
+    source_code: str, model: str = MODEL, temperature: float = TEMPERATURE
+) -> str:
+    return prompt_key(model, temperature, REWRITE_PROMPT, source_code)
+
+
+def rewrite_code_with_llm(source_code: str, cache: Optional[LLMCache] = None) -> str:
     """
     Send vibe-coded source to OpenAI and return improved code.
     """
+    key = None
+    if cache is not None:
+        key = _cache_key(source_code)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
     client = get_client()
     prompt = REWRITE_PROMPT.format(code=source_code)
 
     try:
         response = client.chat.completions.create(
-            model="gpt-4.1",
-            messages=[
-                {"role": "system", "content": "You are a highly skilled Python engineer."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.1,
+            model=MODEL,
+            messages=_messages(prompt),
+            temperature=TEMPERATURE,
         )
 
         # NEW SDK FORMAT — correct way to access content
-        improved = response.choices[0].message.content
-        return improved.strip()
+        improved = response.choices[0].message.content.strip()
+        if key is not None:
+            cache.put(key, improved)
+        return improved
 
     except Exception as e:
         # If anything goes wrong, return original code with error header
-        return (
-            f"# LLM ERROR: {e}\n"
-            f"# Returning original source code.\n\n"
-            f"{source_code}"
+        return _error_result(e, source_code)
+
+
+# ------------------- STREAMING ---------------------------
+
+@dataclass
+class StreamStats:
+    chars: int = 0
+    # Seconds from sending the request to the first content token.
+    first_token: Optional[float] = None
+    elapsed: float = 0.0
+    cached: bool = False
+    error: Optional[str] = None
+
+
+class _StrippedWriter:
+    """
+    Writes text to ``out`` as it arrives, minus leading and trailing
+    whitespace, so the file ends up equal to ``response.strip()`` without
+    holding the response in memory. Trailing whitespace is held back until
+    more text follows it.
+    """
+
+    def __init__(self, out: TextIO) -> None:
+        self._out = out
+        self._started = False
+        self._held = ""
+
+    def write(self, text: str) -> None:
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return
+            self._started = True
+        body = text.rstrip()
+        if body:
+            self._out.write(self._held + body)
+            self._out.flush()
+            self._held = text[len(body):]
+        else:
+            self._held += text
+
+
+def stream_progress(
+    label: str, out: TextIO = sys.stderr
+) -> Callable[[StreamStats, bool], None]:
+    """
+    Progress callback keeping one status line per file up to date.
+    """
+
+    def report(stats: StreamStats, done: bool) -> None:
+        first = "-" if stats.first_token is None else f"{stats.first_token:.2f}s"
+        out.write(
+            f"\r{label}: {stats.chars} chars, first token {first}, "
+            f"{stats.elapsed:.1f}s" + ("\n" if done else "")
+        )
+        out.flush()
+
+    return report
+
+
+def stream_rewrite_to_file(
+    source_code: str,
+    path: Path,
+    cache: Optional[LLMCache] = None,
+    progress: Optional[Callable[[StreamStats, bool], None]] = None,
+) -> StreamStats:
+    """
+    Streaming rewrite_code_with_llm: the improved code is written to
+    ``path`` as it is generated. On failure the file holds the original
+    code under the usual error header.
+    """
+    stats = StreamStats()
+    key = None
+    if cache is not None:
+        key = _cache_key(source_code)
+        cached = cache.get(key)
+        if cached is not None:
+            Path(path).write_text(cached, encoding="utf-8")
+            stats.chars, stats.cached = len(cached), True
+            return stats
+
+    client = get_client()
+    start = time.perf_counter()
+
+    with open(path, "w", encoding="utf-8") as out:
+        writer = _StrippedWriter(out)
+        try:
+            stream = client.chat.completions.create(
+                model=MODEL,
+                messages=_messages(REWRITE_PROMPT.format(code=source_code)),
+                temperature=TEMPERATURE,
+                stream=True,
+            )
+            for event in stream:
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta.content
+                if not delta:
+                    continue
+                if stats.first_token is None:
+                    stats.first_token = time.perf_counter() - start
+                writer.write(delta)
+                stats.chars += len(delta)
+                if progress is not None:
+                    stats.elapsed = time.perf_counter() - start
+                    progress(stats, False)
+        except Exception as e:
+            out.seek(0)
+            out.truncate()
+            out.write(_error_result(e, source_code))
+            stats.error = str(e)
+
+    stats.elapsed = time.perf_counter() - start
+    if progress is not None:
+        progress(stats, True)
+    if key is not None and stats.error is None:
+        cache.put(key, Path(path).read_text(encoding="utf-8"))
+    return stats
+
+
+# ------------------- BATCH (ASYNC) -----------------------
+
+def share_limits(processes: int) -> None:
+    """
+    Declare this process one of ``processes`` that run AsyncLLMClients
+    at the same time (a pool initializer): from then on each client gets
+    1/``processes`` of its concurrency and rate limits, rounded down but
+    at least one request in flight. Beyond ``max_concurrency`` processes
+    the total would exceed the limit, so pools are capped first (see
+    llm_processes).
+    """
+    global _processes
+    _processes = max(1, processes)
+
+
+def llm_processes(processes: int, max_concurrency: int = DEFAULT_CONCURRENCY) -> int:
+    """
+    How many of ``processes`` workers may run LLM clients side by side
+    without their one-request minimum exceeding ``max_concurrency``.
+    """
+    return max(1, min(processes, max_concurrency))
+
+
+class TokenBucket:
+    """
+    Allows ``rate`` acquisitions per second on average, with bursts of up
+    to ``capacity``.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _is_retryable(error: Exception) -> bool:
+    import openai
+
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError)):
+        return True  # APITimeoutError is an APIConnectionError
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status >= 500 or status == 408)
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 20.0) -> float:
+    """
+    "Full jitter" exponential backoff: uniform in [0, min(cap, base * 2**n)],
+    so clients that failed together do not retry together.
+    """
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class AsyncLLMClient:
+    """
+    Shared asynchronous client for rewriting many files concurrently.
+
+    Use as ``async with AsyncLLMClient() as llm: await llm.rewrite_many(...)``.
+    The limits are for the whole run; see share_limits.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_CONCURRENCY,
+        requests_per_second: float = DEFAULT_RATE,
+        max_retries: int = DEFAULT_RETRIES,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        model: str = MODEL,
+        temperature: float = TEMPERATURE,
+    ) -> None:
+        from openai import AsyncOpenAI
+
+        _load_env()  # .env may also set OPENAI_BASE_URL
+        # The SDK's own retries are disabled; ours share the rate limiter.
+        self._client = AsyncOpenAI(
+            api_key=api_key or _api_key(), base_url=base_url, max_retries=0
         )
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency // _processes))
+        self._bucket = TokenBucket(requests_per_second / _processes)
+        self.max_retries = max_retries
+        self.model = model
+        self.temperature = temperature
+
+    async def __aenter__(self) -> "AsyncLLMClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.close()
+
+    async def complete(self, prompt: str) -> str:
+        """
+        One chat completion, retried on connection errors, rate limiting
+        and server errors.
+        """
+        attempt = 0
+        while True:
+            await self._bucket.acquire()
+            try:
+                async with self._semaphore:
+                    response = await self._client.chat.completions.create(
+                        model=self.model,
+                        messages=_messages(prompt),
+                        temperature=self.temperature,
+                    )
+                return response.choices[0].message.content
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+
+    async def rewrite(self, source_code: str) -> str:
+        """
+        Async rewrite_code_with_llm: same prompt, same error handling.
+        """
+        try:
+            improved = await self.complete(REWRITE_PROMPT.format(code=source_code))
+            return improved.strip()
+        except Exception as e:
+            return _error_result(e, source_code)
+
+    async def rewrite_many(self, sources: Sequence[str]) -> List[str]:
+        return list(await asyncio.gather(*(self.rewrite(s) for s in sources)))
+
+
+def rewrite_many_with_llm(
+    sources: Sequence[str], cache: Optional[LLMCache] = None, **client_options
+) -> List[str]:
+    """
+    Rewrite several sources concurrently; results are in input order.
+    Cached responses are used as-is, and no client is created at all when
+    every source is a hit. ``client_options`` are passed to AsyncLLMClient.
+    """
+    results: List[Optional[str]] = list(sources)
+    keys: List[Optional[str]] = [None] * len(results)
+    todo = list(range(len(results)))
+
+    if cache is not None:
+        model = client_options.get("model", MODEL)
+        temperature = client_options.get("temperature", TEMPERATURE)
+        todo = []
+        for i, source_code in enumerate(sources):
+            keys[i] = _cache_key(source_code, model, temperature)
+            cached = cache.get(keys[i])
+            if cached is not None:
+                results[i] = cached
+            else:
+                todo.append(i)
+
+    if not todo:
+        return results
+
+    async def run() -> List[str]:
+        async with AsyncLLMClient(**client_options) as llm:
+            return await llm.rewrite_many([sources[i] for i in todo])
+
+    for i, improved in zip(todo, asyncio.run(run())):
+        results[i] = improved
+        if cache is not None and not improved.startswith(ERROR_PREFIX):
+            cache.put(keys[i], improved)
+    return results
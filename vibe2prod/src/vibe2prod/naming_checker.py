@@ -1,5 +1,12 @@
-import libcst as cst
 import re
+from typing import Optional
+
+import libcst as cst
+from libcst.metadata import PositionProvider
+
+from .context import AnalysisContext, ensure_context
+from .issues import Issue
+from .rules import Rule, run_rules
 
 
 SNAKE = re.compile(r"^[a-z_][a-z0-9_]*$")
@@ -7,24 +14,56 @@ PASCAL = re.compile(r"^[A-Z][a-zA-Z0-9]+$")
 SCREAMING = re.compile(r"^[A-Z0-9_]+$")
 
 
-class NamingIssueCollector(cst.CSTVisitor):
+class NamingIssueCollector(Rule):
     """
     Collects naming rule violations:
     - function not snake_case
     - class not PascalCase
     - variables too short or not snake_case
     - constants not SCREAMING_SNAKE_CASE
+
+    Findings are Issue records; their symbol is the function they were
+    found in (None at module or class level).
     """
 
+    METADATA_DEPENDENCIES = (PositionProvider,)
+
     def __init__(self):
-        self.issues = []
+        self.records = []
+        self._functions = []
+
+    @property
+    def issues(self):
+        return [record.message for record in self.records]
+
+    @property
+    def scopes(self):
+        return [record.symbol for record in self.records]
+
+    def _add(self, rule: str, issue: str, node: cst.CSTNode) -> None:
+        pos = self.get_metadata(PositionProvider, node)
+        scope = self._functions[-1] if self._functions else None
+        self.records.append(Issue(rule, issue, pos.start.line, pos.end.line, scope))
+
+    incremental = True
+
+    def fragment(self):
+        return [record.to_row() for record in self.records]
+
+    @classmethod
+    def merge(cls, context, fragments):
+        rule = cls()
+        for rows, offset in fragments:
+            rule.records.extend(Issue.from_row(row, offset) for row in rows)
+        return rule
 
     # ---------- Function Definitions ----------
     def visit_FunctionDef(self, node: cst.FunctionDef) -> None:
         name = node.name.value
+        self._functions.append(name)
         if not SNAKE.match(name):
-            self.issues.append(
-                f"Function `{name}` is not snake_case."
+            self._add(
+                "naming/function", f"Function `{name}` is not snake_case.", node.name
             )
 
         # check parameters
@@ -37,21 +76,24 @@ class NamingIssueCollector(cst.CSTVisitor):
                 continue
             pname = p.name.value
             if len(pname) <= 1 and pname not in ("i", "j", "k"):
-                self.issues.append(
-                    f"Parameter `{pname}` is too short. Prefer descriptive names."
+                self._add(
+                    "naming/parameter-short",
+                    f"Parameter `{pname}` is too short. Prefer descriptive names.",
+                    p,
                 )
             elif not SNAKE.match(pname):
-                self.issues.append(
-                    f"Parameter `{pname}` is not snake_case."
+                self._add(
+                    "naming/parameter", f"Parameter `{pname}` is not snake_case.", p
                 )
 
+    def leave_FunctionDef(self, original_node: cst.FunctionDef) -> None:
+        self._functions.pop()
+
     # ---------- Class Definitions ----------
     def visit_ClassDef(self, node: cst.ClassDef) -> None:
         name = node.name.value
         if not PASCAL.match(name):
-            self.issues.append(
-                f"Class `{name}` is not PascalCase."
-            )
+            self._add("naming/class", f"Class `{name}` is not PascalCase.", node.name)
 
     # ---------- Assignments ----------
     def visit_Assign(self, node: cst.Assign) -> None:
@@ -62,34 +104,40 @@ class NamingIssueCollector(cst.CSTVisitor):
                 # detect constant
                 if vname.isupper() and len(vname) > 1:
                     if not SCREAMING.match(vname):
-                        self.issues.append(
-                            f"Constant `{vname}` should be SCREAMING_SNAKE_CASE."
+                        self._add(
+                            "naming/constant",
+                            f"Constant `{vname}` should be SCREAMING_SNAKE_CASE.",
+                            t.target,
                         )
                     continue
 
                 # too short variable
                 if len(vname) == 1 and vname not in ("i", "j", "k"):
-                    self.issues.append(
-                        f"Variable `{vname}` is too short — unclear purpose."
+                    self._add(
+                        "naming/variable-short",
+                        f"Variable `{vname}` is too short — unclear purpose.",
+                        t.target,
                     )
                     continue
 
                 # not snake_case
                 if not SNAKE.match(vname):
-                    self.issues.append(
-                        f"Variable `{vname}` is not snake_case."
+                    self._add(
+                        "naming/variable",
+                        f"Variable `{vname}` is not snake_case.",
+                        t.target,
                     )
 
-def analyze_naming(source_code: str):
+def analyze_naming(source_code: str, context: Optional[AnalysisContext] = None):
     """
     Run naming conventions analysis.
     Returns a list of issues found.
     """
+    context = ensure_context(source_code, context)
     try:
-        tree = cst.parse_module(source_code)
+        context.module
     except Exception:
         return []
 
-    visitor = NamingIssueCollector()
-    tree.visit(visitor)
-    return visitor.issues
+    (rule,) = run_rules(context, NamingIssueCollector)
+    return rule.issues
@@ -0,0 +1,204 @@
+"""
+Near-miss clone detection with MinHash and locality-sensitive hashing.
+
+Exact clone detection only matches identical normalized statements. Here a
+function is turned into the set of k-token shingles of its normalized body
+(names already erased by duplicate_checker), summarised by a fixed-size
+MinHash signature. The fraction of equal signature slots estimates the
+Jaccard similarity of two functions' shingle sets, so one extra statement
+or a changed operator only lowers the score slightly.
+
+Signatures are split into bands; functions sharing any whole band land in
+the same LSH bucket and become candidate pairs. Only candidates are
+compared, which keeps repository-wide search sub-quadratic. Band/row counts
+are derived from the similarity threshold.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from array import array
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from .config import DEFAULT_THRESHOLD
+from .context import AnalysisContext, ensure_context
+from .duplicate_checker import collect_blocks
+
+
+NUM_PERM = 64
+SHINGLE_SIZE = 4
+
+# Functions with fewer normalized tokens than this look alike no matter
+# what they do (getters, one-line wrappers) and are skipped.
+MIN_TOKENS = 24
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+Signature = Tuple[int, ...]
+
+
+def shingles(normalized_statements: Sequence[str]) -> set:
+    """
+    Every SHINGLE_SIZE-token window of a function body, as bytes.
+    Returns an empty set for bodies shorter than MIN_TOKENS.
+    """
+    tokens: List[str] = []
+    for text in normalized_statements:
+        tokens.extend(_TOKEN.findall(text))
+    if len(tokens) < MIN_TOKENS:
+        return set()
+
+    return {
+        "\x00".join(tokens[i : i + SHINGLE_SIZE]).encode("utf-8")
+        for i in range(len(tokens) - SHINGLE_SIZE + 1)
+    }
+
+
+def minhash(shingle_set: Iterable[bytes]) -> Signature:
+    """
+    NUM_PERM-slot MinHash signature.
+
+    Each shingle is hashed once with SHAKE-128, whose output is read as
+    NUM_PERM independent 32-bit hash values; slot i is the minimum of the
+    i-th value over all shingles. Stable across runs and processes, and
+    the per-slot minimum runs in C rather than NUM_PERM Python loops.
+    """
+    rows = (
+        array("I", hashlib.shake_128(s).digest(4 * NUM_PERM)) for s in shingle_set
+    )
+    return tuple(map(min, zip(*rows)))
+
+
+def similarity(sig_a: Signature, sig_b: Signature) -> float:
+    """
+    Estimated Jaccard similarity of the two underlying shingle sets.
+    """
+    same = sum(1 for x, y in zip(sig_a, sig_b) if x == y)
+    return same / len(sig_a)
+
+
+def lsh_params(threshold: float, num_perm: int = NUM_PERM) -> Tuple[int, int]:
+    """
+    Choose (bands, rows) so the LSH S-curve's midpoint, (1/b) ** (1/r),
+    is as close as possible to ``threshold``.
+    """
+    best = (1, num_perm)
+    best_err = float("inf")
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        err = abs((1 / bands) ** (1 / rows) - threshold)
+        if err < best_err:
+            best, best_err = (bands, rows), err
+    return best
+
+
+class LSHIndex:
+    """
+    In-memory LSH buckets over MinHash signatures.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD) -> None:
+        self.threshold = threshold
+        self.bands, self.rows = lsh_params(threshold)
+        self._signatures: Dict[Hashable, Signature] = {}
+        self._buckets: Dict[Tuple[int, Signature], List[Hashable]] = defaultdict(list)
+
+    def add(self, key: Hashable, signature: Signature) -> None:
+        self._signatures[key] = signature
+        for band in range(self.bands):
+            chunk = signature[band * self.rows : (band + 1) * self.rows]
+            self._buckets[(band, chunk)].append(key)
+
+    def pairs(self) -> List[Tuple[Hashable, Hashable, float]]:
+        """
+        All (key_a, key_b, similarity) pairs at or above the threshold,
+        in insertion order of key_a then key_b.
+        """
+        order = {key: i for i, key in enumerate(self._signatures)}
+        candidates = set()
+        for members in self._buckets.values():
+            if len(members) < 2:
+                continue
+            for i, a in enumerate(members):
+                for b in members[i + 1 :]:
+                    candidates.add((a, b) if order[a] < order[b] else (b, a))
+
+        found = []
+        for a, b in candidates:
+            score = similarity(self._signatures[a], self._signatures[b])
+            if score >= self.threshold:
+                found.append((a, b, score))
+        found.sort(key=lambda p: (order[p[0]], order[p[1]]))
+        return found
+
+
+def function_signatures(
+    source_code: str, context: Optional[AnalysisContext] = None
+) -> List[Tuple[str, int, int, Signature]]:
+    """
+    (function name, first line, last line, MinHash signature) for every
+    function large enough to compare.
+    """
+    collector = collect_blocks(ensure_context(source_code, context))
+    if collector is None:
+        return []
+
+    out = []
+    for (name, _, starts, ends), texts in zip(collector.functions, collector.normalized):
+        shingle_set = shingles(texts)
+        if shingle_set:
+            out.append((name, starts[0], ends[-1], minhash(shingle_set)))
+    return out
+
+
+def analyze_near_duplicates(
+    source_code: str,
+    context: Optional[AnalysisContext] = None,
+    threshold: float = DEFAULT_THRESHOLD,
+) -> List[Tuple[str, str, float]]:
+    """
+    Pairs of functions in one module whose bodies are similar but not
+    necessarily identical. Returns [(func_a, func_b, similarity), ...].
+    """
+    signatures = function_signatures(source_code, context)
+    index = LSHIndex(threshold)
+    for i, (_, _, _, signature) in enumerate(signatures):
+        index.add(i, signature)
+    return [
+        (signatures[a][0], signatures[b][0], score) for a, b, score in index.pairs()
+    ]
+
+
+def group_pairs(
+    pairs: Iterable[Tuple[Hashable, Hashable, float]]
+) -> List[Tuple[List[Hashable], float, float]]:
+    """
+    Merge similar pairs into connected groups, so n near-copies of one
+    function are listed once instead of as n*(n-1)/2 pairs.
+    Returns [(members, lowest score, highest score), ...].
+    """
+    parent: Dict[Hashable, Hashable] = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    scores: Dict[Hashable, List[float]] = defaultdict(list)
+    pairs = list(pairs)
+    for a, b, _ in pairs:
+        parent[find(a)] = find(b)
+    for a, _, score in pairs:
+        scores[find(a)].append(score)
+
+    members: Dict[Hashable, List[Hashable]] = defaultdict(list)
+    for key in parent:
+        members[find(key)].append(key)
+
+    return [
+        (members[root], min(scores[root]), max(scores[root])) for root in members
+    ]
@@ -1,61 +1,612 @@
+import io
+import os
+from dataclasses import asdict, dataclass
 from pathlib import Path
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    Union,
+)
 
-from .comment_enhancer import enhance_comments
-from .prod_refactor import make_production_ready
-from .report_generator import generate_report
-from .llm_client import rewrite_code_with_llm
-from .documentation_generator import generate_docs
-from .comment_drift_checker import check_comment_drif
-
-def process_file(input_path: Path, use_llm: bool = False):
-    # Read original source
-    original_code = input_path.read_text(encoding="utf-8")
-
-    # Step 1 — Comment enrichment
-    commented_code = enhance_comments(original_code, use_llm=use_llm)
-    commented_path = input_path.with_name(
-        input_path.stem + "_commented" + input_path.suffix
+from . import tracing
+from .cache import ResultCache
+from .config import REPORT_FORMATS, AnalysisConfig, ReportFocus
+from .context import AnalysisContext, ensure_context
+from .function_cache import FunctionCache
+from .comment_enhancer import enhance_context
+from .prod_refactor import make_production_ready, make_production_ready_batch
+from .issues import FunctionMetrics, Issue
+from .report_generator import (
+    PARSE_FAILED,
+    Record,
+    drift_markdown,
+    report_records,
+    write_report,
+)
+from .report_writer import write_sections
+from .llm_cache import LLMCache
+from .llm_chunks import rewrite_many_chunked_with_llm
+from .llm_client import (
+    ERROR_PREFIX,
+    rewrite_code_with_llm,
+    rewrite_many_with_llm,
+    stream_progress,
+    stream_rewrite_to_file,
+)
+from .git_changes import LineRange, focus_for
+from .documentation_generator import doc_sections, generate_docs
+from .comment_drift_checker import check_comment_drift
+
+
+def _rewrite_many(
+    sources, llm_mode: str, llm_cache: Optional[LLMCache], paths: Sequence[Path]
+):
+    if llm_mode == "chunks":
+        # Keyed by path so an edited file only resends its changed functions.
+        files = [str(path.resolve()) for path in paths]
+        return rewrite_many_chunked_with_llm(sources, cache=llm_cache, files=files)
+    return rewrite_many_with_llm(sources, cache=llm_cache)
+
+
+def _ai_path(input_path: Path) -> Path:
+    return input_path.with_name(input_path.stem + "_ai" + input_path.suffix)
+
+
+@dataclass
+class _Streamed:
+    """
+    An _ai file already streamed to disk; it is written once, not again
+    with the other artifacts.
+    """
+
+    path: Path
+
+
+def _stream_rewrite(
+    source_code: str, input_path: Path, llm_cache: Optional[LLMCache]
+) -> _Streamed:
+    ai_path = _ai_path(input_path)
+    stream_rewrite_to_file(
+        source_code, ai_path, llm_cache, progress=stream_progress(input_path.name)
     )
-    commented_path.write_text(commented_code, encoding="utf-8")
-    
-    from .comment_drift_checker import check_comment_drift
+    return _Streamed(ai_path)
+
+
+@dataclass
+class Artifacts:
+    """
+    Everything the pipeline produces for one source file.
+    """
+
+    commented: str
+    report: str
+    prod: str
+    docs: str
+    ai: Optional[str] = None
 
-    # After commented_code is generated:
-    drift_issues = check_comment_drift(commented_code)
 
-    if drift_issues:
-        # Optional: Add drift issues into report
-        report_text += "\n\n## Comment Drift Detected\n"
-        for fn, issue in drift_issues.items():
-            report_text += f"### {fn}\n{issue}\n\n"
+def _comment(
+    source_code: str,
+    original_ctx: Optional[AnalysisContext] = None,
+    changed: Optional[Sequence[LineRange]] = None,
+    function_cache: Optional[FunctionCache] = None,
+) -> Tuple[AnalysisContext, Optional[ReportFocus]]:
+    """
+    Step 1: the commented code's context, and the report focus for a diff.
+    """
+    # Each version of the code (original, commented, production/AI) gets one
+    # AnalysisContext, so it is parsed at most once. A caller that keeps the
+    # original context (the server) also keeps the commented one, and every
+    # analysis memoized on both.
+    original_ctx = ensure_context(source_code, original_ctx)
 
+    with tracing.span("enhance_comments", "stage"):
+        commented_ctx = original_ctx.cached(
+            "enhanced", lambda: enhance_context(original_ctx)
+        )
+    # The report's rules then reuse per-function results of earlier runs.
+    commented_ctx.function_cache = function_cache
+
+    # Changed line numbers refer to the original code, so they are mapped to
+    # function names there; the report on the commented code filters by name.
+    focus = None
+    if changed is not None:
+        try:
+            focus = focus_for(original_ctx.tree, changed)
+        except SyntaxError:
+            pass
+    return commented_ctx, focus
+
+
+def _with_drift(
+    records: Iterable[Record], drift_issues: Dict[str, str], analyzed: str
+) -> Iterator[Record]:
+    """
+    ``records``, then the comment-drift issues, located at their functions.
+    """
+    spans = {}
+    for record in records:
+        if isinstance(record, FunctionMetrics):
+            spans.setdefault(record.name, (record.line, record.end_line))
+        yield record
+    for fn, text in drift_issues.items():
+        yield Issue(
+            "comment-drift/docstring", text, *spans.get(fn, (None, None)), fn, analyzed
+        )
+
+
+def _write_report(
+    out: TextIO,
+    commented_ctx: AnalysisContext,
+    filename: str,
+    config: AnalysisConfig,
+    focus: Optional[ReportFocus] = None,
+    analyzed: Optional[str] = None,
+) -> None:
+    """
+    Step 2: stream the report on the commented code to ``out``, one record
+    at a time. Issues name ``analyzed`` as their file (by default the
+    _commented file's bare name).
+    """
+    commented_code = commented_ctx.source_code
+    # The report analyses the commented code, so that is the file its line
+    # numbers refer to.
+    if analyzed is None:
+        stem, dot, suffix = filename.rpartition(".")
+        analyzed = f"{stem}_commented.{suffix}" if dot else f"{filename}_commented"
+
+    with tracing.span("comment_drift", "analyzer"):
+        try:
+            drift_issues = check_comment_drift(commented_code, commented_ctx)
+        except SyntaxError:
+            drift_issues = {}
+    if focus is not None:
+        drift_issues = {
+            fn: issue for fn, issue in drift_issues.items() if fn in focus.functions
+        }
+
+    with tracing.span("generate_report", "stage"):
+        try:
+            commented_ctx.module
+        except Exception:
+            drift = list(_with_drift((), drift_issues, analyzed))
+            if config.report_format == "markdown":
+                out.write(PARSE_FAILED + drift_markdown(drift))
+            else:
+                write_report(drift, filename, out, config.report_format)
+            return
+
+        records = report_records(
+            commented_code,
+            analyzed,
+            commented_ctx,
+            near_threshold=config.near_duplicate_threshold,
+            focus=focus,
+        )
+        write_report(
+            _with_drift(records, drift_issues, analyzed),
+            filename,
+            out,
+            config.report_format,
+            focus,
+        )
 
-    # Step 2 — Report
-    report_text = generate_report(commented_code, input_path.name)
-    report_path = input_path.with_name(input_path.stem + "_report.md")
-    report_path.write_text(report_text, encoding="utf-8")
+
+def _commented_path(input_path: Path) -> Path:
+    return input_path.with_name(input_path.stem + "_commented" + input_path.suffix)
+
+
+def _issue_location(input_path: Path, config: AnalysisConfig) -> Optional[str]:
+    """
+    The file the issue formats record for ``input_path``: its _commented
+    file, relative to the run's working directory (SARIF's %SRCROOT%).
+    Markdown reports name no paths.
+    """
+    if config.report_format == "markdown":
+        return None
+    return Path(os.path.relpath(_commented_path(input_path))).as_posix()
+
+
+def _report_path(input_path: Path, report_format: str) -> Path:
+    return input_path.with_name(
+        input_path.stem + "_report" + REPORT_FORMATS[report_format]
+    )
+
+
+def _docs_path(input_path: Path) -> Path:
+    return input_path.with_name(input_path.stem + "_docs.md")
+
+
+def _write_streamed(path: Path, write: Callable[[TextIO], None]) -> None:
+    """
+    Stream into ``path`` through a temporary file, so a failure halfway
+    never leaves a truncated artifact behind.
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        with tmp.open("w", encoding="utf-8") as out:
+            write(out)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _finish(
+    commented_code: str,
+    report_text: str,
+    prod_code: str,
+    filename: str,
+    ai_code: Optional[str],
+) -> Artifacts:
+    # Step 5 — Documentation
+    doc_source = ai_code if ai_code is not None else prod_code
+    with tracing.span("generate_docs", "stage"):
+        docs_text = generate_docs(doc_source, filename, AnalysisContext(doc_source))
+
+    return Artifacts(
+        commented=commented_code,
+        report=report_text,
+        prod=prod_code,
+        docs=docs_text,
+        ai=ai_code,
+    )
+
+
+def run_stages(
+    source_code: str,
+    filename: str,
+    use_llm: bool = False,
+    config: Optional[AnalysisConfig] = None,
+    llm_cache: Optional[LLMCache] = None,
+    llm_mode: str = "file",
+    context: Optional[AnalysisContext] = None,
+    function_cache: Optional[FunctionCache] = None,
+    file: Optional[str] = None,
+) -> Artifacts:
+    """
+    All stages for one source, with every artifact returned as text (for
+    callers that hand the artifacts on rather than write them to disk).
+
+    ``file`` is a stable identity for the source across calls (a path, a
+    request's filename); in chunks mode with an ``llm_cache`` it lets an
+    edited source resend only its changed functions.
+    """
+    config = config or AnalysisConfig()
+    commented_ctx, _ = _comment(source_code, context, function_cache=function_cache)
+    commented_code = commented_ctx.source_code
+    report = io.StringIO()
+    _write_report(report, commented_ctx, filename, config)
 
     # Step 3 — Static production refactor
-    prod_code = make_production_ready(commented_code)
+    with tracing.span("make_production_ready", "stage"):
+        prod_code = make_production_ready(commented_code)
+
+    # Step 4 — AI refactor (optional)
+    ai_code = None
+    if use_llm:
+        with tracing.span("llm", "stage"):
+            if llm_mode == "chunks":
+                ai_code = rewrite_many_chunked_with_llm(
+                    [commented_code],
+                    cache=llm_cache,
+                    files=None if file is None else [file],
+                )[0]
+            else:
+                # No output path here to stream into; "stream" means "file".
+                ai_code = rewrite_code_with_llm(commented_code, llm_cache)
+
+    return _finish(commented_code, report.getvalue(), prod_code, filename, ai_code)
+
+
+def _write_code(
+    input_path: Path, commented: str, prod: str, ai: Optional[str]
+) -> Tuple[Path, Path, Optional[Path]]:
+    commented_path = _commented_path(input_path)
+    commented_path.write_text(commented, encoding="utf-8")
+
     prod_path = input_path.with_name(
         input_path.stem + "_prod" + input_path.suffix
     )
-    prod_path.write_text(prod_code, encoding="utf-8")
+    prod_path.write_text(prod, encoding="utf-8")
 
-    # Step 4 — AI refactor (optional)
-    ai_code = None
     ai_path = None
-    if use_llm:
-        ai_code = rewrite_code_with_llm(commented_code)
-        ai_path = input_path.with_name(
-            input_path.stem + "_ai" + input_path.suffix
+    if ai is not None:
+        ai_path = _ai_path(input_path)
+        ai_path.write_text(ai, encoding="utf-8")
+    return commented_path, prod_path, ai_path
+
+
+def write_artifacts(
+    input_path: Path, artifacts: Artifacts, report_format: str = "markdown"
+):
+    commented_path, prod_path, ai_path = _write_code(
+        input_path, artifacts.commented, artifacts.prod, artifacts.ai
+    )
+
+    report_path = _report_path(input_path, report_format)
+    report_path.write_text(artifacts.report, encoding="utf-8")
+
+    docs_path = _docs_path(input_path)
+    docs_path.write_text(artifacts.docs, encoding="utf-8")
+
+    return commented_path, prod_path, report_path, ai_path, docs_path
+
+
+def _cacheable(artifacts: Artifacts) -> bool:
+    # A failed LLM call returns the original code with an error header;
+    # caching that would pin the failure until the source changes.
+    return artifacts.ai is None or not artifacts.ai.startswith(ERROR_PREFIX)
+
+
+def _cache_key(
+    cache: ResultCache,
+    source_code: str,
+    input_path: Path,
+    use_llm: bool,
+    config: AnalysisConfig,
+    llm_mode: str = "file",
+    changed: Optional[Sequence[LineRange]] = None,
+    location: Optional[str] = None,
+) -> str:
+    # The filename is part of the report and docs headers, the location
+    # part of every issue.
+    options = {
+        "filename": input_path.name,
+        "use_llm": use_llm,
+        "analysis": asdict(config),
+    }
+    if use_llm and llm_mode != "file":
+        options["llm_mode"] = llm_mode
+    if changed is not None:
+        options["changed"] = [list(r) for r in changed]
+    if location is not None:
+        options["location"] = location
+    return cache.key(source_code, options)
+
+
+def _cached_artifacts(cache: ResultCache, key: str) -> Optional[Artifacts]:
+    cached = cache.get(key)
+    if cached is None:
+        return None
+    try:
+        return Artifacts(**cached)
+    except TypeError:
+        return None  # entry written by an incompatible layout; recompute
+
+
+@dataclass
+class _Pending:
+    index: int
+    input_path: Path
+    source_code: str
+    key: Optional[str]
+    # Needed by the batched production/LLM steps. The report is already on
+    # disk by then (see process_files).
+    commented: str = ""
+
+
+def _write_outputs(
+    item: _Pending,
+    prod_code: str,
+    ai_code: Union[str, _Streamed, None],
+    report_format: str,
+    cache: Optional[ResultCache],
+):
+    """
+    Step 5 and writing: the code artifacts, then the documentation streamed
+    section by section into its file. The cache entry is read back from
+    the written files, one file's artifacts at a time.
+    """
+    input_path = item.input_path
+    streamed = isinstance(ai_code, _Streamed)
+    with tracing.span("write_artifacts", "stage"):
+        commented_path, prod_path, ai_path = _write_code(
+            input_path, item.commented, prod_code, None if streamed else ai_code
         )
-        ai_path.write_text(ai_code, encoding="utf-8")
+    if streamed:
+        ai_path = ai_code.path
+        # Left as streamed; its text is read here, one file at a time,
+        # because the docs are generated from it.
+        ai_code = ai_path.read_text(encoding="utf-8")
 
-    # Step 5 — Documentation
     doc_source = ai_code if ai_code is not None else prod_code
-    docs_text = generate_docs(doc_source, input_path.name)
-    docs_path = input_path.with_name(input_path.stem + "_docs.md")
-    docs_path.write_text(docs_text, encoding="utf-8")
+    docs_path = _docs_path(input_path)
+    with tracing.span("generate_docs", "stage"):
+        _write_streamed(
+            docs_path,
+            lambda out: write_sections(
+                doc_sections(doc_source, input_path.name, AnalysisContext(doc_source)),
+                out,
+            ),
+        )
+
+    report_path = _report_path(input_path, report_format)
+    if item.key is not None:
+        artifacts = Artifacts(
+            commented=item.commented,
+            report=report_path.read_text(encoding="utf-8"),
+            prod=prod_code,
+            docs=docs_path.read_text(encoding="utf-8"),
+            ai=ai_code,
+        )
+        if _cacheable(artifacts):
+            cache.put(item.key, asdict(artifacts))
 
     return commented_path, prod_path, report_path, ai_path, docs_path
+
+
+def _read_source(path: Path, sources: Optional[Dict[Path, str]]) -> str:
+    if sources is not None and path.resolve() in sources:
+        return sources[path.resolve()]
+    return path.read_text(encoding="utf-8")
+
+
+def process_files(
+    input_paths: Sequence[Path],
+    use_llm: bool = False,
+    cache: Optional[ResultCache] = None,
+    config: Optional[AnalysisConfig] = None,
+    llm_cache: Optional[LLMCache] = None,
+    llm_mode: str = "file",
+    changed_lines: Optional[Dict[Path, Sequence[LineRange]]] = None,
+    function_cache: Optional[FunctionCache] = None,
+    sources: Optional[Dict[Path, str]] = None,
+    on_commented: Optional[Callable[[Path, str, AnalysisContext], None]] = None,
+) -> List[Union[tuple, Exception]]:
+    """
+    Run the pipeline over several files, sharing one black/ruff pass.
+
+    Returns, in input order, either the output paths (as process_file does)
+    or the exception that stopped that file; one failure never affects the
+    other files.
+
+    ``changed_lines`` maps resolved paths to the line ranges a diff touched;
+    the reports of those files cover only the functions around them.
+
+    With a ``function_cache``, a file that missed the result cache is only
+    re-analysed in the functions that changed since it was last seen.
+
+    ``sources`` maps resolved paths to the text to analyse in place of the
+    file on disk (the staged version, when the diff is against the index).
+
+    ``on_commented(input_path, source_code, commented_ctx)`` is called for
+    each file once its commented code is known, with the context its
+    report was built from (a fresh one on a cache hit), so callers can
+    analyse the same code further without parsing it again.
+    """
+    config = config or AnalysisConfig()
+    results: List[Union[tuple, Exception, None]] = [None] * len(input_paths)
+    pending: List[_Pending] = []
+
+    # Read sources, serve cache hits, and run steps 1–2 per file.
+    for i, input_path in enumerate(input_paths):
+        try:
+            with tracing.span(str(input_path), "file", phase="analyze"):
+                source_code = _read_source(input_path, sources)
+                changed = None
+                if changed_lines is not None:
+                    changed = changed_lines.get(input_path.resolve())
+
+                location = _issue_location(input_path, config)
+                key = None
+                if cache is not None:
+                    with tracing.span("cache_lookup", "stage"):
+                        key = _cache_key(
+                            cache,
+                            source_code,
+                            input_path,
+                            use_llm,
+                            config,
+                            llm_mode,
+                            changed,
+                            location,
+                        )
+                        cached = _cached_artifacts(cache, key)
+                    if cached is not None:
+                        results[i] = write_artifacts(
+                            input_path, cached, config.report_format
+                        )
+                        if on_commented is not None:
+                            commented_ctx = AnalysisContext(cached.commented)
+                            on_commented(input_path, source_code, commented_ctx)
+                        continue
+
+                item = _Pending(i, input_path, source_code, key)
+                commented_ctx, focus = _comment(
+                    source_code, changed=changed, function_cache=function_cache
+                )
+                item.commented = commented_ctx.source_code
+                # Written now, while the commented code's parse is at hand,
+                # straight from the records to the file; no report text is
+                # held for the later steps.
+                _write_streamed(
+                    _report_path(input_path, config.report_format),
+                    lambda out: _write_report(
+                        out, commented_ctx, input_path.name, config, focus, location
+                    ),
+                )
+                if on_commented is not None:
+                    on_commented(input_path, source_code, commented_ctx)
+                pending.append(item)
+        except Exception as e:
+            results[i] = e
+
+    # Step 3 — one production-refactor pass over every remaining file.
+    try:
+        with tracing.span("make_production_ready", "stage", files=len(pending)):
+            prod_codes = make_production_ready_batch([p.commented for p in pending])
+    except Exception:
+        # Fall back to per-file runs so a batch-level problem can be
+        # attributed to the file(s) that actually cause it.
+        prod_codes = [None] * len(pending)
+
+    # Step 4 — AI refactor (optional): all files' requests run concurrently
+    # over one shared client, or, when streaming, one file after another.
+    ai_codes: List[Union[str, _Streamed, Exception, None]] = [None] * len(pending)
+    if use_llm and pending and llm_mode == "stream":
+        for n, item in enumerate(pending):
+            try:
+                with tracing.span("llm", "stage", file=str(item.input_path)):
+                    ai_codes[n] = _stream_rewrite(
+                        item.commented, item.input_path, llm_cache
+                    )
+            except Exception as e:
+                ai_codes[n] = e
+    elif use_llm and pending:
+        try:
+            with tracing.span("llm", "stage", files=len(pending)):
+                ai_codes = _rewrite_many(
+                    [p.commented for p in pending],
+                    llm_mode,
+                    llm_cache,
+                    [p.input_path for p in pending],
+                )
+        except Exception as e:
+            # e.g. no API key: every file that needed the LLM fails.
+            ai_codes = [e] * len(pending)
+
+    # Step 5 and writing, per file.
+    for item, prod_code, ai_code in zip(pending, prod_codes, ai_codes):
+        if isinstance(ai_code, Exception):
+            results[item.index] = ai_code
+            continue
+        try:
+            with tracing.span(str(item.input_path), "file", phase="finish"):
+                if prod_code is None:
+                    with tracing.span("make_production_ready", "stage"):
+                        prod_code = make_production_ready(item.commented)
+                results[item.index] = _write_outputs(
+                    item, prod_code, ai_code, config.report_format, cache
+                )
+        except Exception as e:
+            results[item.index] = e
+
+    return results
+
+
+def process_file(
+    input_path: Path,
+    use_llm: bool = False,
+    cache: Optional[ResultCache] = None,
+    config: Optional[AnalysisConfig] = None,
+    llm_cache: Optional[LLMCache] = None,
+    llm_mode: str = "file",
+):
+    result = process_files(
+        [input_path],
+        use_llm=use_llm,
+        cache=cache,
+        config=config,
+        llm_cache=llm_cache,
+        llm_mode=llm_mode,
+    )[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
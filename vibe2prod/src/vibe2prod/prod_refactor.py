@@ -1,21 +1,134 @@
+import functools
+import shutil
 import subprocess
 import tempfile
 from pathlib import Path
 
+from . import tracing
 
-def _run_cmd(cmd):
+
+# Name ruff sees for stdin input; only the suffix matters (selects Python).
+_STDIN_FILENAME = "temp.py"
+
+
+@functools.lru_cache(maxsize=None)
+def _black_module():
+    try:
+        import black
+    except ImportError:
+        return None
+    return black
+
+
+@functools.lru_cache(maxsize=None)
+def _which(tool):
+    return shutil.which(tool)
+
+
+def _run_cmd(cmd, source_code):
+    """
+    Pipe source through a formatter CLI and return its stdout, or the input
+    unchanged if the tool is missing or fails. Empty output from a
+    successful run is a result (e.g. ruff removed the only import).
+    """
+    if _which(cmd[0]) is None:
+        return source_code
+    try:
+        proc = subprocess.run(
+            cmd, input=source_code, check=True, capture_output=True, text=True
+        )
+    except Exception:
+        return source_code
+    return proc.stdout
+
+
+def _run_batch_cmd(cmd):
+    """
+    Run a formatter CLI over files in place, ignoring a missing tool or failure.
+    """
+    if _which(cmd[0]) is None:
+        return
     try:
         subprocess.run(cmd, check=True, capture_output=True, text=True)
     except Exception:
         pass
 
 
+def format_with_black(source_code: str) -> str:
+    black = _black_module()
+    with tracing.span("black", "tool"):
+        if black is None:
+            return _run_cmd(["black", "-q", "-"], source_code)
+        try:
+            return black.format_str(source_code, mode=black.Mode())
+        except Exception:
+            return source_code
+
+
+def fix_with_ruff(source_code: str) -> str:
+    # With --fix and stdin input ruff writes the fixed source to stdout and
+    # diagnostics to stderr, so no temp file is needed.
+    with tracing.span("ruff", "tool"):
+        return _run_cmd(
+            [
+                "ruff",
+                "check",
+                "--fix",
+                "--exit-zero",
+                "--quiet",
+                "--no-cache",
+                "--isolated",
+                "--stdin-filename",
+                _STDIN_FILENAME,
+                "-",
+            ],
+            source_code,
+        )
+
+
 def make_production_ready(source_code: str) -> str:
+    return fix_with_ruff(format_with_black(source_code))
+
+
+def make_production_ready_batch(sources):
+    """
+    Production-refactor many sources with O(1) tool launches.
+
+    black still runs in memory per source (no process at all). For ruff, all
+    sources are staged into one temporary tree and fixed with a single
+    ``ruff check --fix`` over the directory, which lints files in parallel.
+    Results come back in input order. If ruff is unavailable or fails, the
+    black-formatted code is returned, as in make_production_ready.
+    """
+    sources = list(sources)
+    if len(sources) <= 1:
+        return [make_production_ready(s) for s in sources]
+
+    black_mod = _black_module()
     with tempfile.TemporaryDirectory() as tmpdir:
-        tmp_file = Path(tmpdir) / "temp.py"
-        tmp_file.write_text(source_code)
+        paths = [Path(tmpdir) / f"{i:06d}.py" for i in range(len(sources))]
+
+        if black_mod is not None:
+            for path, source in zip(paths, sources):
+                path.write_text(format_with_black(source), encoding="utf-8")
+        else:
+            for path, source in zip(paths, sources):
+                path.write_text(source, encoding="utf-8")
+            with tracing.span("black", "tool", files=len(sources)):
+                _run_batch_cmd(["black", "-q", tmpdir])
 
-        _run_cmd(["black", str(tmp_file)])
-        _run_cmd(["ruff", "check", str(tmp_file), "--fix"])
+        with tracing.span("ruff", "tool", files=len(sources)):
+            _run_batch_cmd(
+                [
+                    "ruff",
+                    "check",
+                    "--fix",
+                    "--exit-zero",
+                    "--quiet",
+                    "--no-cache",
+                    "--isolated",
+                    tmpdir,
+                ]
+            )
 
-        return tmp_file.read_text()
+        return [path.read_text(encoding="utf-8") for path in paths]
@@ -1,18 +1,34 @@
+import io
+
 import libcst as cst
-from typing import Dict, Any, List
+from libcst.metadata import PositionProvider
+from typing import Dict, Any, Iterable, Iterator, List, Optional, TextIO, Union
+
+from . import tracing
+from .config import ReportFocus
+from .context import AnalysisContext, ensure_context
+from .issues import FunctionMetrics, Issue, write_jsonl, write_sarif
+from .report_writer import join_lines, write_sections
+from .rules import Rule, run_rules
 
-from .naming_checker import analyze_naming
-from .dead_code_checker import analyze_dead_code
-from .duplicate_checker import analyze_duplicates
+from .naming_checker import NamingIssueCollector
+from .dead_code_checker import DeadCodeCollector
+from .duplicate_checker import BlockCollector, duplicate_blocks
+from .near_duplicates import DEFAULT_THRESHOLD, analyze_near_duplicates, group_pairs
 
 
 # --------------------------------------------------
 # Utility: Walk CST to extract function statistics
 # --------------------------------------------------
 
-class FunctionCollector(cst.CSTVisitor):
+class FunctionCollector(Rule):
+    METADATA_DEPENDENCIES = (PositionProvider,)
+
     def __init__(self):
         self.functions: List[Dict[str, Any]] = []
+        # Functions enclosing the current node. A literal counts as a magic
+        # number of every enclosing function, nested ones included.
+        self._open: List[Dict[str, Any]] = []
 
     def visit_FunctionDef(self, node: cst.FunctionDef):
         name = node.name.value
@@ -24,19 +40,64 @@ class FunctionCollector(cst.CSTVisitor):
         # Count statements
         stmt_count = len(body)
 
-        # Magic numbers
-        magic = extract_magic_numbers(node)
-
-        self.functions.append(
-            {
-                "name": name,
-                "loops": loops,
-                "ifs": ifs,
-                "depth": depth,
-                "stmts": stmt_count,
-                "magic": magic,
-            }
-        )
+        # Magic numbers are filled in as the walk reaches them
+        pos = self.get_metadata(PositionProvider, node)
+        func = {
+            "name": name,
+            "line": pos.start.line,
+            "end_line": pos.end.line,
+            "loops": loops,
+            "ifs": ifs,
+            "depth": depth,
+            "stmts": stmt_count,
+            "magic": set(),
+        }
+        self.functions.append(func)
+        self._open.append(func)
+
+    def leave_FunctionDef(self, original_node: cst.FunctionDef):
+        self._open.pop()
+
+    incremental = True
+
+    def fragment(self):
+        return [{**func, "magic": list(func["magic"])} for func in self.functions]
+
+    @classmethod
+    def merge(cls, context, fragments):
+        rule = cls()
+        for functions, offset in fragments:
+            for func in functions:
+                rule.functions.append(
+                    {
+                        **func,
+                        "line": func["line"] + offset,
+                        "end_line": func["end_line"] + offset,
+                        "magic": set(func["magic"]),
+                    }
+                )
+        return rule
+
+    def visit_Integer(self, node: cst.Integer):
+        if not self._open:
+            return
+        try:
+            value = int(node.value)
+        except Exception:
+            return
+        if value not in (0, 1, -1):
+            for func in self._open:
+                func["magic"].add(value)
+
+    def visit_Float(self, node: cst.Float):
+        if not self._open:
+            return
+        try:
+            value = float(node.value)
+        except Exception:
+            return
+        for func in self._open:
+            func["magic"].add(value)
 
 
 # --------------------------------------------------
@@ -118,101 +179,322 @@ def extract_magic_numbers(func_node: cst.FunctionDef):
 
 
 # --------------------------------------------------
-# Main Report Generator
+# Report records
 # --------------------------------------------------
 
-def generate_report(source_code: str, filename: str) -> str:
-    lines = []
-    lines.append(f"# Quality Report for `{filename}`\n")
-
-    # Parse module
-    try:
-        module = cst.parse_module(source_code)
-    except Exception:
-        return "# Report Unavailable — Parsing Failed"
-
-    # Collect per-function metrics
-    fc = FunctionCollector()
-    module.visit(fc)
+PARSE_FAILED = "# Report Unavailable — Parsing Failed"
+
+# Per-function recommendations: (rule, check, message).
+_RECOMMENDATIONS = (
+    (
+        "complexity/nesting",
+        lambda f: f.depth >= 4,
+        "High nesting — consider splitting logic.",
+    ),
+    (
+        "complexity/loops",
+        lambda f: f.loops >= 3,
+        "Loop-heavy — may indicate repeated patterns.",
+    ),
+    (
+        "complexity/conditionals",
+        lambda f: f.ifs >= 5,
+        "Many conditionals — may hide complex behavior.",
+    ),
+    (
+        "complexity/length",
+        lambda f: f.stmts >= 15,
+        "Function is long — consider breaking into helpers.",
+    ),
+)
+
+Record = Union[FunctionMetrics, Issue]
+
+
+def report_records(
+    source_code: str,
+    filename: str,
+    context: Optional[AnalysisContext] = None,
+    near_threshold: float = DEFAULT_THRESHOLD,
+    focus: Optional[ReportFocus] = None,
+) -> Iterator[Record]:
+    """
+    Everything the quality report says, as records in report order: each
+    function's metrics followed by its recommendations, then naming, dead
+    code, duplicate and near-duplicate issues. With a ``focus`` only the
+    functions it names (and module-level findings, if it covers them) are
+    reported.
+
+    Raises the parse error if the source does not parse.
+    """
+    # Parse module and run every CST rule in one traversal; the analyzers
+    # below pick their finished rules up from the context.
+    context = ensure_context(source_code, context)
+    context.module
+
+    with tracing.span("cst_rules", "analyzer"):
+        fc, naming_rule, dead_rule, _ = run_rules(
+            context,
+            FunctionCollector,
+            NamingIssueCollector,
+            DeadCodeCollector,
+            BlockCollector,
+        )
 
     # --------------------------------------------------
     # Per-function metrics
     # --------------------------------------------------
+    spans = {}
     for func in fc.functions:
-        lines.append(f"## Function: `{func['name']}`")
-        lines.append(f"- Loops: {func['loops']}")
-        lines.append(f"- Conditionals: {func['ifs']}")
-        lines.append(f"- Max Nesting Depth: {func['depth']}")
-        lines.append(f"- Total Statements: {func['stmts']}")
-
-        # Magic numbers sorted safely
-        if func["magic"]:
-            nums = ", ".join(sorted(str(n) for n in func["magic"]))
-            lines.append(f"- Magic Numbers: {nums}")
-        else:
-            lines.append("- Magic Numbers: None")
-
-        # Recommendations
-        recs = []
-        if func["depth"] >= 4:
-            recs.append("⚠️ High nesting — consider splitting logic.")
-        if func["loops"] >= 3:
-            recs.append("⚠️ Loop-heavy — may indicate repeated patterns.")
-        if func["ifs"] >= 5:
-            recs.append("⚠️ Many conditionals — may hide complex behavior.")
-        if func["stmts"] >= 15:
-            recs.append("⚠️ Function is long — consider breaking into helpers.")
-
-        if recs:
-            lines.append("\n### Recommendations")
-            for r in recs:
-                lines.append(f"- {r}")
-        lines.append("")
+        spans.setdefault(func["name"], (func["line"], func["end_line"]))
+        if focus is not None and func["name"] not in focus.functions:
+            continue
+        metrics = FunctionMetrics(
+            func["name"],
+            func["line"],
+            func["end_line"],
+            func["loops"],
+            func["ifs"],
+            func["depth"],
+            func["stmts"],
+            tuple(func["magic"]),
+        )
+        yield metrics
+        for rule, applies, message in _RECOMMENDATIONS:
+            if applies(metrics):
+                yield Issue(
+                    rule,
+                    message,
+                    metrics.line,
+                    metrics.end_line,
+                    metrics.name,
+                    filename,
+                )
 
     # --------------------------------------------------
-    # Naming Analysis (F)
+    # Naming (F) and dead code
     # --------------------------------------------------
+    for span_name, rule in (("naming", naming_rule), ("dead_code", dead_rule)):
+        with tracing.span(span_name, "analyzer"):
+            records = rule.records
+        for r in records:
+            if focus is None or focus.covers(r.symbol):
+                yield Issue(r.rule, r.message, r.line, r.end_line, r.symbol, filename)
+
+    # ---------- Duplicate Logic / Clone Detection ----------
+    with tracing.span("duplicates", "analyzer"):
+        dupes = duplicate_blocks(context)
+    for h, items in dupes.items():
+        if focus is not None and not any(fn in focus.functions for fn, *_ in items):
+            continue
+        func_list = sorted({fn for fn, *_ in items})
+        fn, start, end, _ = items[0]
+        yield Issue(
+            "duplicate/block",
+            f"Duplicate block (hash `{h[:6]}`) found in functions: {', '.join(func_list)}",
+            start,
+            end,
+            fn,
+            filename,
+        )
 
-    naming_issues = analyze_naming(source_code)
+    # ---------- Near-Duplicate Functions (MinHash/LSH) ----------
+    with tracing.span("near_duplicates", "analyzer"):
+        near = group_pairs(
+            analyze_near_duplicates(source_code, context, near_threshold)
+        )
+    for names, low, high in near:
+        if focus is not None and not focus.functions & set(names):
+            continue
+        score = f"{low:.0%}" if low == high else f"{low:.0%}–{high:.0%}"
+        names = sorted(names)
+        func_list = ", ".join(f"`{n}`" for n in names)
+        yield Issue(
+            "near-duplicate/function",
+            f"Similar functions ({score} similar): {func_list}",
+            *spans.get(names[0], (None, None)),
+            names[0],
+            filename,
+        )
 
-    lines.append("## Naming Issues")
 
-    if naming_issues:
-        for issue in naming_issues:
-            lines.append(f"- {issue}")
-    else:
-        lines.append("No naming issues detected.")
+def issues_only(records: Iterable[Record]) -> Iterator[Issue]:
+    return (r for r in records if isinstance(r, Issue))
 
-    lines.append("")
-    
-    # ---------- Dead Code Analysis ----------
-    dead_issues = analyze_dead_code(source_code)
 
-    lines.append("## Dead Code Issues")
+# --------------------------------------------------
+# Renderers
+# --------------------------------------------------
 
-    if dead_issues:
-        for issue in dead_issues:
-            lines.append(f"- {issue}")
+# Issue sections of the Markdown report: (category, heading, when empty).
+_SECTIONS = (
+    ("naming", "## Naming Issues", "No naming issues detected."),
+    ("dead-code", "## Dead Code Issues", "No dead code detected."),
+    ("duplicate", "## Duplicate Logic", "No duplicate logic detected."),
+    (
+        "near-duplicate",
+        "## Near-Duplicate Functions",
+        "No near-duplicate functions detected.",
+    ),
+)
+_SECTION_INDEX = {category: i for i, (category, _, _) in enumerate(_SECTIONS)}
+
+
+def _function_block(metrics: FunctionMetrics, recs: List[str]) -> List[str]:
+    lines = [
+        f"## Function: `{metrics.name}`",
+        f"- Loops: {metrics.loops}",
+        f"- Conditionals: {metrics.ifs}",
+        f"- Max Nesting Depth: {metrics.depth}",
+        f"- Total Statements: {metrics.stmts}",
+    ]
+
+    # Magic numbers sorted safely
+    if metrics.magic:
+        nums = ", ".join(sorted(str(n) for n in metrics.magic))
+        lines.append(f"- Magic Numbers: {nums}")
     else:
-        lines.append("No dead code detected.")
+        lines.append("- Magic Numbers: None")
 
+    if recs:
+        lines.append("\n### Recommendations")
+        for r in recs:
+            lines.append(f"- ⚠️ {r}")
     lines.append("")
+    return lines
+
+
+def drift_markdown(issues: Iterable[Issue]) -> str:
+    """
+    The comment drift section appended to a Markdown report ("" if none).
+    """
+    text = ""
+    for issue in issues:
+        if not text:
+            text = "\n\n## Comment Drift Detected\n"
+        text += f"### {issue.symbol}\n{issue.message}\n\n"
+    return text
+
+
+def _section_block(index: int, items: List[str]) -> List[str]:
+    _, heading, empty = _SECTIONS[index]
+    return [heading, *(items or [empty]), ""]
+
+
+def _markdown_blocks(
+    records: Iterable[Record],
+    filename: str,
+    focus: Optional[ReportFocus],
+    drift: List[Issue],
+) -> Iterator[List[str]]:
+    header = [f"# Quality Report for `{filename}`\n"]
+    if focus is not None:
+        names = ", ".join(f"`{n}`" for n in sorted(focus.functions)) or "none"
+        header.append(f"_Limited to changed code. Functions: {names}._\n")
+    yield header
+
+    # Records arrive in report order, so each block is written as soon as
+    # the next one starts; only the open block is held.
+    metrics, recs = None, []
+    section, items = -1, []  # index into _SECTIONS of the open section
+    for record in records:
+        if isinstance(record, FunctionMetrics):
+            if metrics is not None:
+                yield _function_block(metrics, recs)
+            metrics, recs = record, []
+            continue
+        if record.category == "complexity":
+            recs.append(record.message)
+            continue
+        if record.category == "comment-drift":
+            drift.append(record)  # goes after everything else
+            continue
+        if metrics is not None:
+            yield _function_block(metrics, recs)
+            metrics = None
+        while section < _SECTION_INDEX[record.category]:
+            if section >= 0:
+                yield _section_block(section, items)
+            section, items = section + 1, []
+        items.append(f"- {record.message}")
+
+    if metrics is not None:
+        yield _function_block(metrics, recs)
+    for index in range(max(section, 0), len(_SECTIONS)):
+        yield _section_block(index, items if index == section else [])
+
+
+def markdown_sections(
+    records: Iterable[Record], filename: str, focus: Optional[ReportFocus] = None
+) -> Iterator[str]:
+    """
+    The Markdown quality report for ``records`` (in report_records order,
+    plus any comment-drift issues), one section at a time.
+    """
+    drift: List[Issue] = []
+    yield from join_lines(_markdown_blocks(records, filename, focus, drift))
+    if drift:
+        yield drift_markdown(drift)
+
+
+def render_markdown(
+    records: Iterable[Record], filename: str, focus: Optional[ReportFocus] = None
+) -> str:
+    return "".join(markdown_sections(records, filename, focus))
+
+
+def write_report(
+    records: Iterable[Record],
+    filename: str,
+    out: TextIO,
+    report_format: str = "markdown",
+    focus: Optional[ReportFocus] = None,
+) -> None:
+    """
+    Stream ``records`` to ``out`` as a Markdown report, JSON Lines or a
+    SARIF log; nothing is held beyond the section being written.
+    """
+    if report_format == "markdown":
+        write_sections(markdown_sections(records, filename, focus), out)
+    else:
+        writer = write_sarif if report_format == "sarif" else write_jsonl
+        writer(issues_only(records), out)
 
-    # ---------- Duplicate Logic / Clone Detection ----------
-    dupes = analyze_duplicates(source_code)
-
-    lines.append("## Duplicate Logic")
 
-    if dupes:
-        for h, items in dupes.items():
-            func_list = sorted({fn for fn, _ in items})
-            lines.append(f"- Duplicate block (hash `{h[:6]}`) found in functions: {', '.join(func_list)}")
-    else:
-        lines.append("No duplicate logic detected.")
+def render_report(
+    records: Iterable[Record],
+    filename: str,
+    report_format: str = "markdown",
+    focus: Optional[ReportFocus] = None,
+) -> str:
+    """
+    write_report, into a string.
+    """
+    out = io.StringIO()
+    write_report(records, filename, out, report_format, focus)
+    return out.getvalue()
 
-    lines.append("")
 
+# --------------------------------------------------
+# Main Report Generator
+# --------------------------------------------------
 
+def generate_report(
+    source_code: str,
+    filename: str,
+    context: Optional[AnalysisContext] = None,
+    near_threshold: float = DEFAULT_THRESHOLD,
+    focus: Optional[ReportFocus] = None,
+) -> str:
+    """
+    Markdown quality report. With a ``focus`` only the functions it names
+    (and module-level findings, if it covers them) are reported.
+    """
+    context = ensure_context(source_code, context)
+    try:
+        context.module
+    except Exception:
+        return PARSE_FAILED
 
-    # Done
-    return "\n".join(lines)
+    records = report_records(source_code, filename, context, near_threshold, focus)
+    return render_markdown(records, filename, focus)
@@ -0,0 +1,117 @@
+"""
+Streaming report output.
+
+The report and documentation generators produce their Markdown section by
+section (report_generator.markdown_sections, documentation_generator.
+doc_sections); ``write_sections`` puts each section on a file handle as
+soon as it is produced, so a report is never held whole on the way out.
+report_generator.write_report does this for every report format.
+
+CombinedReport writes one report for a whole batch run, to a file or
+stdout, in the run's report format. Each file's report is copied through
+from its _report file as the file finishes, so memory stays bounded by
+one file's report however many files the run covers:
+
+- markdown: the per-file reports one after another, then a summary line;
+- jsonl: every file's issues;
+- sarif: one log whose single run holds every file's results.
+
+The issue formats need no rewriting on the way: process_files already
+records each issue's file relative to the run's working directory.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, TextIO
+
+from .issues import SarifWriter
+
+
+def join_lines(blocks: Iterable[List[str]]) -> Iterator[str]:
+    """
+    Yield ``"\\n".join`` of all lines of ``blocks``, one block at a time.
+    """
+    first = True
+    for block in blocks:
+        text = "\n".join(block)
+        yield text if first else "\n" + text
+        first = False
+
+
+def write_sections(sections: Iterable[str], out: TextIO) -> int:
+    """
+    Write each section to ``out`` as it is produced; returns the number of
+    characters written.
+    """
+    written = 0
+    for section in sections:
+        out.write(section)
+        written += len(section)
+    return written
+
+
+class CombinedReport:
+    """
+    One report for a batch run. Call ``add`` with each file's _report file
+    as it is written (``add_failure`` for files that failed) and ``close``
+    at the end.
+    """
+
+    def __init__(
+        self, out: TextIO, report_format: str = "markdown", root: Optional[Path] = None
+    ) -> None:
+        self.out = out
+        self.report_format = report_format
+        self.root = Path(root or Path.cwd())
+        self.files = 0
+        self.failed = 0
+        self._sarif = SarifWriter(out) if report_format == "sarif" else None
+        if report_format == "markdown":
+            out.write("# vibe2prod Report\n")
+
+    def _relative(self, path: Path) -> str:
+        return Path(os.path.relpath(path, self.root)).as_posix()
+
+    def add(self, report_path: Path) -> None:
+        self.files += 1
+        with report_path.open(encoding="utf-8") as f:
+            if self.report_format == "markdown":
+                self.out.write("\n---\n\n")
+                shutil.copyfileobj(f, self.out)
+                self.out.write("\n")
+            elif self.report_format == "jsonl":
+                shutil.copyfileobj(f, self.out)
+            else:
+                for run in json.load(f)["runs"]:
+                    for result in run["results"]:
+                        self._sarif.write_result(result)
+
+    def add_failure(self, input_path: Path, error: str) -> None:
+        """
+        Markdown lists failed files; the issue formats have no place for
+        them.
+        """
+        self.failed += 1
+        if self.report_format == "markdown":
+            self.out.write(
+                f"\n---\n\n# `{self._relative(input_path)}`\n\nFailed: {error}\n"
+            )
+
+    def close(self) -> None:
+        if self._sarif is not None:
+            self._sarif.close()
+        elif self.report_format == "markdown":
+            self.out.write(
+                f"\n---\n\n_{self.files} file(s) reported, {self.failed} failed._\n"
+            )
+        self.out.flush()
+
+    def __enter__(self) -> "CombinedReport":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
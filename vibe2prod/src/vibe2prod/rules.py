@@ -0,0 +1,231 @@
+"""
+Single-traversal rule engine for the CST analyzers.
+
+Each analyzer is a Rule: a libcst BatchableCSTVisitor with visit_/leave_
+hooks and an optional ``finalize``. ``run_rules`` walks the tree once and
+fans every node out to the hooks of all requested rules (libcst's batched
+visitor does the dispatch; metadata such as positions is resolved once for
+the union of the rules' dependencies).
+
+Finished rules are memoized on the AnalysisContext by class, so when the
+report generator runs every rule in one walk up front, the individual
+``analyze_*`` functions it calls afterwards reuse those results instead of
+walking the tree again.
+
+Rules marked ``incremental`` can also run per top-level function or class
+("unit"): each unit is walked on its own, its partial result (a JSON-able
+``fragment``) is stored in the context's FunctionCache under a hash of the
+unit's code, and the fragments of all units are merged back in module
+order. On the next run only units whose code changed are walked.
+"""
+
+from __future__ import annotations
+
+import ast
+import hashlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type, TypeVar
+
+import libcst as cst
+from libcst.metadata import MetadataWrapper
+
+from . import __version__
+from .context import AnalysisContext
+
+# Bump when a rule's fragment format or logic changes.
+FRAGMENT_VERSION = 2
+
+
+R = TypeVar("R", bound="Rule")
+
+
+class Rule(cst.BatchableCSTVisitor):
+    """
+    Base class for analyzers that run inside the shared tree walk.
+
+    Rules must not rely on skipping children (return values of visit_
+    hooks are ignored in a batched walk).
+    """
+
+    @classmethod
+    def for_context(cls: Type[R], context: AnalysisContext) -> R:
+        """
+        Build a fresh rule for ``context``. Override when the rule needs
+        more than the tree, e.g. the raw source lines.
+        """
+        return cls()
+
+    # Rules whose result can be split per unit and merged back set this and
+    # implement fragment() and merge().
+    incremental = False
+
+    def finalize(self) -> None:
+        """
+        Called once after the walk, for rules that report on what they saw
+        across the whole module.
+        """
+
+    def fragment(self) -> Any:
+        """
+        JSON-able result of a walk over one unit (finalize not called).
+        Line numbers are relative to the unit's first line.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def merge(
+        cls: Type[R], context: AnalysisContext, fragments: Sequence[Tuple[Any, int]]
+    ) -> R:
+        """
+        The finished rule for the whole module from every unit's fragment,
+        in module order, each with the line offset of its unit.
+        """
+        raise NotImplementedError
+
+
+def _cache_key(rule_class: type) -> str:
+    return f"rule:{rule_class.__module__}.{rule_class.__qualname__}"
+
+
+def run_rules(context: AnalysisContext, *rule_classes: Type[Rule]) -> List[Rule]:
+    """
+    Return finished instances of ``rule_classes`` for ``context``, in the
+    order given. Rules not already computed for this context are run
+    together in a single traversal.
+
+    Raises the parse error if the source does not parse.
+    """
+    missing = [
+        cls
+        for cls in dict.fromkeys(rule_classes)
+        if not context.has_cached(_cache_key(cls))
+    ]
+    if missing:
+        rules = None
+        store = context.function_cache
+        if store is not None and all(cls.incremental for cls in missing):
+            rules = _run_incremental(context, missing, store)
+        if rules is None:
+            rules = [cls.for_context(context) for cls in missing]
+            context.wrapper.visit_batched(rules)
+            for rule in rules:
+                rule.finalize()
+        for rule in rules:
+            context.cached(_cache_key(type(rule)), lambda rule=rule: rule)
+
+    return [context.cached(_cache_key(cls), lambda: None) for cls in rule_classes]
+
+
+_DEFS = {
+    cst.FunctionDef: (ast.FunctionDef, ast.AsyncFunctionDef),
+    cst.ClassDef: (ast.ClassDef,),
+}
+
+
+Unit = Tuple[List[cst.CSTNode], int, str]
+
+
+def _units(context: AnalysisContext) -> Optional[List[Unit]]:
+    """
+    Split a module into units: each top-level function or class on its
+    own, runs of other statements together. Returns (statements, line
+    offset, code) per unit; code is empty for runs.
+
+    Line spans come from the stdlib ast (regenerating code from the CST
+    would cost as much as the walk it saves). A unit starts at its first
+    decorator, so leading blank lines and comments are not part of its
+    code and editing them does not invalidate it.
+
+    Returns None when the stdlib parser disagrees with libcst.
+    """
+    module = context.module
+    try:
+        tree = context.tree
+    except SyntaxError:
+        return None
+    lines = context.source_code.splitlines(keepends=True)
+    nodes = iter(tree.body)
+    units: List[Unit] = []
+    run: List[cst.CSTNode] = []
+    run_offset = 0
+
+    for stmt in module.body:
+        # One ast statement per small statement of a line (``a = 1; b = 2``).
+        count = len(stmt.body) if isinstance(stmt, cst.SimpleStatementLine) else 1
+        node = next(nodes, None)
+        for _ in range(count - 1):
+            next(nodes, None)
+        if node is None:
+            return None
+        decorators = getattr(node, "decorator_list", ())
+        start = min([node.lineno] + [d.lineno for d in decorators])
+        bare = stmt.with_changes(leading_lines=[])
+
+        if type(stmt) in _DEFS:
+            if not isinstance(node, _DEFS[type(stmt)]):
+                return None
+            if run:
+                units.append((run, run_offset, ""))
+                run = []
+            code = "".join(lines[start - 1 : node.end_lineno])
+            units.append(([bare], start - 1, code))
+        elif run:
+            run.append(stmt)
+        else:
+            run, run_offset = [bare], start - 1
+
+    if next(nodes, None) is not None:
+        return None
+    if run:
+        units.append((run, run_offset, ""))
+    return units
+
+
+def _unit_key(code: str) -> str:
+    payload = f"{__version__}\0{FRAGMENT_VERSION}\0{code}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _walk_unit(
+    context: AnalysisContext, stmts: List[cst.CSTNode], rule_classes: Sequence[type]
+) -> List[Rule]:
+    # Keep the module's config (indentation, newlines) so positions match.
+    module = context.module.with_changes(header=[], body=stmts, footer=[])
+    rules = [cls.for_context(context) for cls in rule_classes]
+    MetadataWrapper(module, unsafe_skip_copy=True).visit_batched(rules)
+    return rules
+
+
+def _run_incremental(
+    context: AnalysisContext, rule_classes: Sequence[Type[Rule]], store
+) -> Optional[List[Rule]]:
+    """
+    run_rules through the FunctionCache: only functions and classes
+    without stored fragments (and top-level code in between, which is
+    not cached) are walked. None if the module cannot be split.
+    """
+    units = _units(context)
+    if units is None:
+        return None
+    # Only function and class units have code, and so a key.
+    keys = [_unit_key(code) if code else None for _, _, code in units]
+    names = [_cache_key(cls) for cls in rule_classes]
+    known = store.get_many([k for k in keys if k is not None], names)
+
+    fragments: List[List[Tuple[Any, int]]] = [[] for _ in rule_classes]
+    fresh: Dict[str, Dict[str, Any]] = {}
+    for (stmts, offset, _), key in zip(units, keys):
+        stored = known.get(key, {})
+        todo = [cls for cls, name in zip(rule_classes, names) if name not in stored]
+        walked = dict(zip(todo, _walk_unit(context, stmts, todo))) if todo else {}
+        for parts, cls, name in zip(fragments, rule_classes, names):
+            if name in stored:
+                fragment = stored[name]
+            else:
+                fragment = walked[cls].fragment()
+                if key is not None:
+                    fresh.setdefault(key, {})[name] = fragment
+            parts.append((fragment, offset))
+
+    if fresh:
+        store.put_many(fresh)
+    return [cls.merge(context, parts) for cls, parts in zip(rule_classes, fragments)]
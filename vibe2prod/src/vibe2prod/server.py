@@ -0,0 +1,349 @@
+"""
+Long-lived vibe2prod server for editors and CI.
+
+``vibe2prod serve`` pays interpreter startup and imports once, then answers
+JSON-RPC 2.0 requests, one JSON object per line, on stdin/stdout or on a
+Unix socket (``--socket PATH``; any number of clients, one request at a
+time). Sources travel in the request, so nothing is read from or written
+to disk:
+
+    {"jsonrpc": "2.0", "id": 1, "method": "process",
+     "params": {"source": "def f(x): ...", "filename": "f.py"}}
+
+answers with the artifacts process_file would have written:
+
+    {"jsonrpc": "2.0", "id": 1,
+     "result": {"commented": ..., "report": ..., "prod": ..., "docs": ...,
+                "ai": null, "cached": false}}
+
+Methods: ``process`` (params: source, filename, use_llm, llm_mode,
+similarity, report_format), ``stats`` and ``shutdown``.
+
+Between requests the server keeps results in memory (in front of the
+on-disk ResultCache, if enabled) and keeps the parsed AnalysisContext of
+recent sources, so a request for known code is a dictionary lookup and a
+request for known code under other options skips parsing and every
+memoized analysis. A request for edited code re-analyses only the
+functions that changed (through the FunctionCache, if enabled).
+"""
+
+from __future__ import annotations
+
+import argparse
+import inspect
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, Optional, TextIO
+
+from .cache import ResultCache
+from .config import DEFAULT_THRESHOLD, LLM_MODES, REPORT_FORMATS, AnalysisConfig
+from .context import AnalysisContext
+from .function_cache import FunctionCache
+from .llm_cache import LLMCache
+from .pipeline import _cache_key, _cacheable, _cached_artifacts, run_stages
+
+DEFAULT_MAX_RESULTS = 1024
+DEFAULT_MAX_CONTEXTS = 64
+
+# JSON-RPC 2.0 error codes.
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+class RPCError(Exception):
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+class _LRU(OrderedDict):
+    def __init__(self, max_entries: int) -> None:
+        super().__init__()
+        self.max_entries = max_entries
+
+    def lookup(self, key):
+        value = self.get(key)
+        if value is not None:
+            self.move_to_end(key)
+        return value
+
+    def store(self, key, value) -> None:
+        self[key] = value
+        self.move_to_end(key)
+        while len(self) > self.max_entries:
+            self.popitem(last=False)
+
+
+class Server:
+    """
+    Request handling, independent of the transport.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[ResultCache] = None,
+        llm_cache: Optional[LLMCache] = None,
+        function_cache: Optional[FunctionCache] = None,
+        max_results: int = DEFAULT_MAX_RESULTS,
+        max_contexts: int = DEFAULT_MAX_CONTEXTS,
+    ) -> None:
+        self.cache = cache
+        self.llm_cache = llm_cache
+        self.function_cache = function_cache
+        # Computes keys only; nothing touches its directory.
+        self._keys = cache if cache is not None else ResultCache()
+        self._results: _LRU = _LRU(max_results)
+        self._contexts: _LRU = _LRU(max_contexts)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hits = 0
+        self.stopped = threading.Event()
+
+    def process(
+        self,
+        source: str,
+        filename: str = "untitled.py",
+        use_llm: bool = False,
+        llm_mode: str = "file",
+        similarity: float = DEFAULT_THRESHOLD,
+        report_format: str = "markdown",
+    ) -> Dict[str, Any]:
+        # Checked here, so a bad value is the caller's error rather than a
+        # failure somewhere inside the pipeline.
+        if not isinstance(source, str):
+            raise RPCError(INVALID_PARAMS, "source must be a string")
+        if not isinstance(filename, str) or not filename:
+            raise RPCError(INVALID_PARAMS, "filename must be a non-empty string")
+        if not isinstance(use_llm, bool):
+            raise RPCError(INVALID_PARAMS, "use_llm must be a boolean")
+        if not isinstance(llm_mode, str) or llm_mode not in LLM_MODES:
+            raise RPCError(INVALID_PARAMS, f"llm_mode must be one of {LLM_MODES}")
+        if (
+            isinstance(similarity, bool)
+            or not isinstance(similarity, (int, float))
+            or not 0 < similarity <= 1
+        ):
+            raise RPCError(INVALID_PARAMS, "similarity must be a number in (0, 1]")
+        if not isinstance(report_format, str) or report_format not in REPORT_FORMATS:
+            raise RPCError(
+                INVALID_PARAMS, f"report_format must be one of {tuple(REPORT_FORMATS)}"
+            )
+
+        config = AnalysisConfig(
+            near_duplicate_threshold=similarity, report_format=report_format
+        )
+        key = _cache_key(self._keys, source, Path(filename), use_llm, config, llm_mode)
+
+        artifacts = self._results.lookup(key)
+        if artifacts is None and self.cache is not None:
+            artifacts = _cached_artifacts(self.cache, key)
+        if artifacts is not None:
+            self.hits += 1
+            self._results.store(key, artifacts)
+            return {**asdict(artifacts), "cached": True}
+
+        context = self._contexts.lookup(source)
+        if context is None:
+            context = AnalysisContext(source)
+            self._contexts.store(source, context)
+
+        # Streaming needs a file to stream into; here the answer is the file.
+        mode = "file" if llm_mode == "stream" else llm_mode
+        artifacts = run_stages(
+            source,
+            Path(filename).name,
+            use_llm,
+            config,
+            self.llm_cache,
+            mode,
+            context=context,
+            function_cache=self.function_cache,
+            file=filename,
+        )
+        if _cacheable(artifacts):
+            self._results.store(key, artifacts)
+            if self.cache is not None:
+                self.cache.put(key, asdict(artifacts))
+        return {**asdict(artifacts), "cached": False}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "hits": self.hits,
+            "results": len(self._results),
+            "contexts": len(self._contexts),
+        }
+
+    def shutdown(self) -> None:
+        self.stopped.set()
+
+    def handle(self, request: Any) -> Optional[Dict[str, Any]]:
+        """
+        Answer one decoded JSON-RPC request. Notifications (no ``id``)
+        get no answer.
+        """
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            return _error(None, INVALID_REQUEST, "invalid request")
+        request_id = request.get("id")
+        method = {
+            "process": self.process,
+            "stats": self.stats,
+            "shutdown": self.shutdown,
+        }.get(request["method"])
+
+        try:
+            if method is None:
+                raise RPCError(
+                    METHOD_NOT_FOUND, f"unknown method {request['method']!r}"
+                )
+            params = request.get("params") or {}
+            if not isinstance(params, dict):
+                raise RPCError(INVALID_PARAMS, "params must be an object")
+            with self._lock:
+                self.requests += 1
+                # Only a mismatch with the signature is the caller's fault;
+                # a TypeError raised inside the method is an internal error.
+                try:
+                    inspect.signature(method).bind(**params)
+                except TypeError as e:
+                    raise RPCError(INVALID_PARAMS, str(e)) from e
+                result = method(**params)
+        except RPCError as e:
+            response = _error(request_id, e.code, str(e))
+        except Exception as e:
+            response = _error(request_id, INTERNAL_ERROR, f"{type(e).__name__}: {e}")
+        else:
+            response = {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+        return response if "id" in request else None
+
+    def handle_line(self, line: str) -> Optional[str]:
+        """
+        One line in, one line out (or None for notifications).
+        """
+        try:
+            request = json.loads(line)
+        except ValueError:
+            response = _error(None, PARSE_ERROR, "parse error")
+        else:
+            response = self.handle(request)
+        return None if response is None else json.dumps(response)
+
+
+def _error(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {"code": code, "message": message},
+    }
+
+
+def serve_stdio(
+    server: Server, stdin: TextIO = sys.stdin, stdout: TextIO = sys.stdout
+) -> None:
+    for line in stdin:
+        if not line.strip():
+            continue
+        answer = server.handle_line(line)
+        if answer is not None:
+            stdout.write(answer + "\n")
+            stdout.flush()
+        if server.stopped.is_set():
+            break
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        server: Server = self.server.app
+        for raw in self.rfile:
+            line = raw.decode("utf-8")
+            if not line.strip():
+                continue
+            answer = server.handle_line(line)
+            if answer is not None:
+                self.wfile.write((answer + "\n").encode("utf-8"))
+                self.wfile.flush()
+            if server.stopped.is_set():
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                break
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def serve_socket(server: Server, path: Path) -> None:
+    path = Path(path)
+    if path.exists():
+        path.unlink()  # left behind by a server that did not exit cleanly
+    with _UnixServer(str(path), _Handler) as unix_server:
+        unix_server.app = server
+        try:
+            unix_server.serve_forever()
+        finally:
+            path.unlink(missing_ok=True)
+
+
+def call(path: Path, method: str, **params: Any) -> Any:
+    """
+    Send one request to a server listening on ``path`` and return its
+    result, raising RPCError for an error answer.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(path))
+        request = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
+        sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with sock.makefile("r", encoding="utf-8") as answers:
+            response = json.loads(answers.readline())
+    if "error" in response:
+        raise RPCError(response["error"]["code"], response["error"]["message"])
+    return response["result"]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="vibe2prod serve",
+        description="Answer JSON-RPC requests with warm imports and caches.",
+    )
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help="Listen on this Unix socket instead of stdin/stdout.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=None,
+        help="Where to keep cached results (default: ~/.cache/vibe2prod).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Keep results in memory only; do not read or write the disk cache.",
+    )
+    args = parser.parse_args(argv)
+
+    server = Server(
+        cache=None if args.no_cache else ResultCache(args.cache_dir),
+        llm_cache=None if args.no_cache else LLMCache(args.cache_dir),
+        function_cache=None if args.no_cache else FunctionCache(args.cache_dir),
+    )
+    if args.socket is None:
+        serve_stdio(server)
+    else:
+        print(
+            f"vibe2prod serving on {args.socket} (pid {os.getpid()})", file=sys.stderr
+        )
+        serve_socket(server, args.socket)
@@ -0,0 +1,187 @@
+"""
+Lightweight tracing for pipeline stages, analyzers, tools and files.
+
+Code marks interesting regions with ``span``:
+
+    with tracing.span("generate_report", "stage"):
+        ...
+
+While tracing is disabled (the default) ``span`` returns one shared no-op
+context manager, so instrumented code pays a global lookup and a call.
+When enabled, every span records wall time and CPU time of the current
+process; the finished spans can be summarised per (category, name) or
+exported as JSON and as Chrome trace events (load the file in
+chrome://tracing or https://ui.perfetto.dev).
+
+Worker processes trace into their own buffer; ``take_events`` hands the
+buffer back so the parent can ``add_events`` it to one combined trace.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+# One finished span:
+# {"name", "cat", "ts", "dur", "cpu" (all ns), "pid", "tid", "args"}
+Event = Dict[str, Any]
+
+_enabled = False
+_events: List[Event] = []
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "category", "args", "_wall", "_cpu")
+
+    def __init__(self, name: str, category: str, args: Dict[str, Any]) -> None:
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self) -> "_Span":
+        self._cpu = time.process_time_ns()
+        self._wall = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        wall = time.perf_counter_ns()
+        cpu = time.process_time_ns()
+        _events.append(
+            {
+                "name": self.name,
+                "cat": self.category,
+                "ts": self._wall,
+                "dur": wall - self._wall,
+                "cpu": cpu - self._cpu,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": self.args,
+            }
+        )
+        return False
+
+
+def span(name: str, category: str = "stage", **args: Any):
+    """
+    Context manager timing one region. ``args`` are stored on the event
+    (e.g. the file being processed).
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, category, args)
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def take_events() -> List[Event]:
+    """
+    Return and clear the events recorded so far.
+    """
+    events = _events[:]
+    del _events[:]
+    return events
+
+
+def add_events(events: Iterable[Event]) -> None:
+    _events.extend(events)
+
+
+def summarize(events: Iterable[Event]) -> List[Dict[str, Any]]:
+    """
+    Aggregate events per (category, name): call count, total wall and CPU
+    milliseconds. Sorted by category, then by wall time descending.
+    """
+    totals: Dict[tuple, List[int]] = {}
+    for event in events:
+        entry = totals.setdefault((event["cat"], event["name"]), [0, 0, 0])
+        entry[0] += 1
+        entry[1] += event["dur"]
+        entry[2] += event["cpu"]
+
+    rows = [
+        {
+            "category": cat,
+            "name": name,
+            "calls": calls,
+            "wall_ms": wall / 1e6,
+            "cpu_ms": cpu / 1e6,
+        }
+        for (cat, name), (calls, wall, cpu) in totals.items()
+    ]
+    rows.sort(key=lambda r: (r["category"], -r["wall_ms"], r["name"]))
+    return rows
+
+
+def format_summary(events: Iterable[Event]) -> str:
+    """
+    Plain-text table of ``summarize`` for printing at the end of a run.
+    """
+    rows = summarize(events)
+    width = max([len(r["name"]) for r in rows] + [4])
+    lines = [f"{'category':<10} {'name':<{width}} {'calls':>6} {'wall ms':>10} {'cpu ms':>10}"]
+    for r in rows:
+        lines.append(
+            f"{r['category']:<10} {r['name']:<{width}} {r['calls']:>6} "
+            f"{r['wall_ms']:>10.1f} {r['cpu_ms']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def write_json(path: Path, events: List[Event]) -> None:
+    """
+    Summary plus raw events (times in nanoseconds).
+    """
+    data = {"summary": summarize(events), "events": events}
+    Path(path).write_text(json.dumps(data, indent=2, default=str), encoding="utf-8")
+
+
+def write_chrome_trace(path: Path, events: List[Event]) -> None:
+    """
+    Chrome trace-event format: one complete ("X") event per span, times in
+    microseconds relative to the first span.
+    """
+    origin = min((e["ts"] for e in events), default=0)
+    trace = [
+        {
+            "name": e["name"],
+            "cat": e["cat"],
+            "ph": "X",
+            "ts": (e["ts"] - origin) / 1000,
+            "dur": e["dur"] / 1000,
+            "pid": e["pid"],
+            "tid": e["tid"],
+            "args": {**e["args"], "cpu_ms": e["cpu"] / 1e6},
+        }
+        for e in events
+    ]
+    data = {"traceEvents": trace, "displayTimeUnit": "ms"}
+    Path(path).write_text(json.dumps(data, default=str), encoding="utf-8")
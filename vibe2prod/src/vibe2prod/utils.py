@@ -1,2 +1,20 @@
+import os
+from pathlib import Path
+
+
 def noop(x):
     return x
+
+
+def default_cache_dir() -> Path:
+    """
+    Directory for vibe2prod's persistent caches.
+
+    $VIBE2PROD_CACHE_DIR wins, then $XDG_CACHE_HOME/vibe2prod,
+    then ~/.cache/vibe2prod.
+    """
+    override = os.getenv("VIBE2PROD_CACHE_DIR")
+    if override:
+        return Path(override)
+    base = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "vibe2prod"
@@ -0,0 +1,95 @@
+"""
+Watch mode: re-run the pipeline on files as they are edited.
+
+The watched files are found the way batch mode finds inputs, and their
+(mtime, size) is polled every ``interval`` seconds; a stat call per file
+is all an idle tree costs, and it works the same on every platform and
+filesystem. A burst of saves (an editor writing several files, a git
+checkout) is debounced: once something changed, the tree is re-polled
+until it has been quiet for ``debounce`` seconds, and then handled as one
+batch.
+
+Only files whose content actually changed are yielded (a touch or a save
+without edits is ignored), so the caller re-runs the pipeline for those
+alone; everything else keeps its artifacts and cache entries.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .batch import collect_inputs
+
+DEFAULT_INTERVAL = 0.5
+DEFAULT_DEBOUNCE = 0.3
+
+Snapshot = Dict[Path, Tuple[int, int]]
+
+
+def snapshot(patterns: Sequence[str]) -> Snapshot:
+    """
+    {file: (mtime_ns, size)} for every input ``patterns`` expand to.
+    """
+    files, _ = collect_inputs(patterns)
+    stats = {}
+    for path in files:
+        try:
+            st = path.stat()
+        except OSError:
+            continue  # deleted between listing and stat
+        stats[path] = (st.st_mtime_ns, st.st_size)
+    return stats
+
+
+def _content_hash(path: Path) -> Optional[str]:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def watch(
+    patterns: Sequence[str],
+    interval: float = DEFAULT_INTERVAL,
+    debounce: float = DEFAULT_DEBOUNCE,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Iterator[List[Path]]:
+    """
+    Yield every watched file once, then, forever, each settled batch of
+    files whose content changed (new files included), sorted.
+    """
+    seen = snapshot(patterns)
+    hashes = {path: _content_hash(path) for path in seen}
+    yield sorted(seen)
+
+    while True:
+        sleep(interval)
+        current = snapshot(patterns)
+        if current == seen:
+            continue
+
+        # Debounce: wait until the tree stops changing.
+        while True:
+            sleep(debounce)
+            settled = snapshot(patterns)
+            if settled == current:
+                break
+            current = settled
+
+        changed = []
+        for path, stat in current.items():
+            if seen.get(path) == stat:
+                continue
+            content_hash = _content_hash(path)
+            if content_hash is not None and hashes.get(path) != content_hash:
+                hashes[path] = content_hash
+                changed.append(path)
+        for path in set(hashes) - set(current):
+            del hashes[path]
+
+        seen = current
+        if changed:
+            yield sorted(changed)
@@ -0,0 +1,54 @@
+import re
+
+from vibe2prod.batch import collect_inputs, process_paths
+from vibe2prod.cache import ResultCache
+from vibe2prod.clone_index import CloneIndex
+
+
+def test_batch_skips_outputs_and_isolates_failures(tmp_path):
+    (tmp_path / "good.py").write_text("def f(a):\n    return a\n")
+    (tmp_path / "bad.py").write_bytes(b"\xff\xfe not utf-8")
+
+    paths, unmatched = collect_inputs([str(tmp_path)])
+    assert [p.name for p in paths] == ["bad.py", "good.py"]
+    assert unmatched == []
+
+    results = process_paths(paths, jobs=2, chunk_size=1)
+    assert [r.input_path.name for r in results] == ["bad.py", "good.py"]
+    assert not results[0].ok and results[1].ok
+
+    # Outputs written by the first run are not picked up as inputs.
+    paths, _ = collect_inputs([str(tmp_path)])
+    assert [p.name for p in paths] == ["bad.py", "good.py"]
+
+
+def test_only_outputs_beside_their_source_are_skipped(tmp_path):
+    for name in ("config_prod.py", "open_ai.py", "mod.py", "mod_ai.py"):
+        (tmp_path / name).write_text("x = 1\n")
+
+    paths, _ = collect_inputs([str(tmp_path)])
+    assert [p.name for p in paths] == ["config_prod.py", "mod.py", "open_ai.py"]
+
+    # A file named explicitly is processed whatever its name.
+    paths, unmatched = collect_inputs([str(tmp_path / "mod_ai.py")])
+    assert [p.name for p in paths] == ["mod_ai.py"] and unmatched == []
+
+
+def test_cross_file_lines_refer_to_the_commented_files(tmp_path):
+    body = "    total = 0\n    for item in items:\n        total += item\n"
+    body += "    print(total)\n    return total\n"
+    (tmp_path / "a.py").write_text("import os\n\n\ndef alpha(items):\n" + body)
+    (tmp_path / "b.py").write_text("def beta(items):\n" + body)
+    index = CloneIndex(tmp_path / "index")
+    cache = ResultCache(tmp_path / "cache")
+
+    for _ in range(2):  # analysed, then served from the result cache
+        paths = [tmp_path / "a.py", tmp_path / "b.py"]
+        results = process_paths(paths, cache=cache, clone_index=index)
+        report = results[0].outputs[2].read_text()
+        section = report.split("## Cross-File Duplicates\n", 1)[1]
+        assert section.startswith("_Line numbers refer to each file's `_commented`")
+
+        line = int(re.search(r"`alpha` \(lines (\d+)", section).group(1))
+        commented = (tmp_path / "a_commented.py").read_text().splitlines()
+        assert commented[line - 1].lstrip().startswith(("total", "for"))
@@ -0,0 +1,19 @@
+from vibe2prod.cache import ResultCache
+
+
+def test_result_cache_roundtrip_and_lru_eviction(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=400)
+    config = {"filename": "a.py", "use_llm": False}
+
+    key_a = cache.key("x = 1\n", config)
+    assert key_a != cache.key("x = 2\n", config)
+    assert key_a != cache.key("x = 1\n", {**config, "use_llm": True})
+
+    cache.put(key_a, {"commented": "a" * 100})
+    assert cache.get(key_a) == {"commented": "a" * 100}
+
+    for i in range(10):
+        cache.put(cache.key(f"y = {i}\n", config), {"commented": "b" * 100})
+
+    assert cache.get(key_a) is None
+    assert sum(p.stat().st_size for p in tmp_path.rglob("*.json")) <= 400
@@ -0,0 +1,35 @@
+from vibe2prod.clone_index import CloneIndex, collect_clone_blocks, source_hash
+
+BODY = """
+    total = 0
+    for item in items:
+        total += item
+    print(total)
+    return total
+"""
+
+
+def test_clone_index_reports_and_forgets_cross_file_groups(tmp_path):
+    a = "def alpha(items):" + BODY
+    b = "def beta(values):" + BODY.replace("item", "value")
+    index = CloneIndex(tmp_path / "index")
+
+    updated = index.update_many(
+        [
+            ("a.py", source_hash(a), collect_clone_blocks(a)),
+            ("b.py", source_hash(b), collect_clone_blocks(b)),
+        ]
+    )
+    assert updated == 2
+
+    groups = list(CloneIndex(tmp_path / "index").cross_file_groups())
+    assert [[(loc.path, loc.function) for loc in g] for g in groups] == [
+        [("a.py", "alpha"), ("b.py", "beta")]
+    ]
+    assert all(isinstance(fp, int) for fp, *_ in collect_clone_blocks(a))
+
+    # Unchanged content is skipped; changed content replaces old rows.
+    assert index.update_many([("a.py", source_hash(a), collect_clone_blocks(a))]) == 0
+    c = "def alpha():\n    return 1\n"
+    index.update_many([("a.py", source_hash(c), collect_clone_blocks(c))])
+    assert list(index.cross_file_groups()) == []
@@ -1,6 +1,67 @@
-from vibe2prod.comment_enhancer import enhance_comments
+from vibe2prod.comment_enhancer import (
+    apply_insertions,
+    enhance_comments,
+    plan_insertions,
+)
+from vibe2prod.context import AnalysisContext
 
 def test_enhance_comments_noop_without_llm():
     code = "def f(x):\n    return x\n"
     out = enhance_comments(code, use_llm=False)
     assert out == code
+
+
+TRICKY = '''#!/usr/bin/env python
+# header comment
+
+@decorator
+# between decorators
+@other(
+    1)
+async def fetch(a,
+                b=(1,
+                   2), *rest, key) -> int:  # trailing
+    # leading comment
+
+    for i in range(10):
+        # inside
+        pass
+    else:
+        while True:
+            if i:
+                pass
+            elif i > 2:
+                if i: pass
+            else:
+                x = 1_000 + 0x1F + 1e3 + 5j + f"{a + 7:>{b + 9}}"
+
+
+class Holder(
+    Base,
+):
+    """Holder."""
+    def get(self):
+        """Get."""
+        if self:
+            return 2.50
+'''
+
+
+def test_edit_list_matches_the_transformer():
+    for code in (TRICKY, TRICKY.replace("\n", "\r\n")):
+        insertions = plan_insertions(AnalysisContext(code))
+        assert insertions is not None
+        assert apply_insertions(code, insertions) == enhance_comments(
+            code, mode="transform"
+        )
+        assert enhance_comments(code) == enhance_comments(code, mode="transform")
+
+
+def test_layouts_the_edit_list_cannot_place_fall_back():
+    # A one-line suite (the transformer cannot add to it either) and a
+    # module whose docstring would end the file.
+    for code in ("def f(): return 1\n", "# only a comment\n"):
+        assert plan_insertions(AnalysisContext(code)) is None
+    assert enhance_comments("# only a comment\n") == enhance_comments(
+        "# only a comment\n", mode="transform"
+    )
@@ -0,0 +1,12 @@
+from vibe2prod.context import AnalysisContext
+from vibe2prod.report_generator import generate_report
+
+
+def test_context_parses_once_and_is_shared():
+    code = "def f(a):\n    x = 1\n    return a\n"
+    ctx = AnalysisContext(code)
+    module = ctx.module
+    report = generate_report(code, "f.py", ctx)
+    assert ctx.module is module
+    assert ctx.wrapper.module is module
+    assert "## Function: `f`" in report
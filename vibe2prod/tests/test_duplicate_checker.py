@@ -0,0 +1,15 @@
+from vibe2prod.duplicate_checker import analyze_duplicates
+
+RUN = "".join(f"    v{i} = data[{i}] * {i}\n" for i in range(10))
+
+
+def test_long_clone_is_reported_once_as_one_maximal_run():
+    code = (
+        "def first(data):\n" + RUN + "    return v0\n\n"
+        "def second(items):\n" + RUN.replace("data", "items") + "    return\n"
+    )
+    dupes = analyze_duplicates(code)
+    assert len(dupes) == 1
+    (blocks,) = dupes.values()
+    assert [fn for fn, _ in blocks] == ["first", "second"]
+    assert all(text.count("\n") == 9 for _, text in blocks)
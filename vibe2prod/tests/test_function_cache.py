@@ -0,0 +1,93 @@
+from libcst.metadata import MetadataWrapper
+
+from vibe2prod.context import AnalysisContext
+from vibe2prod.dead_code_checker import DeadCodeCollector
+from vibe2prod.duplicate_checker import BlockCollector
+from vibe2prod.function_cache import FunctionCache
+from vibe2prod.naming_checker import NamingIssueCollector
+from vibe2prod.report_generator import FunctionCollector, generate_report
+from vibe2prod.rules import run_rules
+
+RULES = (FunctionCollector, NamingIssueCollector, DeadCodeCollector, BlockCollector)
+
+SOURCE = """import os
+
+LIMIT = 10
+
+
+def first(rows, unused):
+    total = 0
+    for row in rows:
+        total += row * 3
+    return total
+
+
+# a comment
+@staticmethod
+def Second(rows, limit):
+    total = 0
+    for row in rows:
+        total += row * 3
+    return total
+
+
+class Holder:
+    def get(self, q):
+        if False:
+            pass
+        return 2.5
+"""
+
+
+def results(context):
+    fc, naming, dead, blocks = run_rules(context, *RULES)
+    return (
+        fc.functions,
+        naming.issues,
+        naming.scopes,
+        dead.issues,
+        dead.scopes,
+        blocks.functions,
+        blocks.normalized,
+    )
+
+
+def test_incremental_rules_match_a_full_walk(tmp_path, monkeypatch):
+    walks = []
+    original = MetadataWrapper.visit_batched
+
+    def counting(self, visitors, *args, **kwargs):
+        visitors = list(visitors)
+        if visitors:
+            walks.append(self.module.code)
+        return original(self, visitors, *args, **kwargs)
+
+    monkeypatch.setattr(MetadataWrapper, "visit_batched", counting)
+    store = FunctionCache(tmp_path)
+
+    cold = results(AnalysisContext(SOURCE, store))
+    assert cold == results(AnalysisContext(SOURCE))
+    assert cold[4] == ["get"]  # the `if False:` block, found in its scope
+    assert [(name, starts) for name, _, starts, _ in cold[5]][1] == (
+        "Second",
+        [16, 17, 19],
+    )
+
+    # An edit that shifts every later line: only `first` (and the
+    # uncached top-level code) is walked again.
+    edited = SOURCE.replace("    total = 0\n", "    total = 0\n\n", 1)
+    walks.clear()
+    warm = results(AnalysisContext(edited, store))
+    assert len(walks) == 2
+    assert any("def first" in code for code in walks)
+    assert not any("def Second" in code or "class Holder" in code for code in walks)
+    assert warm == results(AnalysisContext(edited))
+    assert store.hits == 2
+
+
+def test_report_is_unchanged_with_a_function_cache(tmp_path):
+    store = FunctionCache(tmp_path)
+    report = generate_report(SOURCE, "x.py", AnalysisContext(SOURCE))
+    assert generate_report(SOURCE, "x.py", AnalysisContext(SOURCE, store)) == report
+    assert generate_report(SOURCE, "x.py", AnalysisContext(SOURCE, store)) == report
+    assert store.misses == 3 and store.hits == 3
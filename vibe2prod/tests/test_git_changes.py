@@ -0,0 +1,143 @@
+import ast
+import subprocess
+
+from vibe2prod.git_changes import (
+    changed_lines,
+    focus_for,
+    parse_diff,
+    staged_sources,
+)
+from vibe2prod.report_generator import generate_report
+
+SOURCE = """\
+q = 0
+
+def first(a):
+    x = 1
+    return a
+
+def second(b):
+    y = 2
+    return b
+"""
+
+DIFF = """\
+diff --git a/pkg/mod.py b/pkg/mod.py
+--- a/pkg/mod.py
++++ b/pkg/mod.py
+@@ -8 +8 @@ def second(b):
+-    y = 3
++    y = 2
+@@ -20,0 +21,2 @@
++z = 1
++w = 2
+@@ -30,2 +32,0 @@
+diff --git a/gone.py b/gone.py
+--- a/gone.py
++++ /dev/null
+"""
+
+
+def test_parse_diff_ranges():
+    assert parse_diff(DIFF) == {"pkg/mod.py": [(8, 8), (21, 22), (32, 33)]}
+
+
+def test_report_is_narrowed_to_touched_functions():
+    focus = focus_for(ast.parse(SOURCE), [(8, 8)])
+    assert focus.functions == {"second"} and not focus.module_level
+
+    report = generate_report(SOURCE, "mod.py", focus=focus)
+    assert "## Function: `second`" in report
+    assert "## Function: `first`" not in report
+    assert "`y`" in report and "`x`" not in report
+    assert "Variable `q`" not in report  # module-level finding
+
+    report = generate_report(
+        SOURCE, "mod.py", focus=focus_for(ast.parse(SOURCE), [(1, 1)])
+    )
+    assert "Variable `q`" in report and "## Function" not in report
+
+
+def test_changed_lines_against_head(tmp_path):
+    def git(*args):
+        subprocess.run(["git", *args], cwd=tmp_path, check=True, capture_output=True)
+
+    git("init", "-q")
+    (tmp_path / "mod.py").write_text(SOURCE)
+    (tmp_path / "notes.txt").write_text("x\n")
+    git("add", ".")
+    git("-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init")
+
+    (tmp_path / "mod.py").write_text(SOURCE.replace("y = 2", "y = 20"))
+    (tmp_path / "notes.txt").write_text("y\n")
+    assert changed_lines("HEAD", cwd=tmp_path) == {
+        tmp_path.resolve() / "mod.py": [(8, 8)]
+    }
+    assert changed_lines(staged=True, cwd=tmp_path) == {}
+
+
+def test_parse_diff_unquotes_names():
+    diff = (
+        "+++ b/a b.py\t\n"
+        "@@ -1 +1 @@\n"
+        '+++ "b/\\303\\251\\t.py"\n'
+        "@@ -2 +2,2 @@\n"
+    )
+    assert parse_diff(diff) == {"a b.py": [(1, 1)], "é\t.py": [(2, 3)]}
+
+
+def test_changed_lines_with_odd_names_and_prefix_settings(tmp_path):
+    def git(*args):
+        subprocess.run(["git", *args], cwd=tmp_path, check=True, capture_output=True)
+
+    git("init", "-q")
+    git("config", "diff.noprefix", "true")
+    names = ["a b.py", "é.py"]
+    for name in names:
+        (tmp_path / name).write_text(SOURCE, encoding="utf-8")
+    git("add", ".")
+    git("-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init")
+
+    for name in names:
+        (tmp_path / name).write_text(
+            SOURCE.replace("x = 1", "x = 10"), encoding="utf-8"
+        )
+    assert changed_lines(cwd=tmp_path) == {
+        tmp_path.resolve() / name: [(4, 4)] for name in names
+    }
+
+
+def test_staged_sources_hold_the_index_version(tmp_path):
+    def git(*args):
+        subprocess.run(["git", *args], cwd=tmp_path, check=True, capture_output=True)
+
+    git("init", "-q")
+    for name in ("mod.py", "clean.py"):
+        (tmp_path / name).write_text(SOURCE)
+    git("add", ".")
+    git("-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init")
+
+    staged = SOURCE.replace("y = 2", "y = 20")
+    for name in ("mod.py", "clean.py"):
+        (tmp_path / name).write_text(staged)
+    git("add", ".")
+    (tmp_path / "mod.py").write_text("# unstaged\n" + staged)
+
+    assert changed_lines(staged=True, cwd=tmp_path) == {
+        tmp_path.resolve() / "mod.py": [(8, 8)],
+        tmp_path.resolve() / "clean.py": [(8, 8)],
+    }
+    assert staged_sources(cwd=tmp_path) == {tmp_path.resolve() / "mod.py": staged}
+
+
+def test_changed_lines_survive_non_utf8_hunks(tmp_path):
+    def git(*args):
+        subprocess.run(["git", *args], cwd=tmp_path, check=True, capture_output=True)
+
+    git("init", "-q")
+    (tmp_path / "mod.py").write_bytes(b"# caf\xe9\nx = 1\n")
+    git("add", ".")
+    git("-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init")
+
+    (tmp_path / "mod.py").write_bytes(b"# caf\xe9!\nx = 1\n")
+    assert changed_lines(cwd=tmp_path) == {tmp_path.resolve() / "mod.py": [(1, 1)]}
@@ -0,0 +1,11 @@
+from pathlib import Path
+
+GITIGNORE = Path(__file__).resolve().parents[1] / ".gitignore"
+
+
+def test_secrets_and_benchmark_results_stay_ignored():
+    text = GITIGNORE.read_text(encoding="utf-8")
+    lines = text.splitlines()
+    assert text.endswith("\n")  # so later appends start a new line
+    assert ".env" in lines  # holds OPENAI_API_KEY
+    assert "benchmarks/results/" in lines
@@ -0,0 +1,64 @@
+import io
+import json
+
+from vibe2prod.issues import Issue, write_jsonl, write_sarif
+from vibe2prod.report_generator import (
+    generate_report,
+    issues_only,
+    render_markdown,
+    report_records,
+)
+
+SOURCE = """import os
+
+
+def loadData(x):
+    if False:
+        pass
+    return x * 42
+"""
+
+
+def test_records_carry_rule_line_and_symbol():
+    issues = list(issues_only(report_records(SOURCE, "m.py")))
+    by_rule = {issue.rule: issue for issue in issues}
+
+    naming = by_rule["naming/function"]
+    assert (naming.line, naming.symbol, naming.file) == (4, "loadData", "m.py")
+    assert naming.severity == "warning"
+    dead = by_rule["dead-code/if-false"]
+    assert (dead.line, dead.end_line, dead.symbol) == (5, 6, "loadData")
+
+    # Compact records: slotted, one shared string per rule id.
+    assert not hasattr(naming, "__dict__")
+    assert Issue("".join(["naming/", "function"]), "m").rule is naming.rule
+
+
+def test_markdown_is_a_renderer_over_the_records():
+    records = list(report_records(SOURCE, "m.py"))
+    assert render_markdown(records, "m.py") == generate_report(SOURCE, "m.py")
+
+
+def test_writers_stream_jsonl_and_sarif():
+    def issues():
+        yield from issues_only(report_records(SOURCE, "m.py"))
+
+    out = io.StringIO()
+    count = write_jsonl(issues(), out)
+    lines = out.getvalue().splitlines()
+    assert count == len(lines) > 0
+    assert json.loads(lines[0])["file"] == "m.py"
+
+    out = io.StringIO()
+    assert write_sarif(issues(), out) == count
+    log = json.loads(out.getvalue())
+    run = log["runs"][0]
+    assert log["version"] == "2.1.0"
+    assert len(run["results"]) == count
+    result = next(r for r in run["results"] if r["ruleId"] == "naming/function")
+    assert run["tool"]["driver"]["rules"][result["ruleIndex"]]["id"] == result["ruleId"]
+    assert result["locations"][0]["physicalLocation"]["region"]["startLine"] == 4
+
+    out = io.StringIO()
+    write_sarif([], out)
+    assert json.loads(out.getvalue())["runs"][0]["results"] == []
@@ -0,0 +1,45 @@
+import sqlite3
+
+from vibe2prod.llm_cache import LLMCache, prompt_key
+
+
+def test_llm_cache_hits_expiry_and_eviction(tmp_path):
+    cache = LLMCache(tmp_path, max_bytes=100)
+    key = prompt_key("gpt", 0.1, "template {code}", "x = 1\n")
+    assert key != prompt_key("gpt", 0.2, "template {code}", "x = 1\n")
+
+    assert cache.get(key) is None
+    cache.put(key, "x = 1")
+    assert cache.get(key) == "x = 1"
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.stats()["entries"] == 1
+
+    # Least recently used entries go first once over max_bytes.
+    cache.put("a", "a" * 40)
+    cache.put("b", "b" * 40)
+    cache.get(key)
+    cache.put("c", "c" * 40)
+    assert cache.get("a") is None and cache.get(key) == "x = 1"
+
+    expired = LLMCache(tmp_path, ttl=-1)
+    assert expired.get(key) is None
+
+
+def test_old_rewrites_table_is_dropped_once(tmp_path):
+    path = tmp_path / "llm.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE rewrites (file TEXT, function TEXT)")
+    conn.commit()
+    conn.close()
+
+    cache = LLMCache(tmp_path)
+    cache.record_rewrites("m.py", {("f", 0): ("h", "code")})
+    tables = {row[0] for row in cache._db.execute("SELECT name FROM sqlite_master")}
+    assert "rewrites" not in tables
+    assert cache._db.execute("PRAGMA user_version").fetchone() == (1,)
+    cache.close()
+
+    # Later connections leave the database alone.
+    assert LLMCache(tmp_path).previous_rewrites("m.py") == {
+        ("f", 0): ("h", "code")
+    }
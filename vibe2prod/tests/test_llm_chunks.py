@@ -0,0 +1,164 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from vibe2prod.llm_cache import LLMCache
+from vibe2prod.llm_chunks import rewrite_many_chunked_with_llm, split_module
+from vibe2prod.llm_client import ERROR_PREFIX
+
+SOURCE = '''import math
+
+LIMIT = 10
+
+
+def area(r):
+    return math.pi * r * r
+
+
+# kept with its comment
+class Shape:
+    pass
+
+
+def flaky(x):
+    return x
+if __name__ == "__main__":
+    print(area(2))'''
+
+
+class _StubOpenAI(BaseHTTPRequestHandler):
+    """
+    Upper-cases the `return` lines of each chunk; answers the first request
+    for `flaky` with invalid Python so that chunk alone is retried. Chunks
+    starting with one of ``refuse`` get a 401.
+    """
+
+    prompts = []
+    refuse = ()
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        code = body["messages"][-1]["content"].split("--------------------\n")[1]
+        code = code.rsplit("\n--------------------", 1)[0]
+        with self.lock:
+            self.prompts.append(code)
+            first_flaky = code.startswith("def flaky") and sum(
+                p.startswith("def flaky") for p in self.prompts
+            ) == 1
+        if code.startswith(self.refuse):
+            data = json.dumps({"error": {"message": "bad key"}}).encode()
+            self.send_response(401)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        answer = "def flaky(:" if first_flaky else code.replace("return", "return  ")
+        data = json.dumps(
+            {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": f"```python\n{answer}\n```"},
+                    }
+                ],
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_split_module_round_trips():
+    plan = split_module(SOURCE)
+    assert [plan.segments[i].name for i in plan.chunks] == ["area", "Shape", "flaky"]
+    assert plan.join() == SOURCE
+
+
+def _rewrite(sources, **options):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubOpenAI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        return rewrite_many_chunked_with_llm(
+            sources,
+            base_url=f"http://127.0.0.1:{server.server_port}/v1",
+            api_key="test",
+            **options,
+        )
+    finally:
+        server.shutdown()
+
+
+def test_chunks_are_rewritten_validated_and_spliced():
+    _StubOpenAI.prompts = []
+    (result,) = _rewrite([SOURCE])
+
+    assert result == SOURCE.replace("return", "return  ")
+    # One request per chunk, plus one retry for the invalid answer.
+    assert sorted(p.split("(")[0].split(":")[0] for p in _StubOpenAI.prompts) == [
+        "class Shape",
+        "def area",
+        "def flaky",
+        "def flaky",
+    ]
+
+
+def test_incremental_run_resends_only_changed_functions(tmp_path):
+    cache = LLMCache(tmp_path)
+    _StubOpenAI.prompts = []
+    _rewrite([SOURCE], cache=cache, files=["mod.py"])
+
+    # Edit one function; only re-comment another.
+    edited = SOURCE.replace("r * r", "r ** 2").replace(
+        "class Shape:", "class Shape:  # base"
+    )
+    _StubOpenAI.prompts = []
+    (result,) = _rewrite([edited], cache=cache, files=["mod.py"])
+
+    assert [p.split("(")[0] for p in _StubOpenAI.prompts] == ["def area"]
+    assert "return   math.pi * r ** 2" in result
+    assert cache.reused == 2
+
+
+def test_failed_request_flags_the_file_and_is_not_recorded(tmp_path):
+    cache = LLMCache(tmp_path)
+    _StubOpenAI.prompts = []
+    _StubOpenAI.refuse = ("class Shape",)
+    try:
+        (result,) = _rewrite([SOURCE], cache=cache, files=["mod.py"])
+    finally:
+        _StubOpenAI.refuse = ()
+
+    assert result.startswith(f"{ERROR_PREFIX}: 1 of 3 chunk(s) kept")
+    assert "# LLM: rewrite of `Shape` failed (AuthenticationError" in result
+    assert "return   math.pi" in result
+
+    # The next run asks again for the failed chunk only.
+    _StubOpenAI.prompts = []
+    (result,) = _rewrite([SOURCE], cache=cache, files=["mod.py"])
+    assert [p.split(":")[0] for p in _StubOpenAI.prompts] == ["class Shape"]
+    assert result == SOURCE.replace("return", "return  ")
+
+
+def test_redefined_names_are_remembered_separately(tmp_path):
+    source = "def dup():\n    return 1\n\n\ndef dup():\n    return 2\n"
+    cache = LLMCache(tmp_path)
+    _StubOpenAI.prompts = []
+    (first,) = _rewrite([source], cache=cache, files=["mod.py"])
+    assert len(_StubOpenAI.prompts) == 2
+
+    _StubOpenAI.prompts = []
+    (again,) = _rewrite([source], cache=cache, files=["mod.py"])
+    assert _StubOpenAI.prompts == [] and cache.reused == 2
+    assert again == first == source.replace("return", "return  ")
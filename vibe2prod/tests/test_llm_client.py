@@ -0,0 +1,209 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from vibe2prod import pipeline
+from vibe2prod.documentation_generator import generate_docs
+from vibe2prod.llm_cache import LLMCache
+from vibe2prod.llm_client import (
+    AsyncLLMClient,
+    get_client,
+    llm_processes,
+    rewrite_many_with_llm,
+    share_limits,
+    stream_rewrite_to_file,
+)
+
+LATENCY = 0.1
+
+
+class _StubOpenAI(BaseHTTPRequestHandler):
+    """
+    Minimal chat-completions endpoint: echoes the code back after LATENCY,
+    and fails the very first request with a 500 to exercise retries.
+    """
+
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+    requests = 0
+
+    def do_POST(self):
+        cls = type(self)
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with cls.lock:
+            cls.requests += 1
+            first = cls.requests == 1
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        time.sleep(LATENCY)
+        with cls.lock:
+            cls.in_flight -= 1
+
+        if first:
+            self._send(500, {"error": {"message": "try again"}})
+            return
+        code = body["messages"][-1]["content"].split("--------------------")[1]
+        message = {"role": "assistant", "content": code}
+        self._send(
+            200,
+            {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop", "message": message}],
+            },
+        )
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_batch_rewrites_run_concurrently_with_bounded_in_flight(tmp_path):
+    cache = LLMCache(tmp_path)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubOpenAI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        sources = [f"x = {i}\n" for i in range(40)]
+        start = time.perf_counter()
+        results = rewrite_many_with_llm(
+            sources,
+            max_concurrency=8,
+            requests_per_second=1000,
+            base_url=f"http://127.0.0.1:{server.server_port}/v1",
+            api_key="test",
+            cache=cache,
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    assert results == [s.strip() for s in sources]
+    assert _StubOpenAI.requests == 41  # one retried
+    assert _StubOpenAI.max_in_flight <= 8
+    assert elapsed < 40 * LATENCY / 2
+
+    # Every response is cached now: the server is gone, and no client (nor
+    # API key) is needed.
+    assert rewrite_many_with_llm(sources, cache=cache) == results
+    assert cache.hits == 40
+
+
+class _StreamingStub(BaseHTTPRequestHandler):
+    """
+    Streams the code back in three server-sent events, pausing between
+    them; records what the output file held after the first one.
+    """
+
+    target = None
+    seen_mid_stream = None
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        assert body["stream"] is True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for i, piece in enumerate(["\n\nx = 1", "\ny = 2", "\n\n"]):
+            chunk = {
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": body["model"],
+                "choices": [{"index": 0, "delta": {"content": piece}}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(LATENCY)
+            if i == 0:
+                type(self).seen_mid_stream = self.target.read_text()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_stream_rewrite_writes_tokens_as_they_arrive(tmp_path, monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StreamingStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    get_client.cache_clear()
+    target = _StreamingStub.target = tmp_path / "out_ai.py"
+    updates = []
+    try:
+        stats = stream_rewrite_to_file(
+            "x=1\ny=2\n", target, progress=lambda s, done: updates.append(done)
+        )
+    finally:
+        server.shutdown()
+        get_client.cache_clear()
+
+    assert _StreamingStub.seen_mid_stream == "x = 1"
+    assert target.read_text() == "x = 1\ny = 2"
+    assert stats.error is None
+    assert 0 < stats.first_token < stats.elapsed
+    assert updates[-1] is True and updates.count(True) == 1
+
+
+def test_streamed_ai_file_is_not_written_again(tmp_path, monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StreamingStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    get_client.cache_clear()
+    source = tmp_path / "m.py"
+    source.write_text("x=1\n")
+    _StreamingStub.target = tmp_path / "m_ai.py"
+
+    written = []
+    write_code = pipeline._write_code
+
+    def spy(input_path, commented, prod, ai):
+        written.append(ai)
+        return write_code(input_path, commented, prod, ai)
+
+    monkeypatch.setattr(pipeline, "_write_code", spy)
+    try:
+        (outcome,) = pipeline.process_files([source], use_llm=True, llm_mode="stream")
+    finally:
+        server.shutdown()
+        get_client.cache_clear()
+
+    assert written == [None]
+    assert outcome[3] == tmp_path / "m_ai.py"
+    assert outcome[3].read_text() == "x = 1\ny = 2"
+    assert outcome[4].read_text() == generate_docs("x = 1\ny = 2", "m.py")
+
+
+def test_worker_processes_split_the_limits():
+    share_limits(4)
+    try:
+        llm = AsyncLLMClient(max_concurrency=16, requests_per_second=8, api_key="t")
+        assert llm._semaphore._value == 4 and llm._bucket.rate == 2
+        llm = AsyncLLMClient(max_concurrency=2, requests_per_second=8, api_key="t")
+        assert llm._semaphore._value == 1
+    finally:
+        share_limits(1)
+
+
+def test_more_workers_than_slots_stay_within_the_limit():
+    workers = llm_processes(32, max_concurrency=16)
+    assert workers == 16
+    share_limits(workers)
+    try:
+        llm = AsyncLLMClient(max_concurrency=16, requests_per_second=8, api_key="t")
+        assert llm._semaphore._value * workers <= 16
+        assert llm._bucket.rate * workers == 8
+    finally:
+        share_limits(1)
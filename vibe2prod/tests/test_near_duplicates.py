@@ -0,0 +1,43 @@
+from vibe2prod.near_duplicates import analyze_near_duplicates, lsh_params
+
+
+ORIGINAL = '''
+def load(path):
+    rows = []
+    with open(path) as f:
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) > 2:
+                rows.append((parts[0], int(parts[1]), float(parts[2])))
+    total = sum(r[2] for r in rows)
+    return rows, total
+'''
+
+# Same body with one extra statement.
+VARIANT = ORIGINAL.replace("def load", "def load_again").replace(
+    "    total = sum", "    rows.sort()\n    total = sum"
+)
+
+
+def test_lsh_params_midpoint_near_threshold():
+    bands, rows = lsh_params(0.8)
+    assert abs((1 / bands) ** (1 / rows) - 0.8) < 0.05
+
+
+def test_near_miss_clone_is_reported():
+    pairs = analyze_near_duplicates(ORIGINAL + VARIANT, threshold=0.6)
+    assert [(a, b) for a, b, _ in pairs] == [("load", "load_again")]
+    assert 0.6 <= pairs[0][2] < 1.0
+
+
+def test_unrelated_functions_are_not_reported():
+    other = '''
+def render(items):
+    html = ["<ul>"]
+    for item in items:
+        if item:
+            html.append("<li>" + str(item) + "</li>")
+    html.append("</ul>")
+    return "".join(html)
+'''
+    assert analyze_near_duplicates(ORIGINAL + other) == []
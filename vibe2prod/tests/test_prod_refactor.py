@@ -1,7 +1,58 @@
-from vibe2prod.prod_refactor import make_production_ready
+from vibe2prod import prod_refactor
+from vibe2prod.pipeline import process_files
+from vibe2prod.prod_refactor import (
+    fix_with_ruff,
+    format_with_black,
+    make_production_ready,
+    make_production_ready_batch,
+)
 
 def test_make_production_ready_returns_string():
     code = "x=1\n"
     out = make_production_ready(code)
     assert isinstance(out, str)
     assert "x" in out
+
+
+def test_format_with_black():
+    assert format_with_black("x=[1,2]\n") == "x = [1, 2]\n"
+    assert format_with_black("def f(:\n") == "def f(:\n"
+
+
+def test_fix_with_ruff_keeps_an_emptied_file_empty():
+    assert fix_with_ruff("import os\nx = 1\n") == "x = 1\n"
+    assert fix_with_ruff("import os\n") == ""
+
+
+def test_missing_ruff_returns_the_source(monkeypatch):
+    real_which = prod_refactor._which
+
+    def which(tool):
+        return None if tool == "ruff" else real_which(tool)
+
+    monkeypatch.setattr(prod_refactor, "_which", which)
+    assert fix_with_ruff("import os\n") == "import os\n"
+
+
+SOURCES = [
+    "import os\n",  # emptied by ruff
+    "def f(:\n    pass\n",  # black cannot format it
+    "import sys\nx=[1,2]\nprint(x)\n",
+    "def g(a):\n  return a\n",
+]
+
+
+def test_batch_matches_one_file_at_a_time():
+    assert make_production_ready_batch(SOURCES) == [
+        make_production_ready(s) for s in SOURCES
+    ]
+
+
+def test_process_files_prod_output_does_not_depend_on_the_batch(tmp_path):
+    paths = []
+    for i, source in enumerate(SOURCES):
+        paths.append(tmp_path / f"m{i}.py")
+        paths[-1].write_text(source, encoding="utf-8")
+    batched = [outcome[1].read_text() for outcome in process_files(paths)]
+    alone = [process_files([path])[0][1].read_text() for path in paths]
+    assert batched == alone
@@ -0,0 +1,118 @@
+import io
+import json
+from pathlib import Path
+
+from vibe2prod.cache import ResultCache
+from vibe2prod.config import AnalysisConfig
+from vibe2prod.documentation_generator import doc_sections, generate_docs
+from vibe2prod.pipeline import _cached_artifacts, process_files, run_stages
+from vibe2prod.report_generator import (
+    generate_report,
+    markdown_sections,
+    report_records,
+)
+from vibe2prod.report_writer import CombinedReport, write_sections
+
+SOURCE = """\"\"\"A module.\"\"\"
+
+
+class Box:
+    def get(self):
+        return 42
+
+
+def loadData(x):
+    if False:
+        pass
+    return x
+"""
+
+
+def test_sections_stream_the_same_text():
+    out = io.StringIO()
+    sections = markdown_sections(report_records(SOURCE, "m.py"), "m.py")
+    write_sections(sections, out)
+    assert out.getvalue() == generate_report(SOURCE, "m.py")
+
+    sections = list(doc_sections(SOURCE, "m.py"))
+    assert len(sections) > 1
+    assert "".join(sections) == generate_docs(SOURCE, "m.py")
+
+
+def _write_reports(tmp_path):
+    paths = []
+    for name in ("a", "b"):
+        sub = tmp_path / name
+        sub.mkdir(exist_ok=True)
+        path = sub / f"{name}_report.md"
+        path.write_text(generate_report(SOURCE, name), encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def test_combined_markdown(tmp_path):
+    out = io.StringIO()
+    with CombinedReport(out, "markdown", tmp_path) as combined:
+        for path in _write_reports(tmp_path):
+            combined.add(path)
+        combined.add_failure(tmp_path / "c.py", "boom")
+    text = out.getvalue()
+    assert text.startswith("# vibe2prod Report\n")
+    assert generate_report(SOURCE, "a") in text and generate_report(SOURCE, "b") in text
+    assert "# `c.py`\n\nFailed: boom" in text
+    assert text.endswith("_2 file(s) reported, 1 failed._\n")
+
+
+def _process_tree(tmp_path, fmt):
+    inputs = []
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir(exist_ok=True)
+        inputs.append(Path(name) / "m.py")
+        inputs[-1].write_text(SOURCE, encoding="utf-8")
+    return [
+        outcome[2]
+        for outcome in process_files(inputs, config=AnalysisConfig(report_format=fmt))
+    ]
+
+
+def test_issues_name_files_relative_to_the_run_root(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    out = io.StringIO()
+    with CombinedReport(out, "jsonl") as combined:
+        for path in _process_tree(tmp_path, "jsonl"):
+            assert {
+                json.loads(line)["file"] for line in path.read_text().splitlines()
+            } == {f"{path.parent.name}/m_commented.py"}
+            combined.add(path)
+    files = {json.loads(line)["file"] for line in out.getvalue().splitlines()}
+    assert files == {"a/m_commented.py", "b/m_commented.py"}
+
+    out = io.StringIO()
+    with CombinedReport(out, "sarif") as combined:
+        for path in _process_tree(tmp_path, "sarif"):
+            combined.add(path)
+    (run,) = json.loads(out.getvalue())["runs"]
+    artifacts = [
+        loc["physicalLocation"]["artifactLocation"]
+        for result in run["results"]
+        for loc in result["locations"]
+    ]
+    assert {a["uri"] for a in artifacts} == {"a/m_commented.py", "b/m_commented.py"}
+    assert {a["uriBaseId"] for a in artifacts} == {"%SRCROOT%"}
+
+
+def test_pipeline_streams_report_and_docs_to_their_files(tmp_path):
+    path = tmp_path / "m.py"
+    path.write_text(SOURCE, encoding="utf-8")
+    cache = ResultCache(tmp_path / "cache")
+    (outcome,) = process_files([path], cache=cache)
+    _, _, report_path, _, docs_path = outcome
+
+    expected = run_stages(SOURCE, "m.py")
+    assert report_path.read_text(encoding="utf-8") == expected.report
+    assert docs_path.read_text(encoding="utf-8") == expected.docs
+    assert not list(tmp_path.glob("*.tmp"))
+
+    # The cache entry is read back from the written files.
+    (key,) = [p.stem for p in (tmp_path / "cache").rglob("*.json")]
+    assert _cached_artifacts(cache, key) == expected
@@ -0,0 +1,35 @@
+from libcst.metadata import MetadataWrapper
+
+from vibe2prod.context import AnalysisContext
+from vibe2prod.naming_checker import analyze_naming
+from vibe2prod.report_generator import generate_report
+
+SOURCE = """
+def BadName(x):
+    total = 0
+    for i in range(10):
+        total += i * 42
+    return total
+"""
+
+
+def test_report_walks_the_tree_once(monkeypatch):
+    walks = []
+    original = MetadataWrapper.visit_batched
+
+    def counting(self, visitors, *args, **kwargs):
+        visitors = list(visitors)
+        if visitors:  # libcst also calls this, empty, while resolving metadata
+            walks.append([type(v).__name__ for v in visitors])
+        return original(self, visitors, *args, **kwargs)
+
+    monkeypatch.setattr(MetadataWrapper, "visit_batched", counting)
+
+    ctx = AnalysisContext(SOURCE)
+    report = generate_report(SOURCE, "x.py", ctx)
+    assert analyze_naming(SOURCE, ctx) == analyze_naming(SOURCE)
+
+    assert len(walks) == 2  # the report's walk, then the fresh context above
+    assert "- Magic Numbers: 10, 42" in report
+    assert "Function `BadName` is not snake_case." in report
+    assert "Parameter `x` is too short. Prefer descriptive names." in report
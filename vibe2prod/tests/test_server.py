@@ -0,0 +1,103 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+from vibe2prod import server as server_module
+from vibe2prod.cache import ResultCache
+from vibe2prod.config import AnalysisConfig
+from vibe2prod.pipeline import _cache_key, run_stages
+from vibe2prod.server import (
+    INTERNAL_ERROR,
+    INVALID_PARAMS,
+    METHOD_NOT_FOUND,
+    Server,
+    call,
+    serve_socket,
+)
+
+SOURCE = "def f(x):\n    return x*2\n"
+
+
+def _request(server, method, **params):
+    line = json.dumps({"jsonrpc": "2.0", "id": 7, "method": method, "params": params})
+    return json.loads(server.handle_line(line))
+
+
+def test_process_matches_pipeline_and_is_served_hot():
+    server = Server()
+    first = _request(server, "process", source=SOURCE, filename="pkg/f.py")["result"]
+    again = _request(server, "process", source=SOURCE, filename="pkg/f.py")["result"]
+
+    expected = run_stages(SOURCE, "f.py")
+    assert first["report"] == expected.report
+    assert first["prod"] == expected.prod
+    assert (first["cached"], again["cached"]) == (False, True)
+    assert {**again, "cached": False} == first
+
+    # Other options reuse the parsed context instead of adding one.
+    _request(server, "process", source=SOURCE, filename="g.py")
+    stats = _request(server, "stats")["result"]
+    assert stats == {"requests": 4, "hits": 1, "results": 2, "contexts": 1}
+
+
+def test_errors_and_notifications():
+    server = Server()
+    assert _request(server, "nope")["error"]["code"] == METHOD_NOT_FOUND
+    assert _request(server, "process", code=SOURCE)["error"]["code"] == INVALID_PARAMS
+    assert server.handle_line('{"jsonrpc": "2.0", "method": "stats"}') is None
+    assert json.loads(server.handle_line("{"))["error"]["code"] == -32700
+
+
+def test_bad_values_are_invalid_params():
+    server = Server()
+    for params in (
+        {"similarity": "high"},
+        {"similarity": 0},
+        {"similarity": True},
+        {"llm_mode": "fast"},
+        {"llm_mode": ["file"]},
+        {"report_format": ["sarif"]},
+        {"report_format": "html"},
+        {"filename": 3},
+        {"use_llm": "yes"},
+    ):
+        error = _request(server, "process", source=SOURCE, **params)["error"]
+        assert error["code"] == INVALID_PARAMS, params
+
+
+def test_internal_type_error_is_not_blamed_on_params(monkeypatch):
+    def broken(*args, **kwargs):
+        raise TypeError("bug")
+
+    monkeypatch.setattr(server_module, "run_stages", broken)
+    error = _request(Server(), "process", source=SOURCE)["error"]
+    assert error == {"code": INTERNAL_ERROR, "message": "TypeError: bug"}
+
+
+def test_stale_disk_cache_entry_is_recomputed(tmp_path):
+    cache = ResultCache(tmp_path)
+    key = _cache_key(cache, SOURCE, Path("f.py"), False, AnalysisConfig(), "file")
+    cache.put(key, {"layout": "old"})
+
+    result = _request(Server(cache=cache), "process", source=SOURCE, filename="f.py")
+    assert result["result"]["cached"] is False
+    assert result["result"]["report"] == run_stages(SOURCE, "f.py").report
+
+
+def test_unix_socket_round_trip(tmp_path):
+    path = tmp_path / "v2p.sock"
+    thread = threading.Thread(target=serve_socket, args=(Server(), path), daemon=True)
+    thread.start()
+    for _ in range(100):
+        if path.exists():
+            break
+        time.sleep(0.01)
+
+    result = call(path, "process", source=SOURCE, filename="f.py")
+    assert result["cached"] is False and "def f" in result["prod"]
+    assert call(path, "process", source=SOURCE, filename="f.py")["cached"] is True
+
+    call(path, "shutdown")
+    thread.join(timeout=5)
+    assert not thread.is_alive() and not path.exists()
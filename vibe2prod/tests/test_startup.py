@@ -0,0 +1,27 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import vibe2prod
+
+
+def _loaded_after(statement):
+    code = f"import json, sys\n{statement}\nprint(json.dumps(sorted(sys.modules)))"
+    env = {**os.environ, "PYTHONPATH": str(Path(vibe2prod.__file__).parents[1])}
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True
+    ).stdout
+    return set(json.loads(out))
+
+
+def test_cli_import_loads_no_heavy_dependencies():
+    loaded = _loaded_after("import vibe2prod.cli")
+    assert not loaded & {"libcst", "openai", "dotenv", "vibe2prod.pipeline"}
+
+
+def test_pipeline_without_llm_skips_openai_and_dotenv():
+    loaded = _loaded_after("import vibe2prod.batch, vibe2prod.llm_chunks")
+    assert "libcst" in loaded
+    assert not loaded & {"openai", "dotenv"}
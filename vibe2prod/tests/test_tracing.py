@@ -0,0 +1,27 @@
+import json
+
+from vibe2prod import tracing
+from vibe2prod.report_generator import generate_report
+
+
+def test_spans_are_recorded_only_when_enabled(tmp_path):
+    code = "def f(a):\n    return a * 2\n"
+    generate_report(code, "f.py")
+    assert tracing.take_events() == []
+
+    tracing.enable()
+    try:
+        generate_report(code, "f.py")
+    finally:
+        tracing.disable()
+    events = tracing.take_events()
+
+    summary = {(r["category"], r["name"]): r for r in tracing.summarize(events)}
+    assert summary[("analyzer", "cst_rules")]["calls"] == 1
+    assert summary[("parse", "libcst")]["calls"] == 1
+
+    trace_path = tmp_path / "trace.json"
+    tracing.write_chrome_trace(trace_path, events)
+    trace = json.loads(trace_path.read_text())["traceEvents"]
+    assert len(trace) == len(events)
+    assert all(e["ph"] == "X" and e["dur"] >= 0 for e in trace)
@@ -0,0 +1,30 @@
+import os
+
+from vibe2prod.watch import watch
+
+
+def test_yields_all_files_then_only_edited_ones(tmp_path):
+    a, b = tmp_path / "a.py", tmp_path / "b.py"
+    a.write_text("x = 1\n")
+    b.write_text("y = 2\n")
+
+    def edit():
+        a.write_text("x = 10\n")
+        os.utime(b, ns=(1, 1))  # touched, same content
+        (tmp_path / "a_prod.py").write_text("generated\n")
+
+    def add():
+        (tmp_path / "c.py").write_text("z = 3\n")
+
+    # Each poll consumes one step; the debounce re-poll sees no change.
+    steps = [edit, None, add, None]
+
+    def sleep(_):
+        step = steps.pop(0) if steps else None
+        if step is not None:
+            step()
+
+    batches = watch([str(tmp_path)], interval=0, debounce=0, sleep=sleep)
+    assert next(batches) == [a, b]
+    assert next(batches) == [a]
+    assert next(batches) == [tmp_path / "c.py"]